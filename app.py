@@ -1,8 +1,27 @@
 from flask import Flask, render_template
 from flask_login import LoginManager
+from flask_migrate import Migrate
 from models.product import db
-from models.user import User, Admin
 from config import Config
+from services.cache_service import catalog_cache
+from services.principal_cache import init_principal_cache, load_principal
+from services.db_profile import configure_engine_options, apply_sqlite_profile
+from services.instrumentation import init_instrumentation
+from services.search_service import SearchService, search_cli
+from services.inventory_service import inventory_cli
+from services.stats_service import StatsService, stats_cli
+from services.analytics_service import analytics_cli
+from services.cart_store import init_cart_store
+from services.provider_pool import init_provider_pool
+from services.password_hasher import init_password_hasher
+from services.provider_registry import init_provider_registry
+from services.payment_service import build_providers
+from services.webhook_service import init_webhook_consumer, webhooks_cli
+from services.image_service import init_image_pipeline, images_cli
+from services.upload_storage import init_upload_storage
+from services.assets import init_assets, assets_cli
+from services.compression import init_compression
+from services.serialization import init_json
 from routes.product_bp import bp as product_bp, api_bp
 from routes.auth import auth_bp, admin_auth_bp
 from routes.admin_bp import admin_bp
@@ -11,12 +30,34 @@ import os
 
 app = Flask(__name__)
 app.config.from_object(Config)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///fit_sports_hub.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = 'your-secret-key-here'  # Change this to a secure secret key
+init_json(app)
 
-# Initialize db with app
+# Initialize db with app, using the pool and SQLite settings from Config
+configure_engine_options(app)
 db.init_app(app)
+with app.app_context():
+    apply_sqlite_profile(db.engine, app.config)
+    # Before the other response hooks, so its timing includes them (after_request runs in reverse)
+    init_instrumentation(app, db.engine)
+
+# Schema migrations: flask db upgrade (batch mode so SQLite can alter tables)
+migrate = Migrate(app, db, render_as_batch=True)
+
+# Configure the process-wide catalog cache
+catalog_cache.init_app(app)
+
+# Cart backend (carts only reach the database at checkout)
+init_cart_store(app)
+init_provider_pool(app)
+init_password_hasher(app)
+init_provider_registry(app, build_providers)
+init_webhook_consumer(app)
+init_upload_storage(app)
+init_assets(app)
+init_compression(app)
+init_image_pipeline(app)
 
 # Initialize Flask-Login
 login_manager = LoginManager()
@@ -24,15 +65,21 @@ login_manager.init_app(app)
 login_manager.login_view = 'auth.login'
 login_manager.login_message = 'Please log in to access this page.'
 
+# Session ids are '<user|admin>:<id>:<fingerprint>'; see services/principal_cache.py
+init_principal_cache(app)
+
 @login_manager.user_loader
 def load_user(user_id):
-    # Use db.session.get() instead of Query.get() for SQLAlchemy 2.0 compatibility
-    # Try to load as regular user first
-    user = db.session.get(User, int(user_id))
-    if user:
-        return user
-    # If not found, try admin
-    return db.session.get(Admin, int(user_id))
+    return load_principal(user_id)
+
+# CLI: flask search rebuild, flask inventory release-expired
+app.cli.add_command(search_cli)
+app.cli.add_command(inventory_cli)
+app.cli.add_command(stats_cli)
+app.cli.add_command(analytics_cli)
+app.cli.add_command(webhooks_cli)
+app.cli.add_command(images_cli)
+app.cli.add_command(assets_cli)
 
 # Create upload directories
 os.makedirs(os.path.join(app.root_path, 'static', 'uploads', 'products'), exist_ok=True)
@@ -60,4 +107,6 @@ def signup():
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        SearchService(db.session).ensure_index()
+        StatsService(db.session).snapshot()  # seed dashboard counters
     app.run(debug=True)
\ No newline at end of file
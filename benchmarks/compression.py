@@ -0,0 +1,92 @@
+"""
+Bytes on the wire and CPU time of response compression, per encoding and response size.
+
+Seeds products with varied descriptions and a few images each, fetches
+real /api/store/products pages and the /store/products HTML page uncompressed,
+then times ResponseCompressor.compress for every available encoding at
+the levels the app uses. Usage:
+
+    python -m benchmarks.compression --repeat 200
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+# The app reads its database URL at import time
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from app import app  # noqa: E402
+from models.product import db  # noqa: E402
+from services.compression import ResponseCompressor  # noqa: E402
+from services.product_service import ProductService  # noqa: E402
+
+WORDS = ('breathable lightweight mesh training jersey moisture wicking fabric reinforced stitching '
+         'football basketball running shoes cushioned sole grip durable rubber outsole ergonomic '
+         'official size match ball indoor outdoor team kit youth adult home away edition premium '
+         'stretch fit quick dry ventilation panels anti slip competition grade').split()
+
+
+def seed(products, rng):
+    service = ProductService(db.session)
+    categories = [service.create_category(name).id for name in ('Jerseys', 'Shoes', 'Balls', 'Gear')]
+    for i in range(products):
+        description = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 60))).capitalize() + '.'
+        product = service.create_product(f'{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {i}',
+                                         rng.choice(categories), description)
+        service.set_price(product.id, rng.randint(500, 20000) / 100)
+        service.set_stock(product.id, rng.randint(0, 200))
+        for _ in range(rng.randint(1, 4)):
+            digest = '%064x' % rng.getrandbits(256)
+            service.add_product_image(product.id, f'photo{i}.jpg', f'uploads/products/{digest[:2]}/{digest}.jpg')
+
+
+def time_per_call(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=200, help='Compressions timed per payload and encoding')
+    parser.add_argument('--products', type=int, default=100)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    compressor = ResponseCompressor()
+    results = []
+    with app.app_context():
+        db.create_all()
+        seed(args.products, rng)
+        client = app.test_client()
+        identity = {'Accept-Encoding': 'identity'}
+        payloads = [('small json', client.get('/api/store/categories', headers=identity).data),
+                    ('html /store/products', client.get('/store/products', headers=identity).data)]
+        for per_page in (12, 50, 100):
+            payloads.append((f'products per_page={per_page}',
+                             client.get(f'/api/store/products?per_page={per_page}', headers=identity).data))
+
+        for label, body in payloads:
+            row = {'payload': label, 'identity_bytes': len(body)}
+            for encoding in compressor.algorithms:
+                compressed = compressor.compress(encoding, body)
+                seconds = time_per_call(lambda: compressor.compress(encoding, body), args.repeat)
+                row[encoding] = {
+                    'bytes': len(compressed),
+                    'ratio': round(len(body) / len(compressed), 1),
+                    'cpu_us': round(seconds * 1e6, 1)
+                }
+            results.append(row)
+
+    print(json.dumps({'levels': compressor.levels, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Local stand-ins for external services, for benchmarks and manual testing.
+"""
+import itertools
+import threading
+import time
+from services.payment_service import PaymentProviderInterface
+
+
+class FakeProvider(PaymentProviderInterface):
+    """Payment provider that answers after `latency` seconds without any network I/O"""
+
+    def __init__(self, latency=0.2, fail=False):
+        self.latency = latency
+        self.fail = fail
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _next_id(self, prefix):
+        with self._lock:
+            return f'{prefix}_fake_{next(self._ids)}'
+
+    def create_payment_intent(self, amount, currency, order_id, metadata=None):
+        time.sleep(self.latency)
+        if self.fail:
+            return {'success': False, 'error': 'Declined by fake provider'}
+        intent_id = self._next_id('pi')
+        return {
+            'success': True,
+            'payment_intent_id': intent_id,
+            'client_secret': f'{intent_id}_secret',
+            'amount': float(amount),
+            'currency': currency
+        }
+
+    def confirm_payment(self, payment_intent_id):
+        time.sleep(self.latency)
+        if self.fail:
+            return {'success': False, 'status': 'requires_payment_method', 'payment_id': payment_intent_id,
+                    'last_payment_error': 'card_declined'}
+        return {'success': True, 'status': 'succeeded', 'payment_id': payment_intent_id}
+
+    def refund_payment(self, payment_id, amount=None):
+        time.sleep(self.latency)
+        return {'success': True, 'refund_id': self._next_id('re'), 'status': 'succeeded'}
@@ -0,0 +1,133 @@
+"""
+Storefront latency during a login burst, with passwords hashed inline vs on the bounded hashing pool.
+
+Serves the app on a local threaded server with a seeded catalog. Storefront
+users keep loading /api/store/products pages while, in the burst phases,
+other clients post /auth/login as fast as they can. Three phases:
+
+    idle           storefront users only
+    burst inline   logins hash in the request thread (PASSWORD_HASH_WORKERS=0)
+    burst pooled   logins hash on the pool (--workers, --executor)
+
+Usage:
+
+    python -m benchmarks.login_burst --seconds 15 --logins 16
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+# The app reads its database URL at import time
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+import requests  # noqa: E402
+from app import app  # noqa: E402
+from benchmarks.runner import make_local_server, summarize  # noqa: E402
+from benchmarks.seed import seed_catalog  # noqa: E402
+from models.user import db, User  # noqa: E402
+from services.password_hasher import PasswordHasher, get_password_hasher  # noqa: E402
+
+PASSWORD = 'burst-password'
+
+
+def create_users(count):
+    with app.app_context():
+        password_hash = get_password_hasher().hash(PASSWORD)  # one hash shared by every account
+        db.session.add_all([User(username=f'burst{n}', email=f'burst{n}@example.com', password_hash=password_hash)
+                            for n in range(count)])
+        db.session.commit()
+
+
+def run_phase(base_url, args, logins, pages):
+    timings, login_results = [], {'ok': 0, 'rejected': 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+    recording = threading.Event()
+
+    def storefront(index):
+        rng = random.Random(index)
+        session = requests.Session()
+        while not stop.is_set():
+            started = time.perf_counter()
+            session.get(f'{base_url}/api/store/products?page={rng.randint(1, pages)}&per_page=12', timeout=60)
+            if recording.is_set():
+                with lock:
+                    timings.append(time.perf_counter() - started)
+
+    def login(index):
+        session = requests.Session()
+        while not stop.is_set():
+            response = session.post(f'{base_url}/auth/login', timeout=60, allow_redirects=False,
+                                    data={'email': f'burst{index % args.accounts}@example.com', 'password': PASSWORD})
+            session.cookies.clear()
+            if recording.is_set():
+                # Signed in -> the home page; busy -> 503 with the login form
+                outcome = 'ok' if response.headers.get('Location') == '/' else 'rejected'
+                with lock:
+                    login_results[outcome] += 1
+
+    threads = [threading.Thread(target=storefront, args=(i,)) for i in range(args.users)]
+    threads += [threading.Thread(target=login, args=(i,)) for i in range(logins)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.warmup)
+    recording.set()
+    started = time.perf_counter()
+    time.sleep(args.seconds)
+    recording.clear()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    result = {'storefront': summarize(timings, 0, elapsed)}
+    if logins:
+        result['logins'] = {**login_results, 'ok_per_s': round(login_results['ok'] / elapsed, 1)}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=15, help='Measured duration of each phase')
+    parser.add_argument('--warmup', type=float, default=2)
+    parser.add_argument('--users', type=int, default=4, help='Concurrent storefront users')
+    parser.add_argument('--logins', type=int, default=16, help='Concurrent login clients in the burst')
+    parser.add_argument('--accounts', type=int, default=50)
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=app.config['PASSWORD_HASH_WORKERS'])
+    parser.add_argument('--executor', choices=('thread', 'process'), default=app.config['PASSWORD_HASH_EXECUTOR'])
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        seed_catalog(db.session, products=args.products)
+    create_users(args.accounts)
+    pages = max(1, (args.products + 11) // 12)
+
+    server = make_local_server(app, 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.port}'
+    method = app.config['PASSWORD_HASH_METHOD']
+    hashers = {
+        'burst inline': PasswordHasher(method=method, workers=0),
+        'burst pooled': PasswordHasher(method=method, workers=args.workers, max_queue=args.logins,
+                                       executor=args.executor)
+    }
+    results = {'method': method, 'cpus': os.cpu_count(), 'workers': args.workers, 'executor': args.executor}
+    try:
+        results['idle'] = run_phase(base_url, args, 0, pages)
+        for phase, hasher in hashers.items():
+            app.extensions['password_hasher'] = hasher
+            results[phase] = run_phase(base_url, args, args.logins, pages)
+            hasher.shutdown()
+    finally:
+        server.shutdown()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
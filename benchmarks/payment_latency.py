@@ -0,0 +1,140 @@
+"""
+Store writes while checkouts wait on a slow payment provider.
+
+Checkout threads create orders and pay them through FakeProvider, which
+sleeps for --latency seconds; writer threads meanwhile update prices, the
+way admin edits and other checkouts do. If the provider call held the
+database write lock, every write would queue behind it. Usage:
+
+    python -m benchmarks.payment_latency --latency 0.3 --checkouts 8 --seconds 10
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+# The app reads its database URL at import time
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from app import app  # noqa: E402
+from benchmarks.fakes import FakeProvider  # noqa: E402
+from models.payment import PaymentProvider  # noqa: E402
+from models.product import db  # noqa: E402
+from services.cart_service import CartService  # noqa: E402
+from services.cart_store import MemoryCartStore  # noqa: E402
+from services.payment_service import PaymentService  # noqa: E402
+from services.product_service import ProductService  # noqa: E402
+from services.provider_registry import get_provider_registry  # noqa: E402
+
+
+def seed(products):
+    service = ProductService(db.session)
+    category = service.create_category('Bench')
+    for i in range(products):
+        product = service.create_product(f'Product {i}', category.id)
+        service.set_price(product.id, 10 + i % 50)
+        service.set_stock(product.id, 1000000)
+    return [i + 1 for i in range(products)]
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.3, help='Fake provider response time in seconds')
+    parser.add_argument('--checkouts', type=int, default=8, help='Concurrent checkout threads')
+    parser.add_argument('--writers', type=int, default=2, help='Concurrent price-update threads')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--products', type=int, default=200)
+    args = parser.parse_args()
+
+    provider = FakeProvider(latency=args.latency)
+    store = MemoryCartStore()
+    with app.app_context():
+        db.create_all()
+        product_ids = seed(args.products)
+        get_provider_registry().override(PaymentProvider.STRIPE, provider)
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    checkout_times, write_times, errors = [], [], []
+
+    def checkout(worker):
+        with app.app_context():
+            payments = PaymentService(db.session)
+            carts = CartService(db.session, store=store)
+            n = 0
+            while not stop.is_set():
+                session_id = f'bench-{worker}-{n}'
+                n += 1
+                started = time.perf_counter()
+                try:
+                    for product_id in random.sample(product_ids, 3):
+                        carts.add_to_cart(session_id, product_id, 1)
+                    cart = carts.materialize_cart(session_id)
+                    order, error = payments.create_order_from_cart(cart.id, {'email': 'bench@example.com', 'name': 'Bench'})
+                    if error:
+                        raise RuntimeError(error)
+                    result = payments.process_payment(order.id, 'stripe', {})
+                    if not result['success']:
+                        raise RuntimeError(result.get('error'))
+                    with lock:
+                        checkout_times.append(time.perf_counter() - started)
+                except Exception as e:
+                    db.session.rollback()
+                    with lock:
+                        errors.append(str(e))
+                finally:
+                    carts.clear_cart(session_id)
+                    db.session.remove()
+
+    def writer():
+        with app.app_context():
+            products = ProductService(db.session)
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    products.set_price(random.choice(product_ids), random.randint(5, 100))
+                    with lock:
+                        write_times.append(time.perf_counter() - started)
+                except Exception as e:
+                    db.session.rollback()
+                    with lock:
+                        errors.append(str(e))
+                finally:
+                    db.session.remove()
+                time.sleep(0.01)
+
+    threads = [threading.Thread(target=checkout, args=(i,)) for i in range(args.checkouts)]
+    threads += [threading.Thread(target=writer) for _ in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    print(json.dumps({
+        'provider_latency_ms': args.latency * 1000,
+        'checkouts_per_sec': round(len(checkout_times) / args.seconds, 1),
+        'checkout_p50_ms': percentile(checkout_times, 50),
+        'checkout_p95_ms': percentile(checkout_times, 95),
+        'writes_per_sec': round(len(write_times) / args.seconds, 1),
+        'write_p50_ms': percentile(write_times, 50),
+        'write_p95_ms': percentile(write_times, 95),
+        'write_max_ms': round(max(write_times) * 1000, 1) if write_times else None,
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Connection reuse of the payment provider clients, measured against a local stub server.
+
+The stub speaks just enough of the Stripe and Africa's Talking payment APIs
+for StripeProvider.create_payment_intent and AfricasTalkingProvider's mobile
+checkout. It counts TCP connections next to requests, so connection churn
+shows up directly. Usage:
+
+    python -m benchmarks.provider_http --calls 400 --threads 8
+"""
+import argparse
+import itertools
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubCounters:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.ids = itertools.count(1)
+
+    def reset(self):
+        with self.lock:
+            self.connections = self.requests = 0
+
+
+def stub_server(latency):
+    counters = StubCounters()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive unless the client closes
+
+        def setup(self):
+            super().setup()
+            # Headers and body go out in separate writes; without this, Nagle plus delayed
+            # ACKs adds ~40 ms to every keep-alive request, which real APIs do not
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with counters.lock:
+                counters.connections += 1
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            with counters.lock:
+                counters.requests += 1
+                n = next(counters.ids)
+            time.sleep(latency)
+            if self.path.startswith('/v1/payment_intents'):
+                body = {'id': f'pi_stub_{n}', 'object': 'payment_intent', 'client_secret': f'pi_stub_{n}_secret',
+                        'status': 'requires_payment_method'}
+            elif self.path == '/mobile/checkout/request':
+                body = {'status': 'PendingConfirmation', 'transactionId': f'ATPid_stub_{n}', 'description': 'Waiting'}
+            else:
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            payload = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, counters
+
+
+def run(label, provider, calls, threads, counters, metadata):
+    counters.reset()
+    failures = []
+    per_thread = calls // threads
+
+    def worker():
+        for i in range(per_thread):
+            result = provider.create_payment_intent(10, 'KES', i, dict(metadata))
+            if not result['success']:
+                failures.append(result.get('error'))
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        'client': label,
+        'calls': per_thread * threads,
+        'connections_opened': counters.connections,
+        'calls_per_sec': round(per_thread * threads / elapsed, 1),
+        'failures': len(failures),
+        'first_failure': failures[0] if failures else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=400)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.005, help='Stub server time per request in seconds')
+    args = parser.parse_args()
+
+    server, counters = stub_server(args.latency)
+    base = f'http://127.0.0.1:{server.server_port}'
+    os.environ.update({
+        'DATABASE_URL': 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'),
+        'STRIPE_SECRET_KEY': 'sk_test_stub',
+        'STRIPE_API_BASE': base,
+        'AT_USERNAME': 'stub',
+        'AT_API_KEY': 'stub',
+        'AT_PAYMENTS_API_BASE': base
+    })
+    # Imported here: the app reads its config from the environment at import time
+    import africastalking
+    import stripe
+    from stripe.http_client import RequestsClient
+    from app import app
+    from models.payment import PaymentProvider
+    from services.payment_service import StripeProvider
+    from services.provider_registry import get_provider_registry
+
+    at_metadata = {'phone_number': '+254700000000'}
+    results = []
+    with app.app_context():
+        registry = get_provider_registry()
+        stripe_provider = registry.get(PaymentProvider.STRIPE)
+        at_provider = registry.get(PaymentProvider.AFRICAS_TALKING)
+        results.append(run('stripe registry', stripe_provider, args.calls, args.threads, counters, {}))
+        results.append(run('africas_talking registry', at_provider, args.calls, args.threads, counters, at_metadata))
+
+        # The SDK defaults used before: Stripe's own client, and the AT SDK's bare requests.post
+        stripe.default_http_client = RequestsClient()
+        results.append(run('stripe sdk default', StripeProvider('sk_test_stub'), args.calls, args.threads,
+                           counters, {}))
+        sdk_payments = africastalking.PaymentService('stub', 'stub')
+        sdk_payments._baseUrl = base
+        at_provider.payment = sdk_payments
+        results.append(run('africas_talking sdk default', at_provider, args.calls, args.threads, counters,
+                           at_metadata))
+
+    server.shutdown()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,342 @@
+"""
+Drive the store and checkout API with concurrent virtual users and report latency per endpoint.
+
+Each virtual user loops over a weighted mix of scenarios with no think
+time: list (a product listing page), detail (a product page), cart (add
+to cart) and checkout (one to three cart adds, then /api/checkout/process
+paid through benchmarks.fakes.FakeProvider). Targets:
+
+    (default)     in-process, one Flask test client per user
+    --http        the app on a local threaded server, over real HTTP
+    --url URL     a server that is already running (see --serve)
+    --serve PORT  seed, then serve the app with the fake provider until interrupted
+
+The first two seed a temporary SQLite database with benchmarks.seed unless
+--database points at an existing one. Results are JSON (stdout or
+--output); --baseline adds the change against an earlier result. Usage:
+
+    python -m benchmarks.runner --users 8 --seconds 20 --output run.json
+    python -m benchmarks.runner --http --mix list=1,detail=1 --baseline run.json
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+DEFAULT_MIX = 'list=50,detail=30,cart=15,checkout=5'
+LISTING = 'GET /api/store/products'
+DETAIL = 'GET /api/store/product/<id>'
+CART_ADD = 'POST /api/checkout/cart/add'
+CHECKOUT = 'POST /api/checkout/process'
+
+CHECKOUT_BODY = {
+    'email': 'bench@example.com',
+    'name': 'Bench User',
+    'shipping_address': '1 Bench Street',
+    'payment_provider': 'stripe'
+}
+
+
+class TestClientTarget:
+    """Requests through the Flask test client (no sockets, no server)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def client(self):
+        return self.app.test_client()
+
+    @staticmethod
+    def call(client, method, path, body=None):
+        response = client.open(path, method=method, json=body)
+        response.get_data()
+        return response.status_code, response.get_json(silent=True)
+
+
+class HTTPTarget:
+    """Requests over HTTP with one keep-alive session per user"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def client(self):
+        import requests
+        return requests.Session()
+
+    def call(self, client, method, path, body=None):
+        response = client.request(method, self.base_url + path, json=body, timeout=30)
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        return response.status_code, data
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timings = {}
+        self.errors = {}
+        self.error_samples = []
+        self.recording = False
+
+    def record(self, endpoint, seconds, error=None):
+        if not self.recording:
+            return
+        with self._lock:
+            self.timings.setdefault(endpoint, []).append(seconds)
+            if error is not None:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+                if len(self.error_samples) < 5:
+                    self.error_samples.append(f'{endpoint}: {error}')
+
+
+class VirtualUser:
+    def __init__(self, target, recorder, catalog, rng):
+        self.target = target
+        self.recorder = recorder
+        self.catalog = catalog
+        self.rng = rng
+        self.client = target.client()
+
+    def request(self, endpoint, method, path, body=None):
+        started = time.perf_counter()
+        error = None
+        try:
+            status, data = self.target.call(self.client, method, path, body)
+            if status >= 400:
+                error = f'HTTP {status} {(data or {}).get("message", "")}'.strip()
+            elif isinstance(data, dict) and data.get('success') is False:
+                error = data.get('error') or 'success: false'
+        except Exception as e:  # connection errors count against the endpoint, the run goes on
+            error = repr(e)
+        self.recorder.record(endpoint, time.perf_counter() - started, error)
+        return error is None
+
+    def list(self):
+        page = self.rng.randint(1, self.catalog['pages'])
+        self.request(LISTING, 'GET', f'/api/store/products?page={page}&per_page=12')
+
+    def detail(self):
+        self.request(DETAIL, 'GET', f'/api/store/product/{self.rng.choice(self.catalog["product_ids"])}')
+
+    def cart(self):
+        return self.request(CART_ADD, 'POST', '/api/checkout/cart/add',
+                            {'product_id': self.rng.choice(self.catalog['buyable_ids']), 'quantity': 1})
+
+    def checkout(self):
+        if all([self.cart() for _ in range(self.rng.randint(1, 3))]):
+            self.request(CHECKOUT, 'POST', '/api/checkout/process', CHECKOUT_BODY)
+
+
+def discover_catalog(target, max_pages=10):
+    """Product ids from the listing API; products with plenty of stock are used for cart and checkout"""
+    client = target.client()
+    product_ids, buyable_ids, pages = [], [], 1
+    page = 1
+    while page <= min(pages, max_pages):
+        status, data = target.call(client, 'GET', f'/api/store/products?page={page}&per_page=100')
+        if status != 200:
+            raise SystemExit(f'Listing the catalog failed with HTTP {status}')
+        pages = data['pagination']['pages'] or 1
+        for item in data['items']:
+            product_ids.append(item['id'])
+            if item['stock_quantity'] >= 100:
+                buyable_ids.append(item['id'])
+        page += 1
+    if not product_ids or not buyable_ids:
+        raise SystemExit('The catalog has no products (or none with stock >= 100); seed it first')
+    listing_pages = max(1, (data['pagination']['total'] + 11) // 12)
+    return {'product_ids': product_ids, 'buyable_ids': buyable_ids, 'pages': listing_pages}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ('list', 'detail', 'cart', 'checkout'):
+            raise SystemExit(f'Unknown scenario "{name}" in --mix')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000, 1)
+
+
+def summarize(timings, errors, seconds):
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'throughput_rps': round(len(timings) / seconds, 1),
+        'p50_ms': percentile(timings, 50),
+        'p95_ms': percentile(timings, 95),
+        'p99_ms': percentile(timings, 99),
+        'max_ms': round(max(timings) * 1000, 1) if timings else None
+    }
+
+
+def compare(result, baseline):
+    """Percent change of throughput and p95 per endpoint against an earlier result"""
+    def change(new, old):
+        return round((new - old) / old * 100, 1) if new is not None and old else None
+
+    changes = {}
+    for endpoint, stats in result['endpoints'].items():
+        old = baseline.get('endpoints', {}).get(endpoint)
+        if old:
+            changes[endpoint] = {
+                'throughput_pct': change(stats['throughput_rps'], old['throughput_rps']),
+                'p95_pct': change(stats['p95_ms'], old['p95_ms'])
+            }
+    return {'commit': baseline.get('commit'), 'endpoints': changes}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_app(args):
+    """Import the app on the benchmark database (seeding it if new) with the fake payment provider"""
+    seeded = None
+    if not args.database:
+        args.database = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+        seeded = {}
+    # The app reads its database URL at import time
+    os.environ['DATABASE_URL'] = args.database
+    from app import app
+    from benchmarks.fakes import FakeProvider
+    from benchmarks.seed import seed_catalog
+    from models.payment import PaymentProvider
+    from models.product import db
+    from services.provider_registry import get_provider_registry
+
+    with app.app_context():
+        db.create_all()
+        if seeded is not None:
+            seeded = seed_catalog(db.session, categories=args.categories, products=args.products,
+                                  orders=args.orders, seed=args.seed)
+        get_provider_registry().override(PaymentProvider.STRIPE, FakeProvider(latency=args.provider_latency))
+    return app, seeded
+
+
+def make_local_server(app, port):
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)  # no per-request access log
+    return make_server('127.0.0.1', port, app, threaded=True)
+
+
+def run(target, args):
+    recorder = Recorder()
+    catalog = discover_catalog(target)
+    mix = parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+    stop = threading.Event()
+
+    def user(index):
+        rng = random.Random(args.seed * 1000 + index)
+        virtual_user = VirtualUser(target, recorder, catalog, rng)
+        while not stop.is_set():
+            getattr(virtual_user, rng.choices(names, weights)[0])()
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(args.users)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.warmup)
+    recorder.recording = True
+    started = time.perf_counter()
+    time.sleep(args.seconds)
+    recorder.recording = False
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    all_timings = [t for timings in recorder.timings.values() for t in timings]
+    return {
+        'endpoints': {endpoint: summarize(timings, recorder.errors.get(endpoint, 0), elapsed)
+                      for endpoint, timings in sorted(recorder.timings.items())},
+        'total': summarize(all_timings, sum(recorder.errors.values()), elapsed),
+        'error_samples': recorder.error_samples
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    target_group = parser.add_mutually_exclusive_group()
+    target_group.add_argument('--http', action='store_true', help='Serve the app on a local port and use HTTP')
+    target_group.add_argument('--url', help='Base URL of a running server, e.g. http://127.0.0.1:5001')
+    target_group.add_argument('--serve', type=int, metavar='PORT', help='Only seed and serve on PORT')
+    parser.add_argument('--users', type=int, default=8, help='Concurrent virtual users')
+    parser.add_argument('--seconds', type=float, default=20, help='Measured duration')
+    parser.add_argument('--warmup', type=float, default=2, help='Seconds run before measuring')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Scenario weights, e.g. list=1,detail=1')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for the catalog and the users')
+    parser.add_argument('--database', help='Use this database as it is instead of seeding a temporary one')
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--categories', type=int, default=20)
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--provider-latency', type=float, default=0.05, help='Fake payment provider delay (s)')
+    parser.add_argument('--output', help='Write the JSON result to this file as well as stdout')
+    parser.add_argument('--baseline', help='Earlier result to compare against')
+    args = parser.parse_args()
+
+    seeded = None
+    server = None
+    if args.url:
+        target = HTTPTarget(args.url)
+    else:
+        app, seeded = load_app(args)
+        if args.serve:
+            print(f'Serving {args.database} on http://127.0.0.1:{args.serve} (Ctrl-C to stop)')
+            make_local_server(app, args.serve).serve_forever()
+            return
+        if args.http:
+            server = make_local_server(app, 0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            target = HTTPTarget(f'http://127.0.0.1:{server.port}')
+        else:
+            target = TestClientTarget(app)
+
+    try:
+        result = run(target, args)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    result = {
+        'commit': git_commit(),
+        'started_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'target': args.url or ('http' if args.http else 'in-process'),
+        'users': args.users,
+        'seconds': args.seconds,
+        'mix': parse_mix(args.mix),
+        'seeded_rows': seeded,
+        **result
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            result['vs_baseline'] = compare(result, json.load(f))
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
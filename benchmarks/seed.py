@@ -0,0 +1,143 @@
+"""
+Bulk-generate a synthetic catalog and order history for benchmarks.
+
+Rows are written with multi-row INSERTs in batches, not through the ORM
+unit of work: 20,000 products and 5,000 orders take about ten seconds.
+The same --seed gives the same rows (order dates are relative to now).
+The search index, dashboard counters and payment rollups are rebuilt at
+the end. Usage:
+
+    python -m benchmarks.seed --database sqlite:////tmp/bench.db --products 20000 --orders 5000
+"""
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+WORDS = ('breathable lightweight mesh training jersey moisture wicking fabric reinforced stitching '
+         'football basketball running shoes cushioned sole grip durable rubber outsole ergonomic '
+         'official size match ball indoor outdoor team kit youth adult home away edition premium '
+         'stretch fit quick dry ventilation panels anti slip competition grade').split()
+IMAGES = ('img/balls.jpg', 'img/jersey.jpg', 'img/jersey-1.jpg', 'img/j-2.jpg', 'img/j-3.jpg', 'img/lakers.jpg')
+
+# Relative weights of the seeded order statuses
+ORDER_STATUSES = (('completed', 70), ('pending', 10), ('failed', 10), ('cancelled', 5), ('refunded', 5))
+
+
+def seed_catalog(session, categories=20, products=1000, images=2, orders=0, seed=1, batch_size=5000, days=90):
+    """Insert categories, products with prices/stocks/images, and orders with items and payments.
+
+    Ids continue after the current maximum, so it can add to a database
+    that already has data. Returns the number of rows written per table.
+    """
+    # Imported here so that scripts can set DATABASE_URL before the app is loaded
+    from sqlalchemy import func, insert, select
+    from models.payment import Order, OrderItem, Payment, PaymentProvider, PaymentStatus
+    from models.product import Category, Price, Product, ProductImage, Stock
+    from services.analytics_service import PaymentAnalyticsService
+    from services.search_service import SearchService
+    from services.stats_service import StatsService
+
+    rng = random.Random(seed)
+    counts = {}
+
+    def next_id(model):
+        return (session.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+    def write(model, rows):
+        for start in range(0, len(rows), batch_size):
+            session.execute(insert(model), rows[start:start + batch_size])
+        counts[model.__tablename__] = counts.get(model.__tablename__, 0) + len(rows)
+
+    def sentence(low, high):
+        return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize() + '.'
+
+    first_category = next_id(Category)
+    category_ids = list(range(first_category, first_category + categories))
+    write(Category, [{'id': cid, 'name': f'Category {cid}', 'description': sentence(4, 10)} for cid in category_ids])
+
+    first_product = next_id(Product)
+    product_ids = list(range(first_product, first_product + products))
+    prices = {pid: round(rng.uniform(5, 200), 2) for pid in product_ids}
+    write(Product, [{
+        'id': pid,
+        'name': f'{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {pid}',
+        'description': sentence(15, 60),
+        'category_id': rng.choice(category_ids)
+    } for pid in product_ids])
+    write(Price, [{'product_id': pid, 'amount': prices[pid], 'currency': 'USD'} for pid in product_ids])
+    write(Stock, [{'product_id': pid, 'quantity': rng.choice((0, 3, 8, 25, 100, 500))} for pid in product_ids])
+    write(ProductImage, [{
+        'product_id': pid,
+        'filename': f'product-{pid}-{n}.jpg',
+        'filepath': rng.choice(IMAGES)
+    } for pid in product_ids for n in range(rng.randint(max(0, images - 1), images + 1))])
+
+    if orders:
+        first_order = next_id(Order)
+        statuses = [PaymentStatus(name) for name, _ in ORDER_STATUSES]
+        weights = [weight for _, weight in ORDER_STATUSES]
+        now = datetime.utcnow()
+        order_rows, item_rows, payment_rows = [], [], []
+        for oid in range(first_order, first_order + orders):
+            created = now - timedelta(seconds=rng.randint(0, days * 86400))
+            status = rng.choices(statuses, weights)[0]
+            total = 0
+            for pid in rng.sample(product_ids, min(len(product_ids), rng.randint(1, 4))):
+                quantity = rng.randint(1, 3)
+                total += prices[pid] * quantity
+                item_rows.append({'order_id': oid, 'product_id': pid, 'quantity': quantity,
+                                  'unit_price': prices[pid], 'total_price': round(prices[pid] * quantity, 2)})
+            order_rows.append({
+                'id': oid, 'order_number': f'SEED-{oid:08d}', 'user_email': f'customer{oid % 5000}@example.com',
+                'user_name': f'Customer {oid % 5000}', 'shipping_address': f'{oid} Bench Street',
+                'total_amount': round(total, 2), 'currency': 'USD', 'status': status,
+                'created_at': created, 'updated_at': created
+            })
+            if status != PaymentStatus.PENDING:
+                payment_rows.append({
+                    'order_id': oid, 'provider': rng.choice((PaymentProvider.STRIPE, PaymentProvider.AFRICAS_TALKING)),
+                    'transaction_id': f'seed_{oid}', 'amount': round(total, 2), 'currency': 'USD',
+                    'status': status, 'created_at': created, 'updated_at': created
+                })
+        write(Order, order_rows)
+        write(OrderItem, item_rows)
+        write(Payment, payment_rows)
+    session.commit()
+
+    # Derived data the write paths normally keep in sync
+    if session.get_bind().dialect.name == 'sqlite':
+        SearchService(session).rebuild()
+    StatsService(session).rebuild()
+    PaymentAnalyticsService(session).rebuild()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database', required=True, help='SQLAlchemy URL of the database to fill (created if needed)')
+    parser.add_argument('--categories', type=int, default=20)
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--images', type=int, default=2, help='Average images per product')
+    parser.add_argument('--orders', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=1, help='Random seed; the same seed gives the same data')
+    args = parser.parse_args()
+
+    # The app reads its database URL at import time
+    os.environ['DATABASE_URL'] = args.database
+    from app import app
+    from models.product import db
+
+    started = time.perf_counter()
+    with app.app_context():
+        db.create_all()
+        counts = seed_catalog(db.session, categories=args.categories, products=args.products,
+                              images=args.images, orders=args.orders, seed=args.seed)
+    print(json.dumps({'database': args.database, 'rows': counts,
+                      'seconds': round(time.perf_counter() - started, 2)}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
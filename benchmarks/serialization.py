@@ -0,0 +1,77 @@
+"""
+CPU time to serialize store API responses: restx marshalling + stdlib json vs compiled serializers + orjson.
+
+Builds real listing pages and a product detail from seeded data (the
+catalog queries are not timed), then times each way of turning them into
+a JSON body. Usage:
+
+    python -m benchmarks.serialization --repeat 300
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+# The app reads its database URL at import time
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from flask_restx import marshal  # noqa: E402
+from app import app  # noqa: E402
+from benchmarks.compression import seed  # noqa: E402
+from models.product import db  # noqa: E402
+from routes.store_api import _listing_response, product_detail_model, product_list_response, service  # noqa: E402
+from services.serialization import FastJSONProvider, compile_model, orjson  # noqa: E402
+
+
+def time_per_call(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=300, help='Serializations timed per payload and path')
+    parser.add_argument('--products', type=int, default=100)
+    args = parser.parse_args()
+    if orjson is None:
+        print('orjson is not installed; the fast paths fall back to the stdlib encoder')
+
+    provider = FastJSONProvider(app)
+    results = []
+    with app.test_request_context():
+        db.create_all()
+        seed(args.products, random.Random(7))
+        payloads = []
+        for per_page in (12, 50, 100):
+            page = service.get_all_products(per_page=per_page)
+            payloads.append((f'products per_page={per_page}', product_list_response,
+                             _listing_response(page, {'page': 1, 'per_page': per_page})))
+        payloads.append(('product detail', product_detail_model, service.get_product_details(1)))
+
+        for label, model, data in payloads:
+            compiled = compile_model(model)
+            assert compiled(data) == marshal(data, model)
+            paths = {
+                # What restx did before: marshal, then its output_json representation
+                'marshal + json': lambda: json.dumps(marshal(data, model)),
+                'marshal + orjson': lambda: provider.dumps_bytes(marshal(data, model), sort_keys=False),
+                'compiled + json': lambda: json.dumps(compiled(data)),
+                'compiled + orjson': lambda: provider.dumps_bytes(compiled(data), sort_keys=False)
+            }
+            row = {'payload': label, 'bytes': len(json.dumps(marshal(data, model)))}
+            for name, fn in paths.items():
+                row[name + ' us'] = round(time_per_call(fn, args.repeat) * 1e6, 1)
+            results.append(row)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Read throughput under concurrent writers, with and without the SQLite profile.
+
+Readers run the storefront listing query while writers hold short write
+transactions on stocks, the way checkouts do. Usage:
+
+    python -m benchmarks.sqlite_profile --readers 8 --writers 2 --seconds 10
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from config import Config
+from services.db_profile import apply_sqlite_profile
+
+LISTING_SQL = text("""
+    SELECT p.id, p.name, c.name, pr.amount, s.quantity
+    FROM products p
+    JOIN categories c ON c.id = p.category_id
+    LEFT JOIN prices pr ON pr.product_id = p.id
+    LEFT JOIN stocks s ON s.product_id = p.id
+    WHERE p.category_id = :category_id
+    ORDER BY p.id LIMIT 12 OFFSET :offset
+""")
+
+
+def seed(engine, products):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE categories (id INTEGER PRIMARY KEY, name TEXT)"))
+        conn.execute(text("CREATE TABLE products (id INTEGER PRIMARY KEY, name TEXT, description TEXT, category_id INTEGER)"))
+        conn.execute(text("CREATE TABLE prices (id INTEGER PRIMARY KEY, product_id INTEGER, amount NUMERIC)"))
+        conn.execute(text("CREATE TABLE stocks (id INTEGER PRIMARY KEY, product_id INTEGER, quantity INTEGER)"))
+        conn.execute(text("INSERT INTO categories (id, name) VALUES (:id, :name)"),
+                     [{'id': i, 'name': f'Category {i}'} for i in range(1, 11)])
+        conn.execute(text("INSERT INTO products (id, name, description, category_id) VALUES (:id, :name, :d, :c)"),
+                     [{'id': i, 'name': f'Product {i}', 'd': 'x' * 200, 'c': i % 10 + 1} for i in range(1, products + 1)])
+        conn.execute(text("INSERT INTO prices (product_id, amount) VALUES (:id, 9.99)"),
+                     [{'id': i} for i in range(1, products + 1)])
+        conn.execute(text("INSERT INTO stocks (product_id, quantity) VALUES (:id, 1000000)"),
+                     [{'id': i} for i in range(1, products + 1)])
+
+
+def run(profile, args):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    config = {} if profile == 'default' else vars(Config)
+    # Baseline keeps the driver defaults: rollback journal, 5s busy timeout
+    engine = create_engine(f'sqlite:///{path}', pool_size=args.readers + args.writers)
+    if profile == 'tuned':
+        apply_sqlite_profile(engine, config)
+    seed(engine, args.products)
+
+    stop = threading.Event()
+    counts = {'reads': 0, 'writes': 0, 'read_errors': 0, 'write_errors': 0}
+    lock = threading.Lock()
+
+    def reader():
+        reads = errors = 0
+        with engine.connect() as conn:
+            while not stop.is_set():
+                try:
+                    conn.execute(LISTING_SQL, {'category_id': random.randint(1, 10),
+                                               'offset': random.randint(0, 50) * 12}).all()
+                    conn.commit()
+                    reads += 1
+                except OperationalError:
+                    conn.rollback()
+                    errors += 1
+        with lock:
+            counts['reads'] += reads
+            counts['read_errors'] += errors
+
+    def writer():
+        writes = errors = 0
+        with engine.connect() as conn:
+            while not stop.is_set():
+                try:
+                    for _ in range(20):
+                        conn.execute(text("UPDATE stocks SET quantity = quantity - 1 WHERE product_id = :p"),
+                                     {'p': random.randint(1, args.products)})
+                    time.sleep(args.hold_ms / 1000)  # e.g. the rest of a checkout transaction
+                    conn.commit()
+                    writes += 1
+                except OperationalError:
+                    conn.rollback()
+                    errors += 1
+        with lock:
+            counts['writes'] += writes
+            counts['write_errors'] += errors
+
+    threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+    threads += [threading.Thread(target=writer) for _ in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    return {
+        'profile': profile,
+        'reads_per_sec': round(counts['reads'] / args.seconds, 1),
+        'writes_per_sec': round(counts['writes'] / args.seconds, 1),
+        'read_errors': counts['read_errors'],
+        'write_errors': counts['write_errors'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--hold-ms', type=float, default=20, help='Time each write transaction holds its lock')
+    args = parser.parse_args()
+
+    results = [run(profile, args) for profile in ('default', 'tuned')]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -10,19 +10,112 @@ class Config:
         'sqlite:///' + os.path.join(basedir, 'fit_sports_hub.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Connection pool (see services/db_profile.py)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))  # seconds
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    
+    # SQLite performance profile, applied to every new connection
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # milliseconds
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))  # bytes
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -64000))  # negative = KiB
+    
     # File upload settings
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+    # Uploads are spooled here while they are received; same filesystem as static/ keeps storing a rename
+    UPLOAD_TMP_DIR = os.environ.get('UPLOAD_TMP_DIR')  # default: <instance>/upload-tmp
+    
+    # Product image variants, built off the request thread (needs Pillow; AVIF needs Pillow >= 11.2)
+    IMAGE_PIPELINE_ENABLED = os.environ.get('IMAGE_PIPELINE_ENABLED', 'true').lower() == 'true'
+    IMAGE_PIPELINE_WORKERS = int(os.environ.get('IMAGE_PIPELINE_WORKERS', 2))
+    IMAGE_VARIANT_WIDTHS = tuple(int(w) for w in os.environ.get('IMAGE_VARIANT_WIDTHS', '320,640,1280').split(','))
+    IMAGE_VARIANT_FORMATS = tuple(os.environ.get('IMAGE_VARIANT_FORMATS', 'avif,webp').split(','))
+    IMAGE_VARIANT_QUALITY = int(os.environ.get('IMAGE_VARIANT_QUALITY', 75))
+    IMAGE_THUMBNAIL_WIDTH = int(os.environ.get('IMAGE_THUMBNAIL_WIDTH', 320))  # listing card src fallback
+    
+    # Fingerprinted /assets/ URLs (see services/assets.py); `flask assets build` writes the manifest
+    ASSETS_MANIFEST = os.environ.get('ASSETS_MANIFEST')  # default: <instance>/assets-manifest.json
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', 'false').lower() == 'true'  # let the front server send files
+    
+    # Negotiated compression of dynamic responses (br/zstd need the brotli/zstandard packages)
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_ALGORITHMS = tuple(os.environ.get('COMPRESSION_ALGORITHMS', 'zstd,br,gzip').split(','))  # tie order
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 500))  # bytes; smaller bodies go as-is
+    COMPRESSION_STREAMING = os.environ.get('COMPRESSION_STREAMING', 'true').lower() == 'true'
+    
+    # Per-request SQL count/time, Server-Timing headers, slow-query log and Prometheus metrics
+    INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', 'false').lower() == 'true'
+    INSTRUMENTATION_SLOW_QUERY_MS = float(os.environ.get('INSTRUMENTATION_SLOW_QUERY_MS', 100))
+    INSTRUMENTATION_REPEATED_QUERY_WARNING = int(os.environ.get('INSTRUMENTATION_REPEATED_QUERY_WARNING', 10))  # N+1 hint
+    INSTRUMENTATION_SERVER_TIMING = os.environ.get('INSTRUMENTATION_SERVER_TIMING', 'true').lower() == 'true'
+    METRICS_ENDPOINT = os.environ.get('METRICS_ENDPOINT', '')  # e.g. /metrics; empty (the default) serves none
+    METRICS_ALLOWED_IPS = tuple(filter(None, os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')))
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # scrapers from other addresses send Authorization: Bearer <token>
+    
+    # JSON encoder for jsonify and the REST API: 'orjson' (stdlib fallback if not installed) or 'stdlib'
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'orjson')
+    
+    # Catalog read cache (categories, featured products, product details)
+    CATALOG_CACHE_ENABLED = os.environ.get('CATALOG_CACHE_ENABLED', 'true').lower() == 'true'
+    CATALOG_CACHE_TTL = int(os.environ.get('CATALOG_CACHE_TTL', 300))  # seconds
+    CATALOG_CACHE_MAX_ENTRIES = int(os.environ.get('CATALOG_CACHE_MAX_ENTRIES', 1024))
+    
+    # Signed-in users and admins, per process (changes from other workers show up after the TTL)
+    PRINCIPAL_CACHE_ENABLED = os.environ.get('PRINCIPAL_CACHE_ENABLED', 'true').lower() == 'true'
+    PRINCIPAL_CACHE_TTL = int(os.environ.get('PRINCIPAL_CACHE_TTL', 60))  # seconds
+    PRINCIPAL_CACHE_MAX_ENTRIES = int(os.environ.get('PRINCIPAL_CACHE_MAX_ENTRIES', 10000))
+    
+    # Stock held for an unpaid order before it is released and the order cancelled
+    STOCK_RESERVATION_TTL = int(os.environ.get('STOCK_RESERVATION_TTL', 900))  # seconds
+    
+    # Dashboard low-stock cutoff; run `flask stats rebuild` after changing it
+    LOW_STOCK_THRESHOLD = int(os.environ.get('LOW_STOCK_THRESHOLD', 10))
+    
+    # Password hashing: Werkzeug method and cost; stored hashes are upgraded on the next login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')  # or scrypt:32768:8:1
+    PASSWORD_HASH_SALT_LENGTH = int(os.environ.get('PASSWORD_HASH_SALT_LENGTH', 16))
+    # Hashing runs on a bounded pool so login bursts cannot take every worker; 0 hashes inline
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 32))  # waiting hashes before rejecting
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))  # seconds
+    PASSWORD_HASH_EXECUTOR = os.environ.get('PASSWORD_HASH_EXECUTOR', 'thread')  # or process
+    
+    # Payment provider calls run on a bounded pool, outside any DB transaction
+    PAYMENT_PROVIDER_WORKERS = int(os.environ.get('PAYMENT_PROVIDER_WORKERS', 8))
+    PAYMENT_PROVIDER_QUEUE = int(os.environ.get('PAYMENT_PROVIDER_QUEUE', 32))  # waiting calls before rejecting
+    PAYMENT_PROVIDER_TIMEOUT = float(os.environ.get('PAYMENT_PROVIDER_TIMEOUT', 15))  # seconds
+    # Keep-alive HTTP connections shared by the provider clients of a process
+    PAYMENT_HTTP_POOL_SIZE = int(os.environ.get('PAYMENT_HTTP_POOL_SIZE', 8))  # per provider host
+    PAYMENT_HTTP_CONNECT_TIMEOUT = float(os.environ.get('PAYMENT_HTTP_CONNECT_TIMEOUT', 3.05))  # seconds
+    PAYMENT_HTTP_READ_TIMEOUT = float(os.environ.get('PAYMENT_HTTP_READ_TIMEOUT', 10))  # seconds
+    
+    # Webhook inbox: events are stored on receipt and applied in batches
+    WEBHOOK_CONSUMER_ENABLED = os.environ.get('WEBHOOK_CONSUMER_ENABLED', 'true').lower() == 'true'
+    WEBHOOK_BATCH_SIZE = int(os.environ.get('WEBHOOK_BATCH_SIZE', 100))
+    WEBHOOK_POLL_INTERVAL = float(os.environ.get('WEBHOOK_POLL_INTERVAL', 5))  # seconds between retry sweeps
+    WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', 10))  # for events whose payment is not found yet
+    
+    # Cart storage: 'memory' (per process) or 'redis' (shared, any Redis-protocol server)
+    CART_BACKEND = os.environ.get('CART_BACKEND', 'memory')
+    CART_REDIS_URL = os.environ.get('CART_REDIS_URL', 'redis://localhost:6379/0')
+    CART_TTL = int(os.environ.get('CART_TTL', 7 * 24 * 3600))  # seconds since last change
+    CART_MEMORY_MAX_CARTS = int(os.environ.get('CART_MEMORY_MAX_CARTS', 100000))
     
     # Payment Provider Configuration
     STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY')
     STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
     STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET')
+    STRIPE_API_BASE = os.environ.get('STRIPE_API_BASE')  # e.g. a local stripe-mock; default is the live API
     
     # Africa's Talking Configuration
     AT_USERNAME = os.environ.get('AT_USERNAME', 'sandbox')  # Use 'sandbox' for testing
     AT_API_KEY = os.environ.get('AT_API_KEY')
     AT_PAYMENT_PRODUCT_NAME = os.environ.get('AT_PAYMENT_PRODUCT_NAME', 'FitSportsHub')
+    AT_PAYMENTS_API_BASE = os.environ.get('AT_PAYMENTS_API_BASE')  # default: the SDK's payments host
     
     # Session Configuration
     SESSION_TYPE = 'filesystem'
@@ -17,6 +17,17 @@ class PaymentProvider(enum.Enum):
     PAYPAL = "paypal"
     FLUTTERWAVE = "flutterwave"
 
+class WebhookStatus(enum.Enum):
+    PENDING = "pending"
+    PROCESSED = "processed"
+    IGNORED = "ignored"
+    FAILED = "failed"
+
+class ReservationStatus(enum.Enum):
+    ACTIVE = "active"
+    COMMITTED = "committed"
+    RELEASED = "released"
+
 class Order(db.Model):
     __tablename__ = 'orders'
     id = db.Column(db.Integer, primary_key=True)
@@ -27,8 +38,8 @@ class Order(db.Model):
     shipping_address = db.Column(db.Text)
     total_amount = db.Column(db.Numeric(10, 2), nullable=False)
     currency = db.Column(db.String(3), default='USD')
-    status = db.Column(db.Enum(PaymentStatus), default=PaymentStatus.PENDING)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    status = db.Column(db.Enum(PaymentStatus), default=PaymentStatus.PENDING, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
@@ -38,8 +49,8 @@ class Order(db.Model):
 class OrderItem(db.Model):
     __tablename__ = 'order_items'
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, nullable=False)
     unit_price = db.Column(db.Numeric(10, 2), nullable=False)
     total_price = db.Column(db.Numeric(10, 2), nullable=False)
@@ -47,10 +58,27 @@ class OrderItem(db.Model):
     # Relationships
     product = db.relationship('Product', backref='order_items')
 
+class StockReservation(db.Model):
+    __tablename__ = 'stock_reservations'
+    __table_args__ = (
+        # release_expired: WHERE status = 'ACTIVE' AND expires_at < now
+        db.Index('ix_stock_reservations_status_expires_at', 'status', 'expires_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, index=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.Enum(ReservationStatus), default=ReservationStatus.ACTIVE, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    order = db.relationship('Order', backref='reservations')
+
 class Payment(db.Model):
     __tablename__ = 'payments'
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
     provider = db.Column(db.Enum(PaymentProvider), nullable=False)
     transaction_id = db.Column(db.String(100), unique=True)
     amount = db.Column(db.Numeric(10, 2), nullable=False)
@@ -60,6 +88,28 @@ class Payment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+class WebhookEvent(db.Model):
+    """Inbox of provider webhooks, stored on receipt and processed in batches"""
+    __tablename__ = 'webhook_events'
+    __table_args__ = (
+        # Providers retry deliveries; the second copy of an event is dropped on insert
+        db.UniqueConstraint('provider', 'event_id', name='uq_webhook_events_provider_event_id'),
+        # Consumer: WHERE status = 'PENDING' AND next_attempt_at <= now ORDER BY id
+        db.Index('ix_webhook_events_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    provider = db.Column(db.Enum(PaymentProvider), nullable=False)
+    event_id = db.Column(db.String(255), nullable=False)
+    event_type = db.Column(db.String(100))
+    payload = db.Column(db.JSON, nullable=False)
+    verified = db.Column(db.Boolean, nullable=False, default=False)  # signature checked on receipt
+    status = db.Column(db.Enum(WebhookStatus), nullable=False, default=WebhookStatus.PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    error = db.Column(db.Text)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+    
 class Cart(db.Model):
     __tablename__ = 'carts'
     id = db.Column(db.Integer, primary_key=True)
@@ -73,8 +123,8 @@ class Cart(db.Model):
 class CartItem(db.Model):
     __tablename__ = 'cart_items'
     id = db.Column(db.Integer, primary_key=True)
-    cart_id = db.Column(db.Integer, db.ForeignKey('carts.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    cart_id = db.Column(db.Integer, db.ForeignKey('carts.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, nullable=False, default=1)
     added_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -13,29 +13,47 @@ class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
     description = db.Column(db.Text)
-    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False, index=True)
     category = db.relationship('Category', backref=db.backref('products', lazy=True))
 
 class ProductImage(db.Model):
     __tablename__ = 'product_images'
     id = db.Column(db.Integer, primary_key=True)
-    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, index=True)
     filename = db.Column(db.String(255), nullable=False)
     filepath = db.Column(db.String(255), nullable=False)
+    content_hash = db.Column(db.String(64), index=True)  # SHA-256; images with equal content share filepath
+    size_bytes = db.Column(db.Integer)
     uploaded_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    processed_at = db.Column(db.DateTime)  # set once the image pipeline has built its variants
     product = db.relationship('Product', backref=db.backref('images', lazy=True))
 
+class ProductImageVariant(db.Model):
+    """A resized, re-encoded derivative of a product image (see services/image_service.py)"""
+    __tablename__ = 'product_image_variants'
+    __table_args__ = (db.UniqueConstraint('image_id', 'width', 'format'),)
+    id = db.Column(db.Integer, primary_key=True)
+    image_id = db.Column(db.Integer, db.ForeignKey('product_images.id'), nullable=False, index=True)
+    width = db.Column(db.Integer, nullable=False)
+    height = db.Column(db.Integer, nullable=False)
+    format = db.Column(db.String(10), nullable=False)  # 'avif', 'webp' or 'jpeg'
+    filepath = db.Column(db.String(255), nullable=False)
+    size_bytes = db.Column(db.Integer, nullable=False)
+    image = db.relationship('ProductImage', backref=db.backref(
+        'variants', lazy=True, cascade='all, delete-orphan', order_by='ProductImageVariant.width'
+    ))
+
 class Stock(db.Model):
     __tablename__ = 'stocks'
     id = db.Column(db.Integer, primary_key=True)
-    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, unique=True, index=True)
     quantity = db.Column(db.Integer, nullable=False, default=0)
     product = db.relationship('Product', backref=db.backref('stock', uselist=False))
 
 class Price(db.Model):
     __tablename__ = 'prices'
     id = db.Column(db.Integer, primary_key=True)
-    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, unique=True, index=True)
     amount = db.Column(db.Numeric(10,2), nullable=False)
     currency = db.Column(db.String(3), nullable=False, default='USD')
     product = db.relationship('Product', backref=db.backref('price', uselist=False))
\ No newline at end of file
@@ -0,0 +1,25 @@
+from datetime import datetime
+from models.product import db
+from models.payment import PaymentStatus
+
+class StatCounter(db.Model):
+    """Dashboard counters kept up to date by the writes that change them"""
+    __tablename__ = 'stat_counters'
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class PaymentRollup(db.Model):
+    """Orders per creation day x payment provider x order status.
+
+    provider holds the PaymentProvider name of the order's latest payment, or
+    UNASSIGNED before any payment was attempted.
+    """
+    __tablename__ = 'payment_daily_rollups'
+    UNASSIGNED = 'UNASSIGNED'
+
+    day = db.Column(db.Date, primary_key=True)
+    provider = db.Column(db.String(30), primary_key=True)
+    status = db.Column(db.Enum(PaymentStatus), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Numeric(12, 2), nullable=False, default=0)
@@ -1,11 +1,32 @@
+import hashlib
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from datetime import datetime
 from models.product import db
+from services.password_hasher import hash_password, verify_password
 
-class User(UserMixin, db.Model):
+class PrincipalMixin(UserMixin):
+    """Flask-Login id of the form '<kind>:<id>:<fingerprint>'.
+
+    The kind says which table the id belongs to, so User 3 and Admin 3 are
+    different sessions; the fingerprint changes with the password, which
+    ends sessions and remember-me cookies issued before a password change.
+    """
+    principal_kind = None
+
+    @property
+    def session_fingerprint(self):
+        return password_fingerprint(self.password_hash)
+
+    def get_id(self):
+        return f'{self.principal_kind}:{self.id}:{self.session_fingerprint}'
+
+def password_fingerprint(password_hash):
+    return hashlib.sha256(password_hash.encode()).hexdigest()[:16]
+
+class User(PrincipalMixin, db.Model):
     __tablename__ = 'users'
+    principal_kind = 'user'
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -18,16 +39,17 @@ class User(UserMixin, db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
     
     def __repr__(self):
         return f'<User {self.username}>'
 
-class Admin(UserMixin, db.Model):
+class Admin(PrincipalMixin, db.Model):
     __tablename__ = 'admins'
+    principal_kind = 'admin'
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -41,10 +63,10 @@ class Admin(UserMixin, db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
     
     def __repr__(self):
         return f'<Admin {self.username}>'
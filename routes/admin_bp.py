@@ -1,9 +1,8 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required
-from werkzeug.utils import secure_filename
-import os
-import time
 from models.product import db, Category, Product
+from services.admin_service import AdminService
+from services.image_service import ImageService
 from services.product_service import ProductService
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -11,7 +10,9 @@ admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 @admin_bp.route('/dashboard')
 @login_required
 def dashboard():
-    return render_template('admin/admin_dashboard.html')
+    # Every counter from one snapshot query, rendered with the page
+    stats = AdminService(db.session).get_dashboard_stats()
+    return render_template('admin/admin_dashboard.html', stats=stats)
 
 @admin_bp.route('/products')
 @login_required
@@ -51,24 +52,15 @@ def add_product():
         if request.form.get('stock'):
             service.set_stock(product.id, int(request.form['stock']))
         
-        # Handle image uploads
+        # Handle image uploads; thumbnails and variants are built in the background
         if 'images' in request.files:
-            from flask import current_app
-            upload_folder = os.path.join(current_app.root_path, 'static', 'uploads', 'products')
-            os.makedirs(upload_folder, exist_ok=True)
-            
+            images = ImageService(db.session)
             for file in request.files.getlist('images'):
                 if file and file.filename:
-                    filename = secure_filename(file.filename)
-                    # Use time.time() to get current timestamp
-                    timestamp = int(time.time())
-                    unique_filename = f"{product.id}_{timestamp}_{filename}"
-                    filepath = os.path.join(upload_folder, unique_filename)
-                    file.save(filepath)
-                    
-                    # Save to database
-                    relative_path = f"uploads/products/{unique_filename}"
-                    service.add_product_image(product.id, filename, relative_path)
+                    try:
+                        images.save_upload(product.id, file)
+                    except ValueError as e:
+                        flash(str(e), 'warning')
         
         flash('Product created successfully!', 'success')
         return redirect(url_for('admin.products'))
@@ -76,4 +68,5 @@ def add_product():
 @admin_bp.route('/payments')
 @login_required
 def payments():
-    return render_template('admin/admin_payments.html')
+    totals = AdminService(db.session).get_payments_stats()
+    return render_template('admin/admin_payments.html', totals=totals)
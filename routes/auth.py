@@ -2,12 +2,44 @@ from flask import Blueprint, render_template, redirect, url_for, request, flash
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash
 from models.user import db, User, Admin
+from services.password_hasher import PasswordHasherBusyError, get_password_hasher
 from datetime import datetime
 import os
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 admin_auth_bp = Blueprint('admin_auth', __name__, url_prefix='/admin/auth')
 
+# Sign-in and sign-up forms, shown again when the password hasher is busy
+FORM_TEMPLATES = {
+    'auth.login': 'login.html',
+    'auth.signup': 'signup.html',
+    'admin_auth.admin_login': 'admin/adminlogin.html',
+    'admin_auth.admin_signup': 'admin/adminsignup.html'
+}
+
+@auth_bp.errorhandler(PasswordHasherBusyError)
+@admin_auth_bp.errorhandler(PasswordHasherBusyError)
+def password_hasher_busy(error):
+    """503 with the form again, so clients and load balancers see an overload, not a failed login"""
+    template = FORM_TEMPLATES.get(request.endpoint)
+    body = render_template(template, error=str(error)) if template else str(error)
+    return body, 503, {'Retry-After': '1'}
+
+def upgrade_password_hash(principal, password):
+    """Re-hash a just-verified password made with old hashing parameters; the caller commits.
+
+    Skipped while the hasher is busy: the password was already checked,
+    and the next sign-in upgrades it. The new hash changes the session
+    fingerprint (see PrincipalMixin), so the account's other sessions end.
+    """
+    if not get_password_hasher().needs_rehash(principal.password_hash):
+        return False
+    try:
+        principal.set_password(password)
+    except PasswordHasherBusyError:
+        return False
+    return True
+
 # User Authentication Routes
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -26,6 +58,9 @@ def login():
             flash('Your account has been deactivated', 'error')
             return redirect(url_for('auth.login'))
         
+        if upgrade_password_hash(user, password):
+            db.session.commit()
+        
         login_user(user, remember=remember)
         next_page = request.args.get('next')
         return redirect(next_page) if next_page else redirect(url_for('index'))
@@ -94,6 +129,7 @@ def admin_login():
         if not admin.is_active:
             return render_template('admin/adminlogin.html', error='Account deactivated')
         
+        upgrade_password_hash(admin, password)
         # Update last login
         admin.last_login = datetime.utcnow()
         db.session.commit()
@@ -1,8 +1,11 @@
-from flask import request, session
-from flask_restx import Namespace, Resource, fields
-from services import payment_service
+from flask import request, session, Response
+from flask_restx import Namespace, Resource, fields, marshal
 from services.payment_service import PaymentService
 from services.cart_service import CartService
+from services.stats_service import StatsService, TOTAL_ORDERS
+from services.analytics_service import PaymentAnalyticsService
+from services.webhook_service import WebhookService, notify_webhook_consumer
+from services.compression import no_compression
 from models.product import db
 import uuid
 
@@ -37,7 +40,8 @@ cart_item_model = checkout_api.model('CartItem', {
     'unit_price': fields.Float(),
     'total_price': fields.Float(),
     'stock_available': fields.Integer(),
-    'image': fields.String()
+    'image': fields.String(),
+    'image_url': fields.String(description='Fingerprinted, long-cached URL of the image')
 })
 
 cart_response = checkout_api.model('CartResponse', {
@@ -65,26 +69,45 @@ order_status_response = checkout_api.model('OrderStatusResponse', {
 })
 
 cart_service = CartService(db.session)
+payment_service = PaymentService(db.session)
+stats_service = StatsService(db.session)
+analytics_service = PaymentAnalyticsService(db.session)
 
-def get_session_id():
-    """Get or create session ID for cart"""
+def get_session_id(create=True):
+    """Get or create session ID for cart (None if there is none and create is False)"""
     if 'cart_session_id' not in session:
+        if not create:
+            return None
         session['cart_session_id'] = str(uuid.uuid4())
     return session['cart_session_id']
 
 @checkout_api.route('/cart')
 class CartOperations(Resource):
-    @checkout_api.marshal_with(cart_response)
+    @checkout_api.response(200, 'Success', cart_response)
+    @checkout_api.response(304, 'Cart unchanged since the ETag sent in If-None-Match')
     @checkout_api.doc('get_cart')
     def get(self):
         """Get current cart contents"""
-        session_id = get_session_id()
-        return cart_service.get_cart_items(session_id)
+        # Read-only: never creates a session or a cart, so first visits cost no writes
+        session_id = get_session_id(create=False)
+        lines = cart_service.store.get(session_id) if session_id else {}
+        
+        # Checked before the cart is built, so an unchanged cart costs one small query
+        etag = cart_service.cart_etag(session_id, lines)
+        # Weak: the same cart may go out gzip-, br- or zstd-encoded (services/compression.py)
+        headers = {'ETag': f'W/"{etag}"', 'Cache-Control': 'private, no-cache'}
+        if request.if_none_match.contains_weak(etag):
+            return Response(status=304, headers=headers)
+        
+        cart = cart_service.get_cart_items(session_id, lines)
+        return marshal(cart, cart_response), 200, headers
     
     @checkout_api.doc('clear_cart')
     def delete(self):
         """Clear cart"""
-        session_id = get_session_id()
+        session_id = get_session_id(create=False)
+        if not session_id:
+            return {'success': True}
         return cart_service.clear_cart(session_id)
 
 @checkout_api.route('/cart/add')
@@ -136,28 +159,35 @@ class ProcessCheckout(Resource):
     @checkout_api.expect(checkout_request, validate=True)
     @checkout_api.marshal_with(payment_intent_response)
     @checkout_api.doc('process_checkout')
+    @no_compression  # the client secret sits next to echoed user input (BREACH)
     def post(self):
         """Process checkout and create payment intent"""
         session_id = get_session_id()
         data = request.json
         
-        # Get cart
-        cart = cart_service.get_or_create_cart(session_id)
-        if not cart.items:
-            checkout_api.abort(400, 'Cart is empty')
-        
-        # Create order
-        payment_service = PaymentService(db.session)
-        order, error = payment_service.create_order_from_cart(cart.id, {
-            'email': data['email'],
-            'name': data['name'],
-            'phone': data.get('phone'),
-            'shipping_address': data['shipping_address'],
-            'currency': data.get('currency', 'USD')
-        })
+        # A retry after a busy provider pool pays the order made the first time
+        order = None
+        retry_order_id = session.pop('checkout_retry_order_id', None)
+        if retry_order_id is not None:
+            order = payment_service.pending_order(retry_order_id, cart_service.store.get(session_id))
         
-        if error:
-            checkout_api.abort(400, error)
+        if order is None:
+            # Write the cart to SQL only now, at checkout
+            cart = cart_service.materialize_cart(session_id)
+            if not cart:
+                checkout_api.abort(400, 'Cart is empty')
+            
+            # Create order
+            order, error = payment_service.create_order_from_cart(cart.id, {
+                'email': data['email'],
+                'name': data['name'],
+                'phone': data.get('phone'),
+                'shipping_address': data['shipping_address'],
+                'currency': data.get('currency', 'USD')
+            })
+            
+            if error:
+                checkout_api.abort(400, error)
         
         # Process payment
         result = payment_service.process_payment(
@@ -167,7 +197,8 @@ class ProcessCheckout(Resource):
         )
         
         if result['success']:
-            # Clear session cart ID so a new one is created next time
+            # The order now holds the cart's lines; a new cart and session id are made next time
+            cart_service.clear_cart(session_id)
             session.pop('cart_session_id', None)
             
             return {
@@ -178,6 +209,10 @@ class ProcessCheckout(Resource):
                 'currency': order.currency,
                 **result
             }
+        elif result.get('busy'):
+            # Nothing reached the provider; the cart and the order are kept for the retry
+            session['checkout_retry_order_id'] = order.id
+            return {'success': False, 'error': result['error']}, 503, {'Retry-After': '1'}
         else:
             return {
                 'success': False,
@@ -226,12 +261,87 @@ class OrderStatus(Resource):
             'items': items
         }
 
+def _fragment(body, mimetype='text/plain'):
+    """HTMX fragment; returned as a Response so restx does not JSON-encode it"""
+    return Response(body, mimetype=mimetype)
+
+def _bar_rows(rows):
+    """Horizontal bar chart rows for (label, value, caption) tuples"""
+    peak = max((value for _, value, _ in rows), default=0) or 1
+    html = '<div class="space-y-2">'
+    for label, value, caption in rows:
+        html += (
+            '<div class="flex items-center text-sm">'
+            f'<span class="w-28 text-gray-500">{label}</span>'
+            '<div class="flex-1 mx-2 h-3 bg-gray-100 rounded">'
+            f'<div class="h-3 bg-indigo-600 rounded" style="width: {value / peak * 100:.1f}%"></div>'
+            '</div>'
+            f'<span class="w-32 text-right text-gray-900">{caption}</span>'
+            '</div>'
+        )
+    return html + '</div>'
+
+@checkout_api.route('/stats/orders')
+class OrderStats(Resource):
+    def get(self):
+        """Get total number of orders"""
+        try:
+            count = stats_service.get(TOTAL_ORDERS)
+        except:
+            count = 0
+        return _fragment(str(count))
+
+@checkout_api.route('/stats/revenue')
+class RevenueStats(Resource):
+    def get(self):
+        """Get revenue from completed orders"""
+        return _fragment(f"${analytics_service.totals()['revenue']:,.2f}")
+
+@checkout_api.route('/stats/<string:status>')
+@checkout_api.param('status', 'pending, processing or completed')
+class OrderStatusStats(Resource):
+    def get(self, status):
+        """Get number of orders in a status"""
+        if status not in ('pending', 'processing', 'completed'):
+            checkout_api.abort(404, 'Unknown status')
+        return _fragment(str(analytics_service.totals()[status]))
+
+@checkout_api.route('/analytics/revenue-trend')
+class RevenueTrend(Resource):
+    @checkout_api.doc(params={'days': 'Number of days to show (default 14, max 90)'})
+    def get(self):
+        """Get completed revenue per day"""
+        days = min(max(request.args.get('days', 14, type=int), 1), 90)
+        trend = analytics_service.revenue_trend(days)
+        if not any(point['orders'] for point in trend):
+            return _fragment('<p class="text-sm text-gray-500">No completed payments yet.</p>', 'text/html')
+        return _fragment(_bar_rows([
+            (point['day'], point['revenue'], f"${point['revenue']:,.2f}") for point in trend
+        ]), 'text/html')
+
+@checkout_api.route('/analytics/payment-methods')
+class PaymentMethods(Resource):
+    def get(self):
+        """Get orders and completed revenue per payment provider"""
+        methods = analytics_service.payment_methods()
+        if not methods:
+            return _fragment('<p class="text-sm text-gray-500">No payments yet.</p>', 'text/html')
+        return _fragment(_bar_rows([
+            (method['provider'].replace('_', ' ').title(), method['orders'],
+             f"{method['orders']} orders, ${method['revenue']:,.2f}")
+            for method in methods
+        ]), 'text/html')
+
 @checkout_api.route('/webhook/<string:provider>')
 @checkout_api.param('provider', 'Payment provider name')
 class PaymentWebhook(Resource):
     @checkout_api.doc('payment_webhook', security=None)
     def post(self, provider):
-        """Handle payment provider webhooks"""
-        data = request.json
-        result = payment_service.handle_webhook(provider, data)
-        return result
+        """Receive a payment provider webhook; it is stored and processed in the background"""
+        try:
+            stored = WebhookService(db.session).receive(provider, request.get_data(), request.headers)
+        except ValueError as e:
+            checkout_api.abort(400, str(e))
+        if stored:
+            notify_webhook_consumer()
+        return {'success': True, 'duplicate': not stored}
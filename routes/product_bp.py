@@ -1,14 +1,13 @@
 # routes/product_bp.py
 from flask import Blueprint, request, jsonify, current_app
 from flask_restx import Namespace, Resource, fields, Api
-from werkzeug.utils import secure_filename
 from werkzeug.datastructures import FileStorage
-import os
-import time
 from models.product import db, Category, Product, ProductImage, Stock, Price
 from routes.admin_api import admin_api
 from routes.checkout_api import checkout_api
+from services.image_service import ImageService
 from services.product_service import ProductService
+from services.serialization import output_json
 # Import store API namespace
 from routes.store_api import store_api
 
@@ -54,6 +53,7 @@ def_price = api.model('Price', {
 })
 
 service = ProductService(db.session)
+image_service = ImageService(db.session)
 
 @api.route('/categories')
 class CategoryList(Resource):
@@ -85,23 +85,11 @@ class ProductImages(Resource):
         uploaded_file = args['file']
         
         if uploaded_file:
-            # Secure the filename
-            filename = secure_filename(uploaded_file.filename)
-            
-            # Create unique filename to avoid conflicts
-            timestamp = int(time.time())
-            unique_filename = f"{product_id}_{timestamp}_{filename}"
-            
-            # Define upload path
-            upload_folder = os.path.join(current_app.root_path, 'static', 'uploads', 'products')
-            os.makedirs(upload_folder, exist_ok=True)
-            
-            filepath = os.path.join(upload_folder, unique_filename)
-            uploaded_file.save(filepath)
-            
-            # Save to database using relative path
-            relative_path = f"uploads/products/{unique_filename}"
-            img = service.add_product_image(product_id, filename, relative_path)
+            # Stored once per content; thumbnails and variants are built in the background
+            try:
+                img = image_service.save_upload(product_id, uploaded_file)
+            except ValueError as e:
+                api.abort(400, str(e))
             return img, 201
         
         return {'message': 'No file uploaded'}, 400
@@ -115,6 +103,15 @@ class ProductImagesList(Resource):
         product = Product.query.get_or_404(product_id)
         return product.images
 
+@api.route('/<int:product_id>/images/<int:image_id>')
+class ProductImageItem(Resource):
+    @api.response(204, 'Image deleted')
+    def delete(self, product_id, image_id):
+        """Delete a product image (the file is kept while other images share it)"""
+        if not image_service.delete_image(product_id, image_id):
+            api.abort(404, 'Image not found')
+        return '', 204
+
 @api.route('/<int:product_id>/stock')
 class ProductStock(Resource):
     @api.expect(def_stock, validate=True)
@@ -143,6 +140,7 @@ restx_api = Api(api_bp,
     description='Admin product management and store operations',
     doc='/docs'  # This sets the Swagger UI path
 )
+restx_api.representation('application/json')(output_json)  # encode with the app's JSON provider
 
 # Register namespaces with clear paths
 restx_api.add_namespace(api, path='/products')
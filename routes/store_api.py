@@ -1,13 +1,15 @@
 # routes/store_api.py
 from flask import request, jsonify
-from flask_restx import Namespace, Resource, fields
-from services.store_service import StoreService
+from flask_restx import Namespace, Resource, fields, inputs
+from services.store_service import StoreService, clamp_per_page, MAX_PER_PAGE
+from services.serialization import serialize_with
+from services.stats_service import StatsService, CATEGORIES, LOW_STOCK, TOTAL_PRODUCTS
 from models.product import db, Product, Category, Price, Stock
 
 # Create namespace for store operations
 store_api = Namespace('store', description='Store operations')
 
-# Swagger models
+# Swagger models (listing and detail responses are serialized by compiled versions, see serialize_with)
 category_model = store_api.model('CategoryWithCount', {
     'id': fields.Integer(readonly=True),
     'name': fields.String(readonly=True),
@@ -26,7 +28,9 @@ product_summary_model = store_api.model('ProductSummary', {
         'id': fields.Integer(readonly=True),
         'name': fields.String(readonly=True)
     })),
-    'images': fields.List(fields.String, description='List of image URLs')
+    'images': fields.List(fields.String, description='List of image URLs'),
+    'thumbnail': fields.String(readonly=True, description='Card-sized URL of the first image'),
+    'srcset': fields.String(readonly=True, description='Responsive srcset of the first image')
 })
 
 product_detail_model = store_api.model('ProductDetail', {
@@ -42,7 +46,13 @@ product_detail_model = store_api.model('ProductDetail', {
         'id': fields.Integer(readonly=True),
         'filename': fields.String(readonly=True),
         'filepath': fields.String(readonly=True),
-        'url': fields.String(readonly=True)
+        'url': fields.String(readonly=True),
+        'thumbnail': fields.String(readonly=True),
+        'srcset': fields.String(readonly=True),
+        'sources': fields.List(fields.Nested(store_api.model('ImageSource', {
+            'type': fields.String(readonly=True, description='MIME type, for <picture><source type>'),
+            'srcset': fields.String(readonly=True)
+        })))
     })))
 })
 
@@ -52,7 +62,8 @@ pagination_model = store_api.model('PaginationInfo', {
     'total': fields.Integer(readonly=True),
     'pages': fields.Integer(readonly=True),
     'has_prev': fields.Boolean(readonly=True),
-    'has_next': fields.Boolean(readonly=True)
+    'has_next': fields.Boolean(readonly=True),
+    'next_cursor': fields.String(readonly=True, description='Token for the next page in cursor mode')
 })
 
 product_list_response = store_api.model('ProductListResponse', {
@@ -78,18 +89,48 @@ cart_add_response = store_api.model('CartAddResponse', {
 })
 
 service = StoreService(db.session)
+stats_service = StatsService(db.session)
 
 # Query parameters parsers
 pagination_parser = store_api.parser()
 pagination_parser.add_argument('page', type=int, default=1, help='Page number')
-pagination_parser.add_argument('per_page', type=int, default=12, help='Items per page')
+pagination_parser.add_argument('per_page', type=clamp_per_page, default=12,
+                               help=f'Items per page (1 to {MAX_PER_PAGE}; others are clamped)')
+pagination_parser.add_argument('cursor', type=str, help='Opaque cursor; pass an empty value to start keyset pagination')
+pagination_parser.add_argument('with_total', type=inputs.boolean, default=False,
+                               help='Include the total count in cursor mode')
 
 search_parser = pagination_parser.copy()
 search_parser.add_argument('search', type=str, default='', help='Search query')
 
+def _listing_response(result, args):
+    """Wrap a StoreService listing in the ProductListResponse shape"""
+    if 'next_cursor' in result:
+        # Keyset mode: no page numbers, the client follows next_cursor
+        pagination = {
+            'per_page': args['per_page'],
+            'total': result['total'],
+            'has_prev': bool(args['cursor']),
+            'has_next': result['next_cursor'] is not None,
+            'next_cursor': result['next_cursor']
+        }
+    else:
+        pagination = {
+            'page': result.get('current_page', args['page']),
+            'per_page': args['per_page'],
+            'total': result.get('total', 0),
+            'pages': result.get('pages', 0),
+            'has_prev': result.get('current_page', 1) > 1,
+            'has_next': result.get('current_page', 1) < result.get('pages', 0)
+        }
+    return {
+        'items': result.get('items', []),
+        'pagination': pagination
+    }
+
 @store_api.route('/categories')
 class CategoryList(Resource):
-    @store_api.marshal_list_with(category_model)
+    @serialize_with(category_model, as_list=True)
     @store_api.doc('list_categories')
     def get(self):
         """Get all categories with product count"""
@@ -98,49 +139,50 @@ class CategoryList(Resource):
 @store_api.route('/products')
 class ProductList(Resource):
     @store_api.expect(search_parser)
-    @store_api.marshal_with(product_list_response)
+    @serialize_with(product_list_response)
     @store_api.doc('list_products')
     def get(self):
         """Get products with pagination and search"""
         args = search_parser.parse_args()
-        result = service.get_all_products(
-            page=args['page'], 
-            per_page=args['per_page'], 
-            search=args['search']
-        )
+        try:
+            result = service.get_all_products(
+                page=args['page'], 
+                per_page=args['per_page'], 
+                search=args['search'],
+                cursor=args['cursor'],
+                with_total=args['with_total']
+            )
+        except ValueError as e:
+            store_api.abort(400, str(e))
         
-        # Ensure pagination info is complete
-        return {
-            'items': result.get('items', []),
-            'pagination': {
-                'page': result.get('current_page', args['page']),
-                'per_page': args['per_page'],
-                'total': result.get('total', 0),
-                'pages': result.get('pages', 0),
-                'has_prev': result.get('current_page', 1) > 1,
-                'has_next': result.get('current_page', 1) < result.get('pages', 0)
-            }
-        }
+        return _listing_response(result, args)
 
 @store_api.route('/category/<int:category_id>/products')
 @store_api.param('category_id', 'The category identifier')
 class CategoryProducts(Resource):
     @store_api.expect(pagination_parser)
-    @store_api.marshal_with(product_list_response)
+    @serialize_with(product_list_response)
     @store_api.doc('get_category_products')
     def get(self, category_id):
         """Get products for a specific category"""
         args = pagination_parser.parse_args()
-        return service.get_products_by_category(
-            category_id, 
-            page=args['page'], 
-            per_page=args['per_page']
-        )
+        try:
+            result = service.get_products_by_category(
+                category_id, 
+                page=args['page'], 
+                per_page=args['per_page'],
+                cursor=args['cursor'],
+                with_total=args['with_total']
+            )
+        except ValueError as e:
+            store_api.abort(400, str(e))
+        
+        return _listing_response(result, args)
 
 @store_api.route('/product/<int:product_id>')
 @store_api.param('product_id', 'The product identifier')
 class ProductDetail(Resource):
-    @store_api.marshal_with(product_detail_model)
+    @serialize_with(product_detail_model)
     @store_api.doc('get_product_details')
     def get(self, product_id):
         """Get detailed product information"""
@@ -150,7 +192,7 @@ class ProductDetail(Resource):
 class FeaturedProducts(Resource):
     @store_api.doc('get_featured_products')
     @store_api.param('limit', 'Maximum number of products to return', type=int, default=8)
-    @store_api.marshal_list_with(product_summary_model)
+    @serialize_with(product_summary_model, as_list=True)
     def get(self):
         """Get featured products for homepage"""
         limit = request.args.get('limit', 8, type=int)
@@ -255,7 +297,7 @@ class ProductStats(Resource):
     def get(self):
         """Get total number of products"""
         try:
-            count = Product.query.count()
+            count = stats_service.get(TOTAL_PRODUCTS)
             return str(count), 200, {'Content-Type': 'text/plain'}
         except:
             return "0", 200, {'Content-Type': 'text/plain'}
@@ -265,7 +307,7 @@ class CategoryStats(Resource):
     def get(self):
         """Get total number of categories"""
         try:
-            count = Category.query.count()
+            count = stats_service.get(CATEGORIES)
             return str(count), 200, {'Content-Type': 'text/plain'}
         except:
             return "0", 200, {'Content-Type': 'text/plain'}
@@ -273,9 +315,9 @@ class CategoryStats(Resource):
 @store_api.route('/stats/low-stock')
 class LowStockStats(Resource):
     def get(self):
-        """Get number of low stock items (less than 10)"""
+        """Get number of low stock items (below LOW_STOCK_THRESHOLD)"""
         try:
-            count = Stock.query.filter(Stock.quantity < 10).count()
+            count = stats_service.get(LOW_STOCK)
             return str(count), 200, {'Content-Type': 'text/plain'}
         except:
             return "0", 200, {'Content-Type': 'text/plain'}
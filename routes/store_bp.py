@@ -19,8 +19,14 @@ def api_products():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 12, type=int)
     search = request.args.get('search', '')
+    cursor = request.args.get('cursor')
+    with_total = request.args.get('with_total', 'false').lower() == 'true'
     
-    result = service.get_all_products(page=page, per_page=per_page, search=search)
+    try:
+        result = service.get_all_products(page=page, per_page=per_page, search=search,
+                                          cursor=cursor, with_total=with_total)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     return jsonify(result)
 
 @store_bp.route('/api/category/<int:category_id>/products')
@@ -28,8 +34,14 @@ def api_category_products(category_id):
     """Get products for a specific category"""
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 12, type=int)
+    cursor = request.args.get('cursor')
+    with_total = request.args.get('with_total', 'false').lower() == 'true'
     
-    result = service.get_products_by_category(category_id, page=page, per_page=per_page)
+    try:
+        result = service.get_products_by_category(category_id, page=page, per_page=per_page,
+                                                  cursor=cursor, with_total=with_total)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     return jsonify(result)
 
 @store_bp.route('/api/product/<int:product_id>')
@@ -97,16 +109,16 @@ def product_detail_page(product_id):
     """Product detail page"""
     product = service.get_product_details(product_id)
     
-    # Get related products from same category
-    related = service.get_products_by_category(
-        product['category']['id'], 
-        page=1, 
-        per_page=4
+    # Get related products from same category (batch-loaded by id)
+    related = service.get_related_products(
+        product_id,
+        product['category']['id'],
+        limit=4
     )
     
     return render_template('store/product_detail.html', 
                          product=product,
-                         related_products=related['items'])
+                         related_products=related)
 
 # Cart integration endpoints (to be implemented with cart service)
 @store_bp.route('/api/cart/add', methods=['POST'])
@@ -1,16 +1,16 @@
 from models.product import db, Product, Category, Stock, Price
+from services.stats_service import StatsService
+from services.analytics_service import PaymentAnalyticsService
 
 class AdminService:
     def __init__(self, db_session):
         self.db = db_session
+        self.stats = StatsService(db_session)
+        self.analytics = PaymentAnalyticsService(db_session)
 
     def get_dashboard_stats(self):
-        return {
-            'total_products': Product.query.count(),
-            'categories': Category.query.count(),
-            'low_stock': Stock.query.filter(Stock.quantity < 5).count(),
-            'total_orders': 0  # Placeholder, implement order model if needed
-        }
+        # Counters are kept current by the writes themselves; this is one small SELECT
+        return self.stats.snapshot()
 
     def get_recent_activity(self):
         # Placeholder: return latest products/categories
@@ -18,10 +18,5 @@ class AdminService:
         return [{'type': 'product', 'name': p.name} for p in products]
 
     def get_payments_stats(self):
-        # Placeholder: implement with real payment/order models
-        return {
-            'revenue': 0.0,
-            'pending': 0,
-            'processing': 0,
-            'completed': 0
-        }
+        # Read from the daily rollups, never from orders/payments directly
+        return self.analytics.totals()
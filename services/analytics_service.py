@@ -0,0 +1,210 @@
+# services/analytics_service.py
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import String, and_, case, cast, delete, func, insert, literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from models.product import db
+from models.payment import Order, Payment, PaymentProvider, PaymentStatus
+from models.stats import PaymentRollup
+
+UNASSIGNED = PaymentRollup.UNASSIGNED
+
+
+class PaymentAnalyticsService:
+    """Payment analytics served from the payment_daily_rollups table.
+
+    Every order sits in exactly one (creation day, provider, status) bucket.
+    Writers call the record_* methods inside their own transaction, before
+    changing the order, so the rollups commit or roll back with the change.
+    Readers only touch the rollups, never orders or payments.
+    """
+
+    def __init__(self, db_session):
+        self.db = db_session
+
+    def record_new_order(self, order):
+        """Count a freshly flushed order (does not commit)"""
+        self.apply([(order.created_at.date(), UNASSIGNED, order.status, 1, order.total_amount)])
+
+    def record_transitions(self, orders, status=None, provider=None):
+        """Move orders to a new status and/or provider bucket (does not commit).
+
+        orders may be Order instances or rows with id, status, created_at and
+        total_amount. Call before the orders themselves are changed.
+        """
+        if not orders:
+            return
+        current = self.providers_of([order.id for order in orders])
+        changes = []
+        for order in orders:
+            day, amount = order.created_at.date(), order.total_amount
+            old_provider = current.get(order.id, UNASSIGNED)
+            changes.append((day, old_provider, order.status, -1, -amount))
+            changes.append((day, provider.name if provider else old_provider, status or order.status, 1, amount))
+        self.apply(changes)
+
+    def providers_of(self, order_ids):
+        """Provider name of each order's latest payment attempt"""
+        rows = self.db.query(Payment.order_id, Payment.provider).filter(
+            Payment.id.in_(_latest_payment_ids().where(Payment.order_id.in_(order_ids)))
+        )
+        return {order_id: provider.name for order_id, provider in rows}
+
+    def apply(self, changes):
+        """Add [(day, provider, status, count, amount), ...] to the rollups in one statement"""
+        totals = defaultdict(lambda: [0, Decimal('0')])
+        for day, provider, status, count, amount in changes:
+            bucket = totals[(day, provider, status)]
+            bucket[0] += count
+            bucket[1] += Decimal(amount or 0)
+        rows = [{
+            'day': day,
+            'provider': provider,
+            'status': status,
+            'order_count': count,
+            'amount': amount
+        } for (day, provider, status), (count, amount) in totals.items() if count or amount]
+        if not rows:
+            return
+
+        stmt = self._upsert()
+        if stmt is None:
+            self._apply_portable(rows)
+            return
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['day', 'provider', 'status'],
+            set_={
+                'order_count': PaymentRollup.order_count + stmt.excluded.order_count,
+                'amount': PaymentRollup.amount + stmt.excluded.amount
+            }
+        )
+        self.db.execute(stmt, rows)
+
+    def _upsert(self):
+        dialect = self.db.get_bind().dialect.name
+        if dialect == 'sqlite':
+            return sqlite.insert(PaymentRollup)
+        if dialect == 'postgresql':
+            return postgresql.insert(PaymentRollup)
+        return None
+
+    def _apply_portable(self, rows):
+        # Databases without INSERT .. ON CONFLICT: update, then insert what was missing
+        for row in rows:
+            updated = self.db.execute(
+                update(PaymentRollup)
+                .where(PaymentRollup.day == row['day'],
+                       PaymentRollup.provider == row['provider'],
+                       PaymentRollup.status == row['status'])
+                .values(order_count=PaymentRollup.order_count + row['order_count'],
+                        amount=PaymentRollup.amount + row['amount'])
+                .execution_options(synchronize_session=False)
+            )
+            if not updated.rowcount:
+                self.db.execute(insert(PaymentRollup), [row])
+
+    def rebuild(self, since=None):
+        """Recompute the rollups from orders and payments (from day `since` onwards, if given)"""
+        day = func.date(Order.created_at)
+        provider = func.coalesce(cast(Payment.provider, String), literal(UNASSIGNED))
+        query = (
+            select(day, provider, Order.status,
+                   func.count(Order.id), func.coalesce(func.sum(Order.total_amount), 0))
+            .select_from(Order)
+            .outerjoin(Payment, and_(Payment.order_id == Order.id,
+                                     Payment.id.in_(_latest_payment_ids())))
+            .group_by(day, provider, Order.status)
+        )
+        clear = delete(PaymentRollup)
+        if since:
+            query = query.where(Order.created_at >= datetime.combine(since, datetime.min.time()))
+            clear = clear.where(PaymentRollup.day >= since)
+
+        self.db.execute(clear.execution_options(synchronize_session=False))
+        self.db.execute(
+            insert(PaymentRollup.__table__).from_select(
+                ['day', 'provider', 'status', 'order_count', 'amount'], query
+            )
+        )
+        self.db.commit()
+
+    def totals(self):
+        """Revenue from completed orders plus order counts by status"""
+        rows = self.db.query(
+            PaymentRollup.status,
+            func.sum(PaymentRollup.order_count),
+            func.sum(PaymentRollup.amount)
+        ).group_by(PaymentRollup.status).all()
+        by_status = {status: (count or 0, amount or 0) for status, count, amount in rows}
+
+        def count(status):
+            return int(by_status.get(status, (0, 0))[0])
+
+        return {
+            'revenue': float(by_status.get(PaymentStatus.COMPLETED, (0, 0))[1]),
+            'pending': count(PaymentStatus.PENDING),
+            'processing': count(PaymentStatus.PROCESSING),
+            'completed': count(PaymentStatus.COMPLETED)
+        }
+
+    def revenue_trend(self, days=30):
+        """Completed revenue per day for the last `days` days, oldest first"""
+        start = datetime.utcnow().date() - timedelta(days=days - 1)
+        rows = self.db.query(
+            PaymentRollup.day,
+            func.sum(PaymentRollup.order_count),
+            func.sum(PaymentRollup.amount)
+        ).filter(
+            PaymentRollup.status == PaymentStatus.COMPLETED,
+            PaymentRollup.day >= start
+        ).group_by(PaymentRollup.day).all()
+        by_day = {day: (count, amount) for day, count, amount in rows}
+
+        trend = []
+        for offset in range(days):
+            day = start + timedelta(days=offset)
+            count, amount = by_day.get(day, (0, 0))
+            trend.append({'day': day.isoformat(), 'orders': int(count), 'revenue': float(amount)})
+        return trend
+
+    def payment_methods(self):
+        """Orders and completed revenue per payment provider"""
+        completed = PaymentRollup.status == PaymentStatus.COMPLETED
+        rows = self.db.query(
+            PaymentRollup.provider,
+            func.sum(PaymentRollup.order_count),
+            func.sum(case((completed, PaymentRollup.order_count), else_=0)),
+            func.sum(case((completed, PaymentRollup.amount), else_=0))
+        ).filter(
+            PaymentRollup.provider != UNASSIGNED
+        ).group_by(PaymentRollup.provider).all()
+
+        return sorted([{
+            'provider': PaymentProvider[provider].value,
+            'orders': int(orders or 0),
+            'completed': int(completed_orders or 0),
+            'revenue': float(revenue or 0)
+        } for provider, orders, completed_orders, revenue in rows], key=lambda m: -m['orders'])
+
+
+def _latest_payment_ids():
+    # Used inside queries on payments itself, so never correlate
+    return select(func.max(Payment.id)).group_by(Payment.order_id).correlate(None)
+
+
+@click.group('analytics')
+def analytics_cli():
+    """Manage payment analytics rollups."""
+
+
+@analytics_cli.command('rebuild')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Only recompute days from this date (YYYY-MM-DD) onwards.')
+@with_appcontext
+def rebuild_command(since):
+    """Recompute payment_daily_rollups from orders and payments."""
+    PaymentAnalyticsService(db.session).rebuild(since.date() if since else None)
+    click.echo('Payment rollups rebuilt.')
@@ -0,0 +1,226 @@
+# services/assets.py
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+from stat import S_ISREG
+import click
+from flask import abort, current_app, request, send_file
+from flask.cli import with_appcontext
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip variants are built
+    brotli = None
+
+FINGERPRINT_LENGTH = 12
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Text assets worth precompressing; images and fonts are compressed already
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.json', '.map', '.svg', '.txt', '.xml', '.html', '.ico',
+                           '.webmanifest'}
+# Preferred first
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+mimetypes.add_type('image/avif', '.avif')
+mimetypes.add_type('image/webp', '.webp')
+
+_FINGERPRINTED = re.compile(r'^(?P<stem>.+)\.(?P<fingerprint>[0-9a-f]{%d})(?P<ext>\.[^./]+)$' % FINGERPRINT_LENGTH)
+_CONTENT_HASH_NAME = re.compile(r'^[0-9a-f]{64}$')
+_SKIPPED_SUFFIXES = ('.gz', '.br', '.tmp', '.part')
+
+
+class AssetManifest:
+    """Content fingerprints of the files under static/, for immutable asset URLs.
+
+    url('img/logo.webp') gives /assets/img/logo.<fingerprint>.webp. A
+    fingerprint is kept with the file's mtime and size and only recomputed
+    when either changes, so a cheap stat() is all a URL costs once known.
+    `flask assets build` precomputes every fingerprint into a manifest file
+    loaded at startup.
+    """
+
+    def __init__(self, static_folder, manifest_path=None, url_prefix='/assets'):
+        self.static_folder = static_folder
+        self.manifest_path = manifest_path
+        self.url_prefix = url_prefix
+        self._entries = {}  # path -> (mtime_ns, size, fingerprint)
+        self._load()
+
+    def url(self, path):
+        """Fingerprinted URL of a static file; the plain /static/ URL if it does not exist"""
+        fingerprint = self.fingerprint(path)
+        if fingerprint is None:
+            return f'/static/{path}'
+        stem, ext = os.path.splitext(path)
+        return f'{self.url_prefix}/{stem}.{fingerprint}{ext}'
+
+    def fingerprint(self, path):
+        full_path = safe_join(self.static_folder, path)
+        if full_path is None:
+            return None
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            return None
+        if not S_ISREG(stat.st_mode):
+            return None
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return entry[2]
+        fingerprint = _name_fingerprint(path) or _hash_file(full_path)
+        self._entries[path] = (stat.st_mtime_ns, stat.st_size, fingerprint)
+        return fingerprint
+
+    def build(self, compress=True):
+        """Fingerprint every static file and precompress text assets; returns (files, compressed)"""
+        files = compressed = 0
+        for root, _, names in os.walk(self.static_folder):
+            for name in names:
+                if name.endswith(_SKIPPED_SUFFIXES):
+                    continue
+                full_path = os.path.join(root, name)
+                path = os.path.relpath(full_path, self.static_folder).replace(os.sep, '/')
+                if self.fingerprint(path) is None:
+                    continue
+                files += 1
+                if compress and _compressible(path):
+                    compressed += _precompress(full_path)
+        self._save()
+        return files, compressed
+
+    def _load(self):
+        if not self.manifest_path or not os.path.exists(self.manifest_path):
+            return
+        with open(self.manifest_path) as f:
+            self._entries = {path: tuple(entry) for path, entry in json.load(f).items()}
+
+    def _save(self):
+        if not self.manifest_path:
+            return
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        tmp_path = f'{self.manifest_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._entries, f, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+
+def _name_fingerprint(path):
+    # Content-addressed uploads (see services/upload_storage.py) carry their hash in the name
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem[:FINGERPRINT_LENGTH] if _CONTENT_HASH_NAME.match(stem) else None
+
+
+def _hash_file(full_path):
+    digest = hashlib.sha256()
+    with open(full_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:FINGERPRINT_LENGTH]
+
+
+def _compressible(path):
+    return os.path.splitext(path)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+def _precompress(full_path):
+    """Write fresh .gz (and .br) next to a file; returns how many were (re)written"""
+    with open(full_path, 'rb') as f:
+        data = f.read()
+    written = 0
+    for encoding, suffix in PRECOMPRESSED:
+        if encoding == 'br' and brotli is None:
+            continue
+        target = full_path + suffix
+        if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(full_path):
+            continue
+        body = brotli.compress(data, quality=11) if encoding == 'br' else gzip.compress(data, 9, mtime=0)
+        tmp_path = f'{target}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, target)
+        written += 1
+    return written
+
+
+def _precompressed_variant(full_path):
+    """(encoding, path) of a fresh precompressed copy the client accepts, or (None, full_path)"""
+    for encoding, suffix in PRECOMPRESSED:
+        if not request.accept_encodings[encoding]:
+            continue
+        candidate = full_path + suffix
+        try:
+            if os.path.getmtime(candidate) >= os.path.getmtime(full_path):
+                return encoding, candidate
+        except OSError:
+            continue
+    return None, full_path
+
+
+def serve_asset(filename):
+    """Serve /assets/<stem>.<fingerprint><ext> from static/ with a one-year immutable lifetime"""
+    match = _FINGERPRINTED.match(filename)
+    if not match:
+        abort(404)
+    path = match.group('stem') + match.group('ext')
+    manifest = get_asset_manifest()
+    current = manifest.fingerprint(path)
+    if current is None:
+        abort(404)
+
+    full_path = safe_join(manifest.static_folder, path)
+    encoding, body_path = _precompressed_variant(full_path) if _compressible(path) else (None, full_path)
+    # send_file answers Range and If-None-Match/If-Modified-Since, and uses the server's
+    # file wrapper (sendfile) or X-Sendfile when USE_X_SENDFILE is set
+    fresh = current == match.group('fingerprint')
+    response = send_file(body_path, mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream',
+                         conditional=True, etag=True, max_age=IMMUTABLE_MAX_AGE if fresh else 0)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if _compressible(path):
+        response.vary.add('Accept-Encoding')
+
+    if fresh:
+        response.cache_control.immutable = True
+    else:
+        # An outdated fingerprint (the file changed since the page was rendered): never cache it
+        response.cache_control.no_cache = True
+    return response
+
+
+def asset_url(path):
+    """Fingerprinted URL for a path under static/ (Jinja global)"""
+    return get_asset_manifest().url(path)
+
+
+def init_assets(app):
+    manifest = AssetManifest(
+        app.static_folder,
+        manifest_path=app.config.get('ASSETS_MANIFEST') or os.path.join(app.instance_path, 'assets-manifest.json')
+    )
+    app.extensions['asset_manifest'] = manifest
+    app.add_url_rule(f'{manifest.url_prefix}/<path:filename>', 'assets', serve_asset)
+    app.jinja_env.globals['asset_url'] = asset_url
+    return manifest
+
+
+def get_asset_manifest():
+    return current_app.extensions['asset_manifest']
+
+
+@click.group('assets')
+def assets_cli():
+    """Fingerprint and precompress static assets."""
+
+
+@assets_cli.command('build')
+@click.option('--no-compress', is_flag=True, help='Only write the fingerprint manifest.')
+@with_appcontext
+def build_command(no_compress):
+    """Fingerprint static files and write .gz/.br copies of text assets."""
+    files, compressed = get_asset_manifest().build(compress=not no_compress)
+    note = '' if brotli is not None else ' (install brotli for .br copies)'
+    click.echo(f'Fingerprinted {files} file(s), wrote {compressed} precompressed cop(ies){note}.')
@@ -0,0 +1,143 @@
+# services/cache_service.py
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class CatalogCache:
+    """Process-wide TTL + LRU cache for catalog reads.
+
+    Entries are stored with a set of tags (e.g. ``product:12``, ``category:3``,
+    ``featured``) so writes can invalidate exactly the entries they affect.
+    Cached values are shared between requests and must be treated as read-only.
+    """
+
+    def __init__(self, ttl=300, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = True
+        self._entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tags = {}  # tag -> set of keys
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app, config_prefix='CATALOG_CACHE', name='catalog_cache'):
+        """Configure the cache from <config_prefix>_TTL/_MAX_ENTRIES/_ENABLED in the app config"""
+        self.ttl = app.config.get(f'{config_prefix}_TTL', self.ttl)
+        self.max_entries = app.config.get(f'{config_prefix}_MAX_ENTRIES', self.max_entries)
+        self.enabled = app.config.get(f'{config_prefix}_ENABLED', self.enabled)
+        app.extensions[name] = self
+        self.clear()
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value, _ = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, tags=()):
+        """Store value under key, tagged for later invalidation"""
+        if not self.enabled:
+            return value
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            tags = frozenset(tags)
+            self._entries[key] = (time.monotonic() + self.ttl, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+        return value
+
+    def get_or_load(self, key, loader, tags=()):
+        """Return cached value or call loader() and cache its result.
+
+        tags may be a callable taking the loaded value, for entries whose tags
+        depend on what was loaded (e.g. the product ids in a listing).
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        value = loader()
+        if callable(tags):
+            tags = tags(value)
+        return self.set(key, value, tags)
+
+    def invalidate(self, *tags):
+        """Drop every entry carrying any of the given tags"""
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+
+    def invalidate_on_commit(self, session, *tags):
+        """Invalidate tags when session's current transaction commits.
+
+        For writes made inside a larger transaction: invalidating right away
+        would let a concurrent reader re-cache the old, still committed values.
+        """
+        session.info.setdefault(_PENDING_TAGS, {}).setdefault(self, set()).update(tags)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _remove(self, key):
+        # Caller must hold self._lock
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def product_tag(product_id):
+    return f'product:{int(product_id)}'
+
+
+def category_tag(category_id):
+    return f'category:{int(category_id)}'
+
+
+_PENDING_TAGS = 'catalog_cache_pending_tags'  # cache -> tags
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_pending(session):
+    pending = session.info.pop(_PENDING_TAGS, None)
+    for cache, tags in (pending or {}).items():
+        cache.invalidate(*tags)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(_PENDING_TAGS, None)
+
+
+# Single cache shared by every StoreService/ProductService in the process
+catalog_cache = CatalogCache()
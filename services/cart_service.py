@@ -1,123 +1,145 @@
+import hashlib
+import json
+from sqlalchemy import insert, delete
+from sqlalchemy.orm import joinedload, selectinload
 from models.payment import Cart, CartItem
-from models.product import Product, Stock
-import uuid
+from models.product import Price, Product, Stock
+from services.assets import asset_url
+from services.cart_store import get_cart_store
 
 class CartService:
-    def __init__(self, db_session):
+    def __init__(self, db_session, store=None):
         self.db = db_session
-        
-    def get_or_create_cart(self, session_id):
-        """Get existing cart or create new one"""
-        cart = Cart.query.filter_by(session_id=session_id).first()
-        if not cart:
-            cart = Cart(session_id=session_id)
-            self.db.add(cart)
-            self.db.commit()
-        return cart
-    
+        self._store = store
+
+    @property
+    def store(self):
+        """Cart backend; defaults to the one configured on the app"""
+        return self._store or get_cart_store()
+
     def add_to_cart(self, session_id, product_id, quantity=1):
         """Add product to cart"""
-        cart = self.get_or_create_cart(session_id)
-        
         # Check if product exists and has stock
-        product = Product.query.get(product_id)
-        if not product:
+        stock = self.db.query(Stock.quantity).filter_by(product_id=product_id).scalar()
+        if stock is None and not self.db.get(Product, product_id):
             return {'success': False, 'error': 'Product not found'}
-            
-        if not product.stock or product.stock.quantity < quantity:
+
+        # Include what is already in the cart
+        new_quantity = self.store.get(session_id).get(product_id, 0) + quantity
+        if not stock or stock < new_quantity:
             return {'success': False, 'error': 'Insufficient stock'}
-        
-        # Check if item already in cart
-        cart_item = CartItem.query.filter_by(
-            cart_id=cart.id,
-            product_id=product_id
-        ).first()
-        
-        if cart_item:
-            # Update quantity
-            new_quantity = cart_item.quantity + quantity
-            if product.stock.quantity < new_quantity:
-                return {'success': False, 'error': 'Insufficient stock'}
-            cart_item.quantity = new_quantity
-        else:
-            # Add new item
-            cart_item = CartItem(
-                cart_id=cart.id,
-                product_id=product_id,
-                quantity=quantity
-            )
-            self.db.add(cart_item)
-        
-        self.db.commit()
-        return {'success': True, 'cart_item': cart_item}
-    
+
+        new_quantity = self.store.add(session_id, product_id, quantity)
+        return {'success': True, 'quantity': new_quantity}
+
     def update_cart_item(self, session_id, product_id, quantity):
         """Update cart item quantity"""
-        cart = Cart.query.filter_by(session_id=session_id).first()
-        if not cart:
+        lines = self.store.get(session_id)
+        if not lines:
             return {'success': False, 'error': 'Cart not found'}
-            
-        cart_item = CartItem.query.filter_by(
-            cart_id=cart.id,
-            product_id=product_id
-        ).first()
-        
-        if not cart_item:
+
+        if product_id not in lines:
             return {'success': False, 'error': 'Item not in cart'}
-            
+
         # Check stock
-        product = Product.query.get(product_id)
-        if product.stock.quantity < quantity:
-            return {'success': False, 'error': 'Insufficient stock'}
-            
-        if quantity == 0:
-            self.db.delete(cart_item)
-        else:
-            cart_item.quantity = quantity
-            
-        self.db.commit()
+        if quantity > 0:
+            stock = self.db.query(Stock.quantity).filter_by(product_id=product_id).scalar()
+            if not stock or stock < quantity:
+                return {'success': False, 'error': 'Insufficient stock'}
+
+        self.store.set_quantity(session_id, product_id, quantity)
         return {'success': True}
-    
+
     def remove_from_cart(self, session_id, product_id):
         """Remove item from cart"""
         return self.update_cart_item(session_id, product_id, 0)
-    
-    def get_cart_items(self, session_id):
-        """Get all items in cart with details"""
-        cart = Cart.query.filter_by(session_id=session_id).first()
-        if not cart:
-            return []
-            
+
+    def get_cart_items(self, session_id, lines=None):
+        """Get all items in cart with details (lines may be passed if already read from the store)"""
+        if lines is None:
+            lines = self.store.get(session_id) if session_id else {}
+
         items = []
         total = 0
-        
-        for cart_item in cart.items:
-            product = cart_item.product
-            price = product.price.amount if product.price else 0
-            item_total = price * cart_item.quantity
-            total += item_total
-            
-            items.append({
-                'product_id': product.id,
-                'product_name': product.name,
-                'quantity': cart_item.quantity,
-                'unit_price': float(price),
-                'total_price': float(item_total),
-                'stock_available': product.stock.quantity if product.stock else 0,
-                'image': product.images[0].filepath if product.images else None
-            })
-            
+
+        if lines:
+            products = Product.query.options(
+                joinedload(Product.price),
+                joinedload(Product.stock),
+                selectinload(Product.images)
+            ).filter(Product.id.in_(lines)).all()
+            by_id = {product.id: product for product in products}
+
+            for product_id, quantity in lines.items():
+                product = by_id.get(product_id)
+                if not product:
+                    continue
+                price = product.price.amount if product.price else 0
+                item_total = price * quantity
+                total += item_total
+
+                items.append({
+                    'product_id': product.id,
+                    'product_name': product.name,
+                    'quantity': quantity,
+                    'unit_price': float(price),
+                    'total_price': float(item_total),
+                    'stock_available': product.stock.quantity if product.stock else 0,
+                    'image': product.images[0].filepath if product.images else None,
+                    'image_url': asset_url(product.images[0].filepath) if product.images else None
+                })
+
         return {
             'items': items,
             'total': float(total),
             'item_count': sum(item['quantity'] for item in items)
         }
-    
+
+    def cart_etag(self, session_id, lines):
+        """Validator for a session's cart, cheap enough to check before building it.
+
+        The store's version changes with every write to the cart, and one
+        narrow query adds the current prices and stock levels of its
+        products, so a change made by any worker changes the ETag too.
+        """
+        if not lines:
+            return 'cart-empty'
+        catalog = self.db.query(Product.id, Price.amount, Stock.quantity).select_from(Product) \
+            .outerjoin(Price, Price.product_id == Product.id) \
+            .outerjoin(Stock, Stock.product_id == Product.id) \
+            .filter(Product.id.in_(lines)).order_by(Product.id).all()
+        prices_and_stock = [[product_id, str(amount), quantity] for product_id, amount, quantity in catalog]
+        state = json.dumps([self.store.version(session_id), prices_and_stock])
+        return hashlib.sha1(state.encode()).hexdigest()[:20]
+
+    def materialize_cart(self, session_id):
+        """Write the session's cart to the SQL tables for checkout; None if it is empty"""
+        lines = self.store.get(session_id)
+        if not lines:
+            return None
+
+        cart = Cart.query.filter_by(session_id=session_id).first()
+        if not cart:
+            cart = Cart(session_id=session_id)
+            self.db.add(cart)
+            self.db.flush()
+        else:
+            # Left over from an earlier, failed checkout attempt
+            self.db.execute(
+                delete(CartItem)
+                .where(CartItem.cart_id == cart.id)
+                .execution_options(synchronize_session=False)
+            )
+
+        self.db.execute(insert(CartItem), [{
+            'cart_id': cart.id,
+            'product_id': product_id,
+            'quantity': quantity
+        } for product_id, quantity in lines.items()])
+        self.db.commit()
+        return cart
+
     def clear_cart(self, session_id):
         """Clear all items from cart"""
-        cart = Cart.query.filter_by(session_id=session_id).first()
-        if cart:
-            for item in cart.items:
-                self.db.delete(item)
-            self.db.commit()
+        self.store.clear(session_id)
         return {'success': True}
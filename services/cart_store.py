@@ -0,0 +1,175 @@
+# services/cart_store.py
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from flask import current_app
+
+
+class CartStore(ABC):
+    """Where anonymous carts live until checkout.
+
+    A cart is a mapping of product_id -> quantity keyed by the cart session id,
+    plus a version token replaced on every write. Carts are only written to
+    the SQL carts/cart_items tables at checkout.
+    """
+
+    @abstractmethod
+    def get(self, session_id):
+        """Return {product_id: quantity} for a cart (empty dict if there is none)"""
+        pass
+
+    @abstractmethod
+    def version(self, session_id):
+        """Return a token that changes whenever the cart is written (None if there is no cart)"""
+        pass
+
+    @abstractmethod
+    def add(self, session_id, product_id, quantity):
+        """Increase a line's quantity and return the new quantity"""
+        pass
+
+    @abstractmethod
+    def set_quantity(self, session_id, product_id, quantity):
+        """Set a line's quantity; 0 removes the line"""
+        pass
+
+    @abstractmethod
+    def clear(self, session_id):
+        pass
+
+
+class MemoryCartStore(CartStore):
+    """In-process cart store with idle expiry and a cap on the number of carts.
+
+    Carts are not shared between worker processes; use RedisCartStore when the
+    app runs with more than one process.
+    """
+
+    def __init__(self, ttl=7 * 24 * 3600, max_carts=100000):
+        self.ttl = ttl
+        self.max_carts = max_carts
+        self._carts = OrderedDict()  # session_id -> (expires_at, version, {product_id: quantity})
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._live_entry(session_id)
+            return dict(entry[2]) if entry else {}
+
+    def version(self, session_id):
+        with self._lock:
+            entry = self._live_entry(session_id)
+            return entry[1] if entry else None
+
+    def add(self, session_id, product_id, quantity):
+        with self._lock:
+            lines = self._touch(session_id)
+            lines[product_id] = lines.get(product_id, 0) + quantity
+            return lines[product_id]
+
+    def set_quantity(self, session_id, product_id, quantity):
+        with self._lock:
+            lines = self._touch(session_id)
+            if quantity > 0:
+                lines[product_id] = quantity
+            else:
+                lines.pop(product_id, None)
+
+    def clear(self, session_id):
+        with self._lock:
+            self._carts.pop(session_id, None)
+
+    def _live_entry(self, session_id):
+        # Caller must hold self._lock
+        entry = self._carts.get(session_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._carts[session_id]
+            return None
+        return entry
+
+    def _touch(self, session_id):
+        # Caller must hold self._lock; returns the mutable lines dict, creating it if needed
+        entry = self._live_entry(session_id)
+        lines = entry[2] if entry else {}
+        self._carts[session_id] = (time.monotonic() + self.ttl, uuid.uuid4().hex, lines)
+        self._carts.move_to_end(session_id)
+        while len(self._carts) > self.max_carts:
+            self._carts.popitem(last=False)
+        return lines
+
+
+class RedisCartStore(CartStore):
+    """Cart store for any server speaking the Redis protocol.
+
+    Each cart is a hash ``cart:<session_id>`` of product_id -> quantity and a
+    key ``cart:<session_id>:version``; every write replaces the version and
+    pushes back the expiry of both.
+    """
+
+    def __init__(self, url, ttl=7 * 24 * 3600, prefix='cart:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CART_BACKEND='redis' requires the 'redis' package")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, session_id):
+        return f'{self.prefix}{session_id}'
+
+    def get(self, session_id):
+        raw = self.client.hgetall(self._key(session_id))
+        return {int(pid): int(qty) for pid, qty in raw.items()}
+
+    def version(self, session_id):
+        version = self.client.get(self._key(session_id) + ':version')
+        return version.decode() if version is not None else None
+
+    def add(self, session_id, product_id, quantity):
+        key = self._key(session_id)
+        pipe = self.client.pipeline()
+        pipe.hincrby(key, product_id, quantity)
+        self._written(pipe, key)
+        new_quantity = pipe.execute()[0]
+        return int(new_quantity)
+
+    def set_quantity(self, session_id, product_id, quantity):
+        key = self._key(session_id)
+        pipe = self.client.pipeline()
+        if quantity > 0:
+            pipe.hset(key, product_id, quantity)
+        else:
+            pipe.hdel(key, product_id)
+        self._written(pipe, key)
+        pipe.execute()
+
+    def clear(self, session_id):
+        key = self._key(session_id)
+        self.client.delete(key, key + ':version')
+
+    def _written(self, pipe, key):
+        pipe.expire(key, self.ttl)
+        pipe.set(key + ':version', uuid.uuid4().hex, ex=self.ttl)
+
+
+def init_cart_store(app):
+    """Build the cart store selected by CART_BACKEND"""
+    backend = app.config.get('CART_BACKEND', 'memory')
+    ttl = app.config.get('CART_TTL', 7 * 24 * 3600)
+    if backend == 'redis':
+        store = RedisCartStore(app.config['CART_REDIS_URL'], ttl=ttl)
+    elif backend == 'memory':
+        store = MemoryCartStore(ttl=ttl, max_carts=app.config.get('CART_MEMORY_MAX_CARTS', 100000))
+    else:
+        raise ValueError(f'Unknown CART_BACKEND {backend!r}')
+    app.extensions['cart_store'] = store
+    return store
+
+
+def get_cart_store():
+    return current_app.extensions['cart_store']
@@ -0,0 +1,147 @@
+# services/compression.py
+import gzip
+import zlib
+from functools import wraps
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional: br is only offered when installed
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional: zstd is only offered when installed
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+    'text/html', 'text/plain', 'text/css', 'text/javascript', 'text/xml', 'text/csv', 'text/event-stream'
+}
+
+_SKIP_KEY = 'compression.skip'  # set by @no_compression on the current request
+
+# Fast settings: these responses are compressed on every request, not once like static assets
+DEFAULT_LEVELS = {'gzip': 6, 'br': 4, 'zstd': 3}
+
+
+class ResponseCompressor:
+    """Negotiated gzip/brotli/zstd encoding of dynamic responses.
+
+    The encoding is the one with the highest client q-value, ties going to
+    the first of `algorithms`. Bodies under min_size bytes are sent as-is;
+    streamed responses are compressed chunk by chunk and flushed after each
+    one, so clients still see every chunk as soon as it is produced.
+    Files from send_file, ranges and responses marked no-transform are left
+    alone, as are views decorated with @no_compression.
+    """
+
+    def __init__(self, algorithms=('zstd', 'br', 'gzip'), min_size=500, levels=None, streaming=True):
+        self.algorithms = [name for name in algorithms if _available(name)]
+        self.min_size = min_size
+        self.levels = dict(DEFAULT_LEVELS, **(levels or {}))
+        self.streaming = streaming
+
+    def negotiate(self, accept_encodings):
+        best, best_quality = None, 0
+        for name in self.algorithms:
+            quality = accept_encodings[name]
+            if quality > best_quality:
+                best, best_quality = name, quality
+        return best
+
+    def compress(self, encoding, data):
+        level = self.levels[encoding]
+        if encoding == 'gzip':
+            return gzip.compress(data, level, mtime=0)
+        if encoding == 'br':
+            return brotli.compress(data, quality=level)
+        return zstandard.ZstdCompressor(level=level).compress(data)
+
+    def compress_stream(self, encoding, chunks):
+        level = self.levels[encoding]
+        if encoding == 'gzip':
+            compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+            process = lambda chunk: compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            finish = compressor.flush
+        elif encoding == 'br':
+            compressor = brotli.Compressor(quality=level)
+            process = lambda chunk: compressor.process(chunk) + compressor.flush()
+            finish = compressor.finish
+        else:
+            compressor = zstandard.ZstdCompressor(level=level).compressobj()
+            process = lambda chunk: compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            finish = compressor.flush
+        for chunk in chunks:
+            if chunk:
+                yield process(chunk)
+        yield finish()
+
+    def after_request(self, response):
+        if not self._eligible(response):
+            return response
+        # The body depends on Accept-Encoding whether or not this client gets it compressed
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            if not self.streaming:
+                return response
+            original = response.response
+            response.response = self.compress_stream(encoding, response.iter_encoded())
+            if hasattr(original, 'close'):
+                response.call_on_close(original.close)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            response.set_data(self.compress(encoding, data))
+
+        response.headers['Content-Encoding'] = encoding
+        # A strong validator must not match a different encoding of the body
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def _eligible(self, response):
+        return (
+            request.method != 'HEAD'
+            and not request.environ.get(_SKIP_KEY)
+            and not response.direct_passthrough  # send_file; static assets are precompressed instead
+            and 200 <= response.status_code < 300 and response.status_code not in (204, 206)
+            and 'Content-Encoding' not in response.headers
+            and response.mimetype in COMPRESSIBLE_MIMETYPES
+            and not response.cache_control.no_transform
+        )
+
+
+def _available(name):
+    return name == 'gzip' or (name == 'br' and brotli is not None) or (name == 'zstd' and zstandard is not None)
+
+
+def no_compression(view):
+    """Send this view's responses uncompressed (works on Flask views and restx Resource methods)"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        request.environ[_SKIP_KEY] = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def init_compression(app):
+    """Compress responses after every request unless COMPRESSION_ENABLED is off"""
+    compressor = None
+    if app.config.get('COMPRESSION_ENABLED', True):
+        compressor = ResponseCompressor(
+            algorithms=app.config.get('COMPRESSION_ALGORITHMS', ('zstd', 'br', 'gzip')),
+            min_size=app.config.get('COMPRESSION_MIN_SIZE', 500),
+            levels=app.config.get('COMPRESSION_LEVELS'),
+            streaming=app.config.get('COMPRESSION_STREAMING', True)
+        )
+        app.after_request(compressor.after_request)
+    app.extensions['compression'] = compressor
+    return compressor
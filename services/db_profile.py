@@ -0,0 +1,60 @@
+# services/db_profile.py
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def configure_engine_options(app):
+    """Fill SQLALCHEMY_ENGINE_OPTIONS with the pool settings from config.
+
+    Must run before db.init_app(app), which creates the engine.
+    """
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    options.setdefault('pool_pre_ping', app.config.get('DB_POOL_PRE_PING', True))
+
+    # In-memory SQLite uses a single static connection; pool sizing does not apply
+    if not _is_memory_sqlite(url):
+        options.setdefault('pool_size', app.config.get('DB_POOL_SIZE', 10))
+        options.setdefault('max_overflow', app.config.get('DB_MAX_OVERFLOW', 20))
+        options.setdefault('pool_timeout', app.config.get('DB_POOL_TIMEOUT', 30))
+
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+def apply_sqlite_profile(engine, config):
+    """Run the SQLite tuning PRAGMAs on every new connection of engine"""
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = sqlite_pragmas(config, memory=_is_memory_sqlite(engine.url))
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def sqlite_pragmas(config, memory=False):
+    """PRAGMA statements for the configured profile"""
+    pragmas = [
+        # Wait for the write lock instead of failing with "database is locked"
+        f"PRAGMA busy_timeout = {int(config.get('SQLITE_BUSY_TIMEOUT', 5000))}",
+        f"PRAGMA cache_size = {int(config.get('SQLITE_CACHE_SIZE', -64000))}",
+        "PRAGMA temp_store = MEMORY",
+    ]
+    if not memory:
+        # WAL lets readers proceed while a checkout holds the write lock;
+        # NORMAL only fsyncs at checkpoints, which is safe in WAL mode.
+        pragmas += [
+            f"PRAGMA journal_mode = {config.get('SQLITE_JOURNAL_MODE', 'WAL')}",
+            f"PRAGMA synchronous = {config.get('SQLITE_SYNCHRONOUS', 'NORMAL')}",
+            f"PRAGMA mmap_size = {int(config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))}",
+        ]
+    return pragmas
+
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
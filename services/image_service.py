@@ -0,0 +1,307 @@
+# services/image_service.py
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import delete
+from werkzeug.utils import secure_filename
+from models.product import db, ProductImage, ProductImageVariant
+from services.assets import asset_url
+from services.cache_service import catalog_cache, product_tag
+from services.product_service import ProductService
+from services.upload_storage import get_upload_storage
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional: without Pillow products are served their originals
+    Image = ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+VARIANT_DIR = 'uploads/products/variants'
+
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+# Formats for a plain <img srcset>, most widely supported first; the rest go in <picture> sources
+SRCSET_PREFERENCE = ('webp', 'jpeg', 'avif')
+
+# Held while an upload decides to reuse a stored file and while a delete decides to remove one.
+# Across processes the row lock (FOR UPDATE) and SQLite's single writer play the same part.
+_file_references = threading.Lock()
+
+
+class ImageService:
+    """Product image uploads and their resized derivatives.
+
+    Uploads are stored once per content (see services/upload_storage.py) and
+    answered straight away; the image pipeline then builds one variant per
+    configured width and format and records it in product_image_variants.
+    Until it has, serializers fall back to the original file.
+    """
+
+    def __init__(self, db_session):
+        self.db = db_session
+        self.products = ProductService(db_session)
+
+    def save_upload(self, product_id, file_storage):
+        """Store an uploaded file as a product image and queue its variants.
+
+        Content that is already stored is not written again: the new image
+        reuses the file and, once built, the variants of its earlier copy.
+        Raises ValueError for a file type not in ALLOWED_EXTENSIONS.
+        """
+        filename = secure_filename(file_storage.filename)
+        ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+        if ext not in current_app.config.get('ALLOWED_EXTENSIONS', ()):
+            raise ValueError(f'Unsupported image type: {file_storage.filename}')
+
+        storage = get_upload_storage()
+        with storage.receive(file_storage) as spool, _file_references:
+            content_hash = spool.hexdigest()
+            # Locked until the new row commits, so a delete of the original cannot take its file meanwhile
+            original = self.db.query(ProductImage).filter(
+                ProductImage.content_hash == content_hash
+            ).order_by(ProductImage.processed_at.is_(None), ProductImage.id).with_for_update().first()
+            if original is not None and storage.exists(original.filepath):
+                filepath = original.filepath  # duplicate: metadata only
+            else:
+                original = None
+                _check_image(spool, filename)
+                filepath = storage.store(spool, ext)
+
+            variants = None
+            if original is not None and original.processed_at is not None:
+                variants = [ProductImageVariant(width=v.width, height=v.height, format=v.format,
+                                                filepath=v.filepath, size_bytes=v.size_bytes)
+                            for v in original.variants]
+            img = self.products.add_product_image(product_id, filename, filepath, content_hash=content_hash,
+                                                  size_bytes=spool.size, variants=variants)
+        pipeline = get_image_pipeline()
+        if variants is None and pipeline is not None:
+            pipeline.submit(img.id)
+        return img
+
+    def delete_image(self, product_id, image_id):
+        """Remove a product image; its files go once no other image refers to them"""
+        with _file_references:
+            img = self.db.get(ProductImage, image_id, with_for_update=True)
+            if img is None or img.product_id != product_id:
+                self.db.rollback()
+                return False
+            paths = [img.filepath] + [variant.filepath for variant in img.variants]
+            # Images with the same content share one file, so the rows are its reference count.
+            # Counted and removed before the delete commits, while no upload can take up the file.
+            same_file = ProductImage.content_hash == img.content_hash if img.content_hash \
+                else ProductImage.filepath == img.filepath
+            self.db.delete(img)
+            self.db.flush()
+            if self.db.query(ProductImage.id).filter(same_file).first() is None:
+                get_upload_storage().remove(*paths)
+            self.db.commit()
+        catalog_cache.invalidate(product_tag(product_id), 'featured')
+        return True
+
+    def build_variants(self, image_id):
+        """Generate and record the configured variants of one image; returns how many were written"""
+        img = self.db.get(ProductImage, image_id)
+        if img is None:
+            return 0
+        if Image is None:
+            logger.warning('Pillow is not installed; image %s is served without variants', image_id)
+            return 0
+
+        config = current_app.config
+        formats = [fmt for fmt in config.get('IMAGE_VARIANT_FORMATS', ('avif', 'webp')) if _can_save(fmt)]
+        quality = config.get('IMAGE_VARIANT_QUALITY', 75)
+        folder = os.path.join(current_app.static_folder, VARIANT_DIR)
+        os.makedirs(folder, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(img.filepath))[0]
+
+        configured_widths = config.get('IMAGE_VARIANT_WIDTHS', (320, 640, 1280))
+        variants = []
+        with Image.open(os.path.join(current_app.static_folder, img.filepath)) as original:
+            # JPEGs can be decoded straight at a reduced scale, which is most of the work saved on
+            # large photos. A square box keeps enough pixels whichever way EXIF rotates the image.
+            original.draft('RGB', (max(configured_widths),) * 2)
+            src = ImageOps.exif_transpose(original)
+            widths = sorted({min(width, src.width) for width in configured_widths})
+            if src.mode not in ('RGB', 'RGBA'):
+                src = src.convert('RGBA' if 'transparency' in src.info or 'A' in src.getbands() else 'RGB')
+
+            for width in widths:
+                height = max(1, round(src.height * width / src.width))
+                resized = src if width == src.width else src.resize(
+                    (width, height), Image.Resampling.LANCZOS, reducing_gap=3.0
+                )
+                for fmt in formats:
+                    frame = resized.convert('RGB') if fmt == 'jpeg' and resized.mode != 'RGB' else resized
+                    relative_path = f'{VARIANT_DIR}/{stem}_{width}.{fmt}'
+                    size_bytes = _save_atomic(frame, os.path.join(current_app.static_folder, relative_path),
+                                              fmt, quality)
+                    variants.append(ProductImageVariant(
+                        width=width, height=height, format=fmt, filepath=relative_path, size_bytes=size_bytes
+                    ))
+
+        # Replace variants from an earlier run; deleted first so the unique constraint holds
+        self.db.execute(delete(ProductImageVariant).where(ProductImageVariant.image_id == img.id))
+        self.db.expire(img, ['variants'])
+        for variant in variants:
+            variant.image_id = img.id
+        self.db.add_all(variants)
+        img.processed_at = datetime.utcnow()
+        self.db.commit()
+        # Featured and detail payloads carry the new URLs; listing counts are unaffected
+        catalog_cache.invalidate(product_tag(img.product_id), 'featured')
+        return len(variants)
+
+    def process_pending(self, include_processed=False):
+        """Build variants for every image the pipeline has not handled yet; returns (images, failures)"""
+        query = self.db.query(ProductImage.id)
+        if not include_processed:
+            query = query.filter(ProductImage.processed_at.is_(None))
+        image_ids = [image_id for (image_id,) in query.order_by(ProductImage.id)]
+        self.db.commit()
+
+        failures = 0
+        for image_id in image_ids:
+            try:
+                self.build_variants(image_id)
+            except Exception:
+                self.db.rollback()
+                failures += 1
+                logger.exception('Building variants for image %s failed', image_id)
+        return len(image_ids), failures
+
+
+def _check_image(spool, filename):
+    # Header-only parse, so a file the pipeline cannot decode is refused up front
+    if Image is None:
+        return
+    spool.seek(0)
+    try:
+        with Image.open(spool):
+            pass
+    except (OSError, SyntaxError, ValueError):
+        raise ValueError(f'Not a valid image: {filename}')
+    finally:
+        spool.seek(0)
+
+
+def _can_save(fmt):
+    Image.init()
+    return fmt.upper() in Image.SAVE
+
+
+def _save_atomic(frame, path, fmt, quality):
+    # Readers never see a half-written file at the final path; the suffix keeps two
+    # images with the same content from writing the same temp file
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    options = {'quality': quality}
+    if fmt == 'webp':
+        options['method'] = 4
+    elif fmt == 'jpeg':
+        options.update(optimize=True, progressive=True)
+    frame.save(tmp_path, format=fmt.upper(), **options)
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+def image_sources(img, thumbnail_width=320):
+    """Fingerprinted URLs of an image for responsive markup.
+
+    Returns {'url', 'thumbnail', 'srcset', 'sources'}: the original, the
+    narrowest variant at least thumbnail_width wide, a srcset in the most
+    compatible format, and one {'type', 'srcset'} per format for <picture>.
+    Images without variants yet get the original everywhere.
+    """
+    original = asset_url(img.filepath)
+    by_format = {}
+    for variant in img.variants:
+        by_format.setdefault(variant.format, []).append(variant)
+    if not by_format:
+        return {'url': original, 'thumbnail': original, 'srcset': None, 'sources': []}
+
+    srcset_format = next((fmt for fmt in SRCSET_PREFERENCE if fmt in by_format), next(iter(by_format)))
+    variants = by_format[srcset_format]
+    thumbnail = next((v for v in variants if v.width >= thumbnail_width), variants[-1])
+    return {
+        'url': original,
+        'thumbnail': asset_url(thumbnail.filepath),
+        'srcset': _srcset(variants),
+        'sources': [{'type': MIME_TYPES[fmt], 'srcset': _srcset(by_format[fmt])}
+                    for fmt in sorted(by_format, key=_source_order)]
+    }
+
+
+def _srcset(variants):
+    return ', '.join(f'{asset_url(v.filepath)} {v.width}w' for v in variants)
+
+
+def _source_order(fmt):
+    # <picture> takes the first <source> the browser supports: smallest encodings first
+    return {'avif': 0, 'webp': 1}.get(fmt, 2)
+
+
+class ImagePipeline:
+    """Worker pool that builds image variants off the request thread.
+
+    Resizing and encoding run in Pillow's C code, which releases the GIL,
+    so a small thread pool keeps up without slowing request handling.
+    """
+
+    def __init__(self, app, max_workers=2):
+        self.app = app
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='image-pipeline')
+
+    def submit(self, image_id):
+        return self._executor.submit(self._run, image_id)
+
+    def _run(self, image_id):
+        with self.app.app_context():
+            try:
+                ImageService(db.session).build_variants(image_id)
+            except Exception:
+                logger.exception('Building variants for image %s failed; `flask images process` retries it',
+                                 image_id)
+            finally:
+                db.session.remove()
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+def init_image_pipeline(app):
+    """Create the variant worker pool unless IMAGE_PIPELINE_ENABLED is off"""
+    pipeline = None
+    if app.config.get('IMAGE_PIPELINE_ENABLED', True):
+        if Image is None:
+            logger.warning('Pillow is not installed; product images will be served without variants')
+        else:
+            pipeline = ImagePipeline(app, max_workers=app.config.get('IMAGE_PIPELINE_WORKERS', 2))
+    app.extensions['image_pipeline'] = pipeline
+    return pipeline
+
+
+def get_image_pipeline():
+    return current_app.extensions.get('image_pipeline')
+
+
+@click.group('images')
+def images_cli():
+    """Manage product image variants."""
+
+
+@images_cli.command('process')
+@click.option('--all', 'include_processed', is_flag=True, help='Rebuild variants of images already processed.')
+@with_appcontext
+def process_command(include_processed):
+    """Build missing thumbnails and WebP/AVIF variants of product images."""
+    if Image is None:
+        raise click.ClickException('Pillow is required to build image variants')
+    total, failures = ImageService(db.session).process_pending(include_processed)
+    click.echo(f'Processed {total - failures} image(s), {failures} failed.')
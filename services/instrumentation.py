@@ -0,0 +1,222 @@
+# services/instrumentation.py
+import hmac
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from flask import Response, abort, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+_STATS_KEY = 'instrumentation.stats'  # RequestStats of the current request
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:\?|%\(\w+\)s|:\w+|__\[POSTCOMPILE_\w+\])\s*,?)+\)', re.IGNORECASE)
+
+
+def normalize_sql(statement):
+    """SQL with literals replaced by ? and IN lists collapsed, so repeats of one query look the same"""
+    statement = _STRING.sub('?', statement)
+    statement = _NUMBER.sub('?', statement)
+    statement = _IN_LIST.sub('IN (...)', statement)
+    return _WHITESPACE.sub(' ', statement).strip()
+
+
+class RequestStats:
+    __slots__ = ('started', 'statements', 'db_time', 'repeats')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_time = 0.0
+        self.repeats = Counter()  # statement text -> executions
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, in the Prometheus text format"""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, series in sorted(self._series.items()):
+            base = _label_text(labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{base}}} {series[-1]:.6f}')
+            lines.append(f'{self.name}_count{{{base}}} {cumulative}')
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = Counter()
+
+    def inc(self, labels, amount=1):
+        self._values[labels] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        lines += [f'{self.name}{{{_label_text(labels)}}} {value}' for labels, value in sorted(self._values.items())]
+        return lines
+
+
+def _label_text(labels):
+    return ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                    for name, value in labels)
+
+
+class Instrumentation:
+    """Statement count, database time and total time of every request.
+
+    SQLAlchemy cursor events time each statement and add it to the current
+    request; request hooks turn that into a Server-Timing header and into
+    per-endpoint histograms served at /metrics in the Prometheus text
+    format. Statements slower than slow_query_ms are logged with their
+    normalized SQL, and so are requests that run the same statement
+    repeat_warning times or more (the usual sign of an N+1 query).
+    Metrics are per process. Nothing is hooked up unless enabled, so a
+    disabled app pays nothing.
+
+    /metrics answers only clients in metrics_allowed_ips or sending
+    "Authorization: Bearer <metrics_token>"; anyone else gets a 404.
+    """
+
+    def __init__(self, slow_query_ms=100, repeat_warning=10, server_timing=True, metrics_token=None,
+                 metrics_allowed_ips=('127.0.0.1', '::1')):
+        self.slow_query = slow_query_ms / 1000
+        self.repeat_warning = repeat_warning
+        self.server_timing = server_timing
+        self.metrics_token = metrics_token
+        self.metrics_allowed_ips = frozenset(metrics_allowed_ips)
+        self._lock = threading.Lock()
+        self.request_duration = Histogram('http_request_duration_seconds', 'Time to build the response.',
+                                          DURATION_BUCKETS)
+        self.db_duration = Histogram('http_request_db_seconds', 'Time spent in SQL statements per request.',
+                                     DURATION_BUCKETS)
+        self.db_statements = Histogram('http_request_db_statements', 'SQL statements executed per request.',
+                                       STATEMENT_BUCKETS)
+        self.requests = CounterMetric('http_requests_total', 'Requests by endpoint and status code.')
+        self.slow_queries = CounterMetric('db_slow_queries_total', 'Statements slower than the slow-query threshold.')
+
+    def attach(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(engine, 'handle_error', self._handle_error)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('instrumentation.started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['instrumentation.started'].pop()
+        stats = request.environ.get(_STATS_KEY) if has_request_context() else None
+        if stats is not None:
+            stats.statements += 1
+            stats.db_time += elapsed
+            stats.repeats[statement] += 1
+        if elapsed >= self.slow_query:
+            endpoint = _endpoint_label() if has_request_context() else '-'
+            with self._lock:
+                self.slow_queries.inc((('endpoint', endpoint),))
+            logger.warning('Slow query (%.1f ms) in %s: %s', elapsed * 1000, endpoint, normalize_sql(statement))
+
+    def _handle_error(self, context):
+        # A failed statement never reaches after_cursor_execute
+        started = context.connection.info.get('instrumentation.started') if context.connection is not None else None
+        if started:
+            started.pop()
+
+    def before_request(self):
+        request.environ[_STATS_KEY] = RequestStats()
+
+    def after_request(self, response):
+        stats = request.environ.get(_STATS_KEY)
+        if stats is None:
+            return response
+        total = time.perf_counter() - stats.started
+        if self.server_timing:
+            timing = f'db;dur={stats.db_time * 1000:.1f};desc="{stats.statements} queries", app;dur={total * 1000:.1f}'
+            response.headers.add('Server-Timing', timing)
+
+        labels = (('method', request.method), ('endpoint', _endpoint_label()))
+        with self._lock:
+            self.request_duration.observe(labels, total)
+            self.db_duration.observe(labels, stats.db_time)
+            self.db_statements.observe(labels, stats.statements)
+            self.requests.inc(labels + (('status', response.status_code),))
+
+        if stats.repeats:
+            statement, count = stats.repeats.most_common(1)[0]
+            if count >= self.repeat_warning:
+                logger.warning('%s %s ran the same statement %d times (of %d): %s', request.method, _endpoint_label(),
+                               count, stats.statements, normalize_sql(statement))
+        return response
+
+    def render(self):
+        with self._lock:
+            lines = []
+            for metric in (self.request_duration, self.db_duration, self.db_statements, self.requests,
+                           self.slow_queries):
+                lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        if not self._metrics_allowed():
+            abort(404)
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    def _metrics_allowed(self):
+        if request.remote_addr in self.metrics_allowed_ips:
+            return True
+        if not self.metrics_token:
+            return False
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        return scheme.lower() == 'bearer' and hmac.compare_digest(token.encode(), self.metrics_token.encode())
+
+
+def _endpoint_label():
+    # The route pattern, not the path, so ids do not create a series each
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def init_instrumentation(app, engine):
+    """Instrument engine and every request when INSTRUMENTATION_ENABLED is set"""
+    instrumentation = None
+    if app.config.get('INSTRUMENTATION_ENABLED', False):
+        instrumentation = Instrumentation(
+            slow_query_ms=app.config.get('INSTRUMENTATION_SLOW_QUERY_MS', 100),
+            repeat_warning=app.config.get('INSTRUMENTATION_REPEATED_QUERY_WARNING', 10),
+            server_timing=app.config.get('INSTRUMENTATION_SERVER_TIMING', True),
+            metrics_token=app.config.get('METRICS_TOKEN'),
+            metrics_allowed_ips=app.config.get('METRICS_ALLOWED_IPS', ('127.0.0.1', '::1'))
+        )
+        instrumentation.attach(engine)
+        app.before_request(instrumentation.before_request)
+        app.after_request(instrumentation.after_request)
+        if app.config.get('METRICS_ENDPOINT'):
+            app.add_url_rule(app.config['METRICS_ENDPOINT'], 'metrics', instrumentation.metrics_view)
+    app.extensions['instrumentation'] = instrumentation
+    return instrumentation
@@ -0,0 +1,170 @@
+# services/inventory_service.py
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import case, insert, select, update
+from models.product import db, Stock
+from models.payment import Order, Payment, PaymentStatus, ReservationStatus, StockReservation
+from services.cache_service import catalog_cache, product_tag
+from services.stats_service import StatsService
+from services.analytics_service import PaymentAnalyticsService
+
+# Orders and payments that may still change status; the others are final
+OPEN_STATUSES = (PaymentStatus.PENDING, PaymentStatus.PROCESSING)
+
+
+class InventoryService:
+    """Stock reservations for orders awaiting payment.
+
+    Stock is taken with conditional UPDATEs (``quantity >= :n``) so two
+    concurrent checkouts can never both succeed for the last unit. None of the
+    methods commit; they run inside the caller's transaction.
+    """
+
+    def __init__(self, db_session):
+        self.db = db_session
+        self.stats = StatsService(db_session)
+        self.analytics = PaymentAnalyticsService(db_session)
+
+    def reserve(self, order_id, quantities, ttl=None):
+        """Take stock for an order.
+
+        quantities maps product_id -> quantity. Returns the id of the first
+        product that could not be reserved, or None on success. On failure the
+        caller must roll back, which also undoes any decrements already made.
+        """
+        if ttl is None:
+            ttl = current_app.config.get('STOCK_RESERVATION_TTL', 900)
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+
+        if not quantities:
+            return None
+
+        # One set-based statement for the whole order:
+        #   UPDATE stocks SET quantity = quantity - CASE product_id WHEN .. THEN .. END
+        #   WHERE product_id IN (..) AND quantity >= CASE product_id WHEN .. THEN .. END
+        requested = case(quantities, value=Stock.product_id)
+        updated = self.db.execute(
+            update(Stock)
+            .where(Stock.product_id.in_(quantities), Stock.quantity >= requested)
+            .values(quantity=Stock.quantity - requested)
+            .returning(Stock.product_id, Stock.quantity)
+            .execution_options(synchronize_session=False)
+        ).all()
+        if len(updated) != len(quantities):
+            updated = {product_id for product_id, _ in updated}
+            return next(pid for pid in quantities if pid not in updated)
+        self.stats.record_stock_changes(
+            (quantity + quantities[product_id], quantity) for product_id, quantity in updated
+        )
+
+        self.db.execute(insert(StockReservation), [{
+            'order_id': order_id,
+            'product_id': product_id,
+            'quantity': quantity,
+            'status': ReservationStatus.ACTIVE,
+            'expires_at': expires_at
+        } for product_id, quantity in quantities.items()])
+
+        catalog_cache.invalidate_on_commit(self.db, *[product_tag(pid) for pid in quantities])
+        return None
+
+    def commit(self, order_ids):
+        """Mark the orders' reservations as consumed once they are paid"""
+        self.db.execute(
+            update(StockReservation)
+            .where(StockReservation.order_id.in_(order_ids),
+                   StockReservation.status == ReservationStatus.ACTIVE)
+            .values(status=ReservationStatus.COMMITTED)
+            .execution_options(synchronize_session=False)
+        )
+
+    def release(self, order_ids):
+        """Return the orders' reserved stock to the shelf"""
+        return self._release(StockReservation.order_id.in_(order_ids))
+
+    def release_expired(self, limit=100):
+        """Cancel unpaid orders whose reservations have expired and return their stock.
+
+        PENDING and PROCESSING orders both expire: a PROCESSING order has an
+        intent at the provider, but a shopper who abandons the payment sheet
+        never completes it. The cancelled orders' open payments are cancelled
+        with them and their intents are left to lapse at the provider. A
+        payment that goes through anyway takes the stock again, or is logged
+        for a refund (see PaymentService._complete_closed_order).
+        """
+        expired = self.db.query(
+            Order.id, Order.status, Order.created_at, Order.total_amount
+        ).filter(
+            Order.status.in_(OPEN_STATUSES),
+            Order.id.in_(select(StockReservation.order_id).where(
+                StockReservation.status == ReservationStatus.ACTIVE,
+                StockReservation.expires_at < datetime.utcnow()
+            ))
+        ).limit(limit).all()
+        if not expired:
+            return 0
+
+        # Guarded: an order whose payment went through since the read is kept
+        cancelled = set(self.db.execute(
+            update(Order)
+            .where(Order.id.in_([order.id for order in expired]), Order.status.in_(OPEN_STATUSES))
+            .values(status=PaymentStatus.CANCELLED)
+            .returning(Order.id)
+            .execution_options(synchronize_session=False)
+        ).scalars())
+        if not cancelled:
+            return 0
+        self.analytics.record_transitions([order for order in expired if order.id in cancelled],
+                                          PaymentStatus.CANCELLED)
+        self.db.execute(
+            update(Payment)
+            .where(Payment.order_id.in_(cancelled), Payment.status.in_(OPEN_STATUSES))
+            .values(status=PaymentStatus.CANCELLED)
+            .execution_options(synchronize_session=False)
+        )
+        return self._release(StockReservation.order_id.in_(cancelled))
+
+    def _release(self, criterion):
+        # Flip the status first; only the transaction that wins the flip restocks,
+        # so a reservation is never returned twice.
+        rows = self.db.execute(
+            update(StockReservation)
+            .where(criterion, StockReservation.status == ReservationStatus.ACTIVE)
+            .values(status=ReservationStatus.RELEASED)
+            .returning(StockReservation.product_id, StockReservation.quantity)
+            .execution_options(synchronize_session=False)
+        ).all()
+        if not rows:
+            return 0
+
+        returned = {}
+        for product_id, quantity in rows:
+            returned[product_id] = returned.get(product_id, 0) + quantity
+        restocked = self.db.execute(
+            update(Stock)
+            .where(Stock.product_id.in_(returned))
+            .values(quantity=Stock.quantity + case(returned, value=Stock.product_id))
+            .returning(Stock.product_id, Stock.quantity)
+            .execution_options(synchronize_session=False)
+        ).all()
+        self.stats.record_stock_changes(
+            (quantity - returned[product_id], quantity) for product_id, quantity in restocked
+        )
+        catalog_cache.invalidate_on_commit(self.db, *[product_tag(pid) for pid in returned])
+        return len(rows)
+
+
+@click.group('inventory')
+def inventory_cli():
+    """Manage stock reservations."""
+
+
+@inventory_cli.command('release-expired')
+@with_appcontext
+def release_expired_command():
+    """Return stock held by expired, unpaid orders."""
+    released = InventoryService(db.session).release_expired(limit=None)
+    db.session.commit()
+    click.echo(f'Released {released} reservation(s).')
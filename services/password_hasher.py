@@ -0,0 +1,107 @@
+# services/password_hasher.py
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from flask import current_app, has_app_context
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordHasherBusyError(Exception):
+    """Every hashing slot is taken, or the hash did not finish in time"""
+
+
+class PasswordHasher:
+    """Password hashing and checking on a small bounded pool.
+
+    PBKDF2 and scrypt are CPU-bound by design. Run inline, a burst of
+    logins occupies every request worker and core. Here at most workers
+    hashes run at once, and max_queue more may wait. Past that, callers
+    get PasswordHasherBusyError right away instead of queueing behind
+    the burst. executor='process' moves the work out of the web process.
+    workers=0 hashes in the calling thread, as before.
+
+    method and salt_length are passed to Werkzeug, for example
+    'pbkdf2:sha256:600000' or 'scrypt:32768:8:1'. Stored hashes made
+    with other parameters are reported by needs_rehash().
+    """
+
+    def __init__(self, method='pbkdf2:sha256:600000', salt_length=16, workers=2, max_queue=32, timeout=10.0,
+                 executor='thread'):
+        self.method = method
+        self.salt_length = salt_length
+        self.timeout = timeout
+        # The parameter prefix of hashes made now, e.g. 'pbkdf2:sha256:600000'
+        self._current_params = _hash_params(generate_password_hash('', method, salt_length))
+        self._executor = None
+        if workers:
+            if executor == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+            self._slots = threading.BoundedSemaphore(workers + max_queue)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True if password_hash was made with a different method, cost or salt length"""
+        return _hash_params(password_hash) != self._current_params
+
+    def _run(self, fn, *args):
+        if self._executor is None:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusyError('Too many sign-ins at once, please try again')
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise PasswordHasherBusyError('Sign-in is taking too long, please try again')
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+
+def _hash_params(password_hash):
+    # 'method$salt$hash' -> (method, salt length)
+    method, _, rest = password_hash.partition('$')
+    return method, len(rest.partition('$')[0])
+
+
+def hash_password(password):
+    """Hash with the app's hasher, or inline with Werkzeug defaults outside an app"""
+    if has_app_context() and 'password_hasher' in current_app.extensions:
+        return get_password_hasher().hash(password)
+    return generate_password_hash(password)
+
+
+def verify_password(password_hash, password):
+    if has_app_context() and 'password_hasher' in current_app.extensions:
+        return get_password_hasher().verify(password_hash, password)
+    return check_password_hash(password_hash, password)
+
+
+def init_password_hasher(app):
+    """Create the password hasher from PASSWORD_HASH_* config"""
+    hasher = PasswordHasher(
+        method=app.config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000'),
+        salt_length=app.config.get('PASSWORD_HASH_SALT_LENGTH', 16),
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 2),
+        max_queue=app.config.get('PASSWORD_HASH_QUEUE', 32),
+        timeout=app.config.get('PASSWORD_HASH_TIMEOUT', 10),
+        executor=app.config.get('PASSWORD_HASH_EXECUTOR', 'thread')
+    )
+    app.extensions['password_hasher'] = hasher
+    return hasher
+
+
+def get_password_hasher():
+    return current_app.extensions['password_hasher']
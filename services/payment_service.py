@@ -1,12 +1,27 @@
+import logging
 import stripe
 import africastalking
+import requests
 import uuid
+from africastalking.Service import AfricasTalkingException
+from stripe.http_client import RequestsClient
 from decimal import Decimal
+from sqlalchemy import delete, func, insert, update
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
 from abc import ABC, abstractmethod
 from flask import current_app
 from models.payment import Order, OrderItem, Payment, PaymentStatus, PaymentProvider, Cart, CartItem
-from models.product import Product, Price, Stock
+from models.product import db, Product, Price, Stock
 from services.product_service import ProductService
+from services.inventory_service import OPEN_STATUSES, InventoryService
+from services.stats_service import StatsService, TOTAL_ORDERS
+from services.analytics_service import PaymentAnalyticsService
+from services.provider_pool import ProviderBusyError, ProviderTimeoutError, get_provider_pool
+from services.provider_registry import get_provider_registry, http_timeout
+
+logger = logging.getLogger(__name__)
+
 
 class PaymentProviderInterface(ABC):
     @abstractmethod
@@ -23,7 +38,8 @@ class PaymentProviderInterface(ABC):
 
 class StripeProvider(PaymentProviderInterface):
     def __init__(self, api_key):
-        stripe.api_key = api_key
+        # Passed on every call instead of setting the global stripe.api_key
+        self.api_key = api_key
         
     def create_payment_intent(self, amount, currency, order_id, metadata=None):
         try:
@@ -31,6 +47,7 @@ class StripeProvider(PaymentProviderInterface):
             amount_cents = int(amount * 100)
             
             intent = stripe.PaymentIntent.create(
+                api_key=self.api_key,
                 amount=amount_cents,
                 currency=currency.lower(),
                 metadata={'order_id': order_id, **(metadata or {})}
@@ -39,7 +56,7 @@ class StripeProvider(PaymentProviderInterface):
                 'success': True,
                 'payment_intent_id': intent.id,
                 'client_secret': intent.client_secret,
-                'amount': amount,
+                'amount': float(amount),
                 'currency': currency
             }
         except stripe.error.StripeError as e:
@@ -50,11 +67,13 @@ class StripeProvider(PaymentProviderInterface):
     
     def confirm_payment(self, payment_intent_id):
         try:
-            intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+            intent = stripe.PaymentIntent.retrieve(payment_intent_id, api_key=self.api_key)
+            last_error = intent.get('last_payment_error')
             return {
                 'success': intent.status == 'succeeded',
                 'status': intent.status,
-                'payment_id': intent.id
+                'payment_id': intent.id,
+                'last_payment_error': (last_error.get('code') or last_error.get('type')) if last_error else None
             }
         except stripe.error.StripeError as e:
             return {
@@ -68,7 +87,7 @@ class StripeProvider(PaymentProviderInterface):
             if amount:
                 refund_params['amount'] = int(amount * 100)
                 
-            refund = stripe.Refund.create(**refund_params)
+            refund = stripe.Refund.create(api_key=self.api_key, **refund_params)
             return {
                 'success': True,
                 'refund_id': refund.id,
@@ -80,10 +99,34 @@ class StripeProvider(PaymentProviderInterface):
                 'error': str(e)
             }
 
+class _PooledAfricasTalkingPayments(africastalking.PaymentService):
+    """Africa's Talking payments client that sends requests through a shared session.
+
+    The SDK itself opens a new connection for every request and sets no timeout.
+    """
+
+    def __init__(self, username, api_key, session, timeout, base_url=None):
+        self._session = session
+        self._timeout = timeout
+        super().__init__(username, api_key)
+        if base_url:
+            self._baseUrl = base_url.rstrip('/')
+
+    def _make_request(self, url, method, headers, data, params, callback=None):
+        res = self._session.request(method.upper(), url, headers=headers, data=data,
+                                    params=params, timeout=self._timeout)
+        if not 200 <= res.status_code < 300:
+            raise AfricasTalkingException(res.text)
+        if res.headers.get('content-type') == 'application/json':
+            return res.json()
+        return res.text
+
 class AfricasTalkingProvider(PaymentProviderInterface):
-    def __init__(self, username, api_key):
-        africastalking.initialize(username, api_key)
-        self.payment = africastalking.Payment
+    def __init__(self, username, api_key, session=None, timeout=None, product_name=None, base_url=None):
+        self.payment = _PooledAfricasTalkingPayments(
+            username, api_key, session or requests.Session(), timeout, base_url
+        )
+        self.product_name = product_name
         
     def create_payment_intent(self, amount, currency, order_id, metadata=None):
         # Africa's Talking uses a different flow - mobile checkout
@@ -96,7 +139,7 @@ class AfricasTalkingProvider(PaymentProviderInterface):
             
         try:
             response = self.payment.mobile_checkout(
-                product_name=f"Order {order_id}",
+                product_name=self.product_name or f"Order {order_id}",
                 phone_number=phone_number,
                 currency_code=currency,
                 amount=float(amount),
@@ -134,41 +177,44 @@ class AfricasTalkingProvider(PaymentProviderInterface):
 class PaymentService:
     def __init__(self, db_session):
         self.db = db_session
-        self._providers = {}
-        # Don't initialize providers here
+        self.inventory = InventoryService(db_session)
+        self.stats = StatsService(db_session)
+        self.analytics = PaymentAnalyticsService(db_session)
     
-    def _initialize_providers(self):
-        """Lazy initialization of payment providers"""
-        if not self._providers:  # Only initialize if not already done
-            from flask import current_app
-            stripe_key = current_app.config.get('STRIPE_SECRET_KEY')
-            if stripe_key:
-                self._providers['stripe'] = StripeProvider(stripe_key)
-            
-            # Add other providers as needed
+    @property
+    def providers(self):
+        """The process-wide provider registry (see build_providers)"""
+        return get_provider_registry()
     
     def create_order_from_cart(self, cart_id, user_data):
-        """Create an order from cart items"""
-        cart = Cart.query.get(cart_id)
-        if not cart or not cart.items:
+        """Create an order from cart items.
+
+        The statement count does not grow with the cart: one SELECT for the
+        lines, one conditional UPDATE for stock, executemany INSERTs for order
+        items and reservations, and one DELETE for the cart.
+        """
+        cart_items = CartItem.query.options(
+            joinedload(CartItem.product).joinedload(Product.price)
+        ).filter_by(cart_id=cart_id).all()
+        if not cart_items:
             return None, "Cart is empty"
             
         # Calculate total
         total_amount = Decimal('0')
         order_items = []
+        quantities = {}
+        products = {}
         
-        for cart_item in cart.items:
+        for cart_item in cart_items:
             product = cart_item.product
+            products[product.id] = product
             if not product.price:
                 return None, f"Product {product.name} has no price"
                 
-            # Check stock availability
-            if not product.stock or product.stock.quantity < cart_item.quantity:
-                return None, f"Product {product.name} is out of stock"
-                
             unit_price = product.price.amount
             item_total = unit_price * cart_item.quantity
             total_amount += item_total
+            quantities[product.id] = quantities.get(product.id, 0) + cart_item.quantity
             
             order_items.append({
                 'product_id': product.id,
@@ -177,6 +223,9 @@ class PaymentService:
                 'total_price': item_total
             })
         
+        # Return stock held by abandoned checkouts before taking more
+        self.inventory.release_expired()
+        
         # Create order
         order = Order(
             order_number=self._generate_order_number(),
@@ -191,38 +240,60 @@ class PaymentService:
         self.db.add(order)
         self.db.flush()  # Get order ID
         
+        # Reserve stock atomically; a concurrent checkout may have taken it since the cart was filled
+        short_product_id = self.inventory.reserve(order.id, quantities)
+        if short_product_id is not None:
+            self.db.rollback()
+            return None, f"Product {products[short_product_id].name} is out of stock"
+        
         # Create order items
         for item_data in order_items:
-            order_item = OrderItem(
-                order_id=order.id,
-                **item_data
-            )
-            self.db.add(order_item)
-            
-            # Update stock
-            stock = Stock.query.filter_by(product_id=item_data['product_id']).first()
-            stock.quantity -= item_data['quantity']
+            item_data['order_id'] = order.id
+        self.db.execute(insert(OrderItem), order_items)
+        self.stats.increment(TOTAL_ORDERS)
+        self.analytics.record_new_order(order)
         
         # Clear cart
-        for item in cart.items:
-            self.db.delete(item)
+        self.db.execute(
+            delete(CartItem)
+            .where(CartItem.cart_id == cart_id)
+            .execution_options(synchronize_session=False)
+        )
             
         self.db.commit()
         return order, None
     
+    def pending_order(self, order_id, lines):
+        """The order if it is still PENDING and holds exactly lines (product_id -> quantity), else None.
+
+        Lets a checkout retried after a busy provider pool pay the order it
+        already made instead of reserving the stock a second time.
+        """
+        order = self.db.get(Order, order_id)
+        if order is None or order.status != PaymentStatus.PENDING:
+            return None
+        items = dict(self.db.query(OrderItem.product_id, func.sum(OrderItem.quantity))
+                     .filter(OrderItem.order_id == order_id).group_by(OrderItem.product_id))
+        return order if items == lines else None
+    
     def process_payment(self, order_id, provider, payment_method_data):
-        """Process payment for an order"""
-        self._initialize_providers()  # Initialize when needed
-        
-        order = Order.query.get(order_id)
+        """Process payment for an order.
+
+        The provider round-trip happens with no transaction open: the pending
+        payment is committed first, the provider is called on the provider
+        pool, and the result is recorded in a second short transaction.
+        """
+        order = self.db.get(Order, order_id)
         if not order:
             return {'success': False, 'error': 'Order not found'}
             
         provider_enum = PaymentProvider(provider)
-        if provider_enum not in self._providers:
+        provider_instance = self.providers.get(provider_enum)
+        if provider_instance is None:
             return {'success': False, 'error': f'Payment provider {provider} not available'}
-            
-        provider_instance = self._providers[provider_enum]
+        
+        # The order is attributed to the provider of its latest payment attempt
+        self.analytics.record_transitions([order], provider=provider_enum)
         
         # Create payment record
         payment = Payment(
@@ -232,32 +303,80 @@ class PaymentService:
             currency=order.currency
         )
         self.db.add(payment)
-        self.db.flush()
         
-        # Process with provider
+        # Read everything the provider needs before committing expires the objects
+        amount, currency = order.total_amount, order.currency
         metadata = {
             'order_number': order.order_number,
             'user_email': order.user_email,
             **payment_method_data
         }
+        self.db.commit()
+        payment_id = payment.id
         
-        result = provider_instance.create_payment_intent(
-            order.total_amount,
-            order.currency,
-            order_id,
-            metadata
-        )
+        # Process with provider
+        try:
+            result = get_provider_pool().call(
+                provider_instance.create_payment_intent,
+                amount, currency, order_id, metadata,
+                on_late_result=self._late_result_recorder(payment_id)
+            )
+        except ProviderBusyError as e:
+            # Never sent: the attempt is void and the order stays PENDING, so the checkout can be retried
+            self.db.execute(
+                update(Payment)
+                .where(Payment.id == payment_id, Payment.status == PaymentStatus.PENDING)
+                .values(status=PaymentStatus.CANCELLED)
+                .execution_options(synchronize_session=False)
+            )
+            self.db.commit()
+            return {'success': False, 'error': str(e), 'busy': True}
+        except ProviderTimeoutError as e:
+            # Left PENDING: a late answer is still recorded, otherwise the reservation expires
+            return {'success': False, 'error': str(e)}
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        
+        if not self._record_intent_result(payment_id, result):
+            return {'success': False, 'error': 'The order has expired, please check out again'}
+        return result
+    
+    def _record_intent_result(self, payment_id, result):
+        """Second phase of process_payment: store the provider's answer.
+
+        Returns False if the order expired while the provider was called.
+        """
+        payment = self.db.get(Payment, payment_id)
+        if payment.status != PaymentStatus.PENDING or payment.transaction_id:
+            # Already settled, e.g. by a webhook that beat a late answer, or cancelled with its order
+            return payment.status != PaymentStatus.CANCELLED
         
+        payment.provider_response = result
         if result['success']:
             payment.transaction_id = result.get('payment_intent_id') or result.get('transaction_id')
-            payment.provider_response = result
-            order.status = PaymentStatus.PROCESSING
+            if self._set_order_status(payment.order, PaymentStatus.PROCESSING):
+                payment.status = PaymentStatus.CANCELLED
+                self.db.commit()
+                return False
         else:
             payment.status = PaymentStatus.FAILED
-            payment.provider_response = result
+            # Return the stock now rather than when the reservation expires
+            self._set_order_status(payment.order, PaymentStatus.FAILED)
             
         self.db.commit()
-        return result
+        return True
+    
+    def _late_result_recorder(self, payment_id):
+        """Callback recording a provider answer that arrived after the request gave up"""
+        app = current_app._get_current_object()
+        
+        def record(result):
+            with app.app_context():
+                try:
+                    PaymentService(db.session)._record_intent_result(payment_id, result)
+                finally:
+                    db.session.remove()
+        return record
     
     def confirm_payment(self, order_id, transaction_id):
         """Confirm payment completion"""
@@ -269,57 +388,130 @@ class PaymentService:
         if not payment:
             return {'success': False, 'error': 'Payment not found'}
             
-        provider_instance = self._providers[payment.provider]
-        result = provider_instance.confirm_payment(transaction_id)
+        provider_instance = self.providers.get(payment.provider)
+        if provider_instance is None:
+            return {'success': False, 'error': f'Payment provider {payment.provider.value} not available'}
+        payment_id = payment.id
+        # Do not keep the read transaction open across the provider call
+        self.db.commit()
         
-        if result['success']:
-            payment.status = PaymentStatus.COMPLETED
-            payment.order.status = PaymentStatus.COMPLETED
-        else:
-            payment.status = PaymentStatus.FAILED
-            payment.order.status = PaymentStatus.FAILED
-            
+        try:
+            result = get_provider_pool().call(provider_instance.confirm_payment, transaction_id)
+        except Exception as e:
+            # Nothing is known about the payment; leave it as it is
+            return {'success': False, 'error': str(e)}
+        
+        payment = self.db.get(Payment, payment_id)
+        self.settle_payments([payment], PaymentStatus.COMPLETED if result['success'] else PaymentStatus.FAILED)
         self.db.commit()
         return result
     
-    def _generate_order_number(self):
-        """Generate unique order number"""
-        return f"ORD-{uuid.uuid4().hex[:8].upper()}"
+    def settle_payments(self, payments, status):
+        """Apply a provider's final answer, COMPLETED or FAILED, to payments and their orders (does not commit).
+
+        Only open payments change, except that a payment the provider reports
+        as paid after its order was cancelled is completed all the same (the
+        money was taken; see _complete_closed_order).
+        """
+        orders = []
+        for payment in payments:
+            if payment.status in OPEN_STATUSES or (
+                    status == PaymentStatus.COMPLETED and payment.status == PaymentStatus.CANCELLED):
+                payment.status = status
+                orders.append(payment.order)
+        closed = self._set_orders_status(orders, status)
+        if status == PaymentStatus.COMPLETED:
+            for order in closed:
+                self._complete_closed_order(order)
     
-    def handle_webhook(self, provider, data):
-        """Handle payment provider webhooks"""
-        if provider == 'stripe':
-            return self._handle_stripe_webhook(data)
-        elif provider == 'africas_talking':
-            return self._handle_at_webhook(data)
-        return {'success': False, 'error': 'Unknown provider'}
+    def _set_order_status(self, order, status):
+        """Move an order to a new status, settling its stock reservations; True if it was no longer open"""
+        return bool(self._set_orders_status([order], status))
     
-    def _handle_stripe_webhook(self, event_data):
-        """Handle Stripe webhook events"""
-        event_type = event_data.get('type')
-        
-        if event_type == 'payment_intent.succeeded':
-            payment_intent = event_data['data']['object']
-            order_id = payment_intent['metadata'].get('order_id')
-            if order_id:
-                return self.confirm_payment(order_id, payment_intent['id'])
-                
-        return {'success': True}
+    def _set_orders_status(self, orders, status):
+        """Move several orders to one status with a fixed number of statements.
+
+        Only orders still PENDING or PROCESSING in the database move; the
+        others (cancelled by expiry, already paid or failed) are returned
+        unchanged.
+        """
+        orders = list({order.id: order for order in orders}.values())
+        if not orders:
+            return []
+        moved = set(self.db.execute(
+            update(Order)
+            .where(Order.id.in_([order.id for order in orders]), Order.status.in_(OPEN_STATUSES))
+            .values(status=status)
+            .returning(Order.id)
+            .execution_options(synchronize_session=False)
+        ).scalars())
+        moved_orders = [order for order in orders if order.id in moved]
+        self.analytics.record_transitions(moved_orders, status)
+        for order in moved_orders:
+            set_committed_value(order, 'status', status)
+        order_ids = [order.id for order in moved_orders]
+        if order_ids and status == PaymentStatus.COMPLETED:
+            self.inventory.commit(order_ids)
+        elif order_ids and status in (PaymentStatus.FAILED, PaymentStatus.CANCELLED):
+            self.inventory.release(order_ids)
+        return [order for order in orders if order.id not in moved]
     
-    def _handle_at_webhook(self, data):
-        """Handle Africa's Talking webhook"""
-        transaction_id = data.get('transactionId')
-        status = data.get('status')
-        
-        payment = Payment.query.filter_by(transaction_id=transaction_id).first()
-        if payment:
-            if status == 'Success':
-                payment.status = PaymentStatus.COMPLETED
-                payment.order.status = PaymentStatus.COMPLETED
-            else:
-                payment.status = PaymentStatus.FAILED
-                payment.order.status = PaymentStatus.FAILED
-                
-            self.db.commit()
-            
-        return {'success': True}
+    def _complete_closed_order(self, order):
+        """Complete a cancelled or failed order whose payment went through after all.
+
+        Its stock was returned when it closed, so it is taken again. If that
+        is no longer possible, or the order was already paid by another
+        attempt, the order stays as it is beside a completed payment and is
+        logged for a refund.
+        """
+        quantities = dict(self.db.query(OrderItem.product_id, func.sum(OrderItem.quantity))
+                          .filter(OrderItem.order_id == order.id).group_by(OrderItem.product_id))
+        savepoint = self.db.begin_nested()
+        self.db.refresh(order, ['status'])
+        if order.status in (PaymentStatus.CANCELLED, PaymentStatus.FAILED) \
+                and self.inventory.reserve(order.id, quantities) is None:
+            self.analytics.record_transitions([order], PaymentStatus.COMPLETED)
+            self.db.execute(
+                update(Order)
+                .where(Order.id == order.id)
+                .values(status=PaymentStatus.COMPLETED)
+                .execution_options(synchronize_session=False)
+            )
+            set_committed_value(order, 'status', PaymentStatus.COMPLETED)
+            self.inventory.commit([order.id])
+            savepoint.commit()
+            logger.warning('Order %s was paid after it closed; its stock was taken again', order.order_number)
+            return
+        savepoint.rollback()
+        logger.warning('Order %s is %s but a payment for it completed; refund the payment',
+                       order.order_number, order.status.value)
+    
+    def _generate_order_number(self):
+        """Generate unique order number"""
+        return f"ORD-{uuid.uuid4().hex[:8].upper()}"
+
+
+def build_providers(config, session):
+    """Create the configured payment providers; called once per process by the registry"""
+    providers = {}
+    timeout = http_timeout(config)
+
+    stripe_key = config.get('STRIPE_SECRET_KEY')
+    if stripe_key:
+        # stripe 7 has no per-client HTTP settings, so this one shared client is set
+        # process-wide once, here, rather than per request
+        stripe.default_http_client = RequestsClient(session=session, timeout=timeout)
+        if config.get('STRIPE_API_BASE'):
+            stripe.api_base = config['STRIPE_API_BASE']
+        providers[PaymentProvider.STRIPE] = StripeProvider(stripe_key)
+
+    if config.get('AT_API_KEY'):
+        providers[PaymentProvider.AFRICAS_TALKING] = AfricasTalkingProvider(
+            config.get('AT_USERNAME', 'sandbox'),
+            config['AT_API_KEY'],
+            session=session,
+            timeout=timeout,
+            product_name=config.get('AT_PAYMENT_PRODUCT_NAME'),
+            base_url=config.get('AT_PAYMENTS_API_BASE')
+        )
+    return providers
@@ -0,0 +1,95 @@
+# services/principal_cache.py
+import hmac
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from models.user import db, User, Admin
+from services.cache_service import CatalogCache
+
+PRINCIPAL_MODELS = {'user': User, 'admin': Admin}
+
+
+class Principal(UserMixin):
+    """Read-only snapshot of a signed-in User or Admin.
+
+    This is what current_user is after login; it is shared between requests
+    and not attached to a session, so load the model (load_model()) to
+    change anything.
+    """
+
+    def __init__(self, kind, id, username, email, role, fingerprint):
+        self.kind = kind
+        self.id = id
+        self.username = username
+        self.email = email
+        self.role = role
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def from_model(cls, model):
+        return cls(model.principal_kind, model.id, model.username, model.email,
+                   getattr(model, 'role', None), model.session_fingerprint)
+
+    @property
+    def is_admin(self):
+        return self.kind == 'admin'
+
+    def get_id(self):
+        return f'{self.kind}:{self.id}:{self.fingerprint}'
+
+    def load_model(self):
+        return db.session.get(PRINCIPAL_MODELS[self.kind], self.id)
+
+    def __repr__(self):
+        return f'<Principal {self.kind}:{self.id} {self.username}>'
+
+
+def principal_key(kind, principal_id):
+    return f'{kind}:{int(principal_id)}'
+
+
+def load_principal(session_id):
+    """Flask-Login user loader: no query on a cache hit, one primary-key lookup on a miss.
+
+    Untyped ids from sessions issued before typed ids are refused, so
+    those users sign in again.
+    """
+    kind, _, rest = session_id.partition(':')
+    principal_id, _, fingerprint = rest.partition(':')
+    model = PRINCIPAL_MODELS.get(kind)
+    if model is None or not principal_id.isdigit():
+        return None
+
+    key = principal_key(kind, principal_id)
+    principal = principal_cache.get(key)
+    if principal is None:
+        instance = db.session.get(model, int(principal_id))
+        if instance is None or not instance.is_active:
+            return None
+        principal = principal_cache.set(key, Principal.from_model(instance), tags=[key])
+    # Sessions issued before the last password change no longer match
+    if not hmac.compare_digest(principal.fingerprint, fingerprint):
+        return None
+    return principal
+
+
+def _invalidate_principal(mapper, connection, target):
+    # Deactivation, a password change or any other edit; bulk UPDATEs skip
+    # this and are picked up when the entry expires
+    session = object_session(target)
+    if session is not None:
+        principal_cache.invalidate_on_commit(session, principal_key(target.principal_kind, target.id))
+
+
+for _model in PRINCIPAL_MODELS.values():
+    event.listen(_model, 'after_update', _invalidate_principal)
+    event.listen(_model, 'after_delete', _invalidate_principal)
+
+
+# Per process: other workers see a change within PRINCIPAL_CACHE_TTL seconds
+principal_cache = CatalogCache(ttl=60, max_entries=10000)
+
+
+def init_principal_cache(app):
+    principal_cache.init_app(app, config_prefix='PRINCIPAL_CACHE', name='principal_cache')
+    return principal_cache
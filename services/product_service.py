@@ -1,48 +1,69 @@
 # services/product_service.py
+from datetime import datetime
 from models.product import Category, Price, Product, ProductImage, Stock
+from services.cache_service import catalog_cache, product_tag, category_tag
+from services.stats_service import StatsService, CATEGORIES, TOTAL_PRODUCTS
 
 
 class ProductService:
     def __init__(self, db_session):
         self.db = db_session
+        self.stats = StatsService(db_session)
 
     def create_category(self, name, description=None):
         cat = Category(name=name, description=description)
         self.db.add(cat)
+        self.stats.increment(CATEGORIES)
         self.db.commit()
+        catalog_cache.invalidate('categories')
         return cat
 
     def create_product(self, name, category_id, description=None):
         prod = Product(name=name, category_id=category_id, description=description)
         self.db.add(prod)
+        self.stats.increment(TOTAL_PRODUCTS)
         self.db.commit()
+        # Category product counts and listing totals change with every new product
+        catalog_cache.invalidate('categories', 'products', category_tag(category_id))
         return prod
 
     def add_image(self, product_id, url):
         img = ProductImage(product_id=product_id, url=url)
         self.db.add(img)
         self.db.commit()
+        # A first image can make the product eligible for the featured list
+        catalog_cache.invalidate(product_tag(product_id), 'featured')
         return img
 
-    def add_product_image(self, product_id, filename, filepath):
-        """Add image file to product"""
+    def add_product_image(self, product_id, filename, filepath, content_hash=None, size_bytes=None, variants=None):
+        """Add image file to product (variants: already built ProductImageVariants to attach)"""
         img = ProductImage(
             product_id=product_id,
             filename=filename,
-            filepath=filepath
+            filepath=filepath,
+            content_hash=content_hash,
+            size_bytes=size_bytes
         )
+        if variants is not None:
+            img.variants = variants
+            img.processed_at = datetime.utcnow()
         self.db.add(img)
         self.db.commit()
+        # A first image can make the product eligible for the featured list
+        catalog_cache.invalidate(product_tag(product_id), 'featured')
         return img
 
     def set_stock(self, product_id, quantity):
         stock = Stock.query.filter_by(product_id=product_id).first()
         if not stock:
+            self.stats.record_stock_change(None, quantity)
             stock = Stock(product_id=product_id, quantity=quantity)
             self.db.add(stock)
         else:
+            self.stats.record_stock_change(stock.quantity, quantity)
             stock.quantity = quantity
         self.db.commit()
+        catalog_cache.invalidate(product_tag(product_id))
         return stock
 
     def set_price(self, product_id, amount, currency='USD'):
@@ -54,4 +75,5 @@ class ProductService:
             price.amount = amount
             price.currency = currency
         self.db.commit()
+        catalog_cache.invalidate(product_tag(product_id))
         return price
@@ -0,0 +1,79 @@
+# services/provider_pool.py
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderBusyError(Exception):
+    """All worker slots and queue places are taken"""
+
+
+class ProviderTimeoutError(Exception):
+    """The provider did not answer within the timeout"""
+
+
+class ProviderCallPool:
+    """Bounded thread pool for blocking payment provider calls.
+
+    Callers must not hold a database transaction while waiting on call().
+    At most max_workers calls run at once and max_queue more may wait;
+    beyond that call() fails fast with ProviderBusyError instead of piling
+    up request threads behind a slow provider.
+    """
+
+    def __init__(self, max_workers=8, max_queue=32, timeout=15.0):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='payment-provider')
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+
+    def call(self, fn, *args, on_late_result=None, **kwargs):
+        """Run fn(*args, **kwargs) on the pool and wait up to self.timeout for its result.
+
+        If the call times out it keeps running; on_late_result(result) is
+        then invoked from the worker thread once it finishes successfully.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise ProviderBusyError('Payment provider is busy, please try again')
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            if on_late_result is not None:
+                future.add_done_callback(lambda done: _deliver_late(done, on_late_result))
+            raise ProviderTimeoutError('Payment provider did not respond in time')
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+def _deliver_late(future, callback):
+    if future.cancelled() or future.exception() is not None:
+        return
+    try:
+        callback(future.result())
+    except Exception:
+        logger.exception('Recording a late payment provider result failed')
+
+
+def init_provider_pool(app):
+    """Create the provider call pool from PAYMENT_PROVIDER_* config"""
+    pool = ProviderCallPool(
+        max_workers=app.config.get('PAYMENT_PROVIDER_WORKERS', 8),
+        max_queue=app.config.get('PAYMENT_PROVIDER_QUEUE', 32),
+        timeout=app.config.get('PAYMENT_PROVIDER_TIMEOUT', 15)
+    )
+    app.extensions['payment_provider_pool'] = pool
+    return pool
+
+
+def get_provider_pool():
+    return current_app.extensions['payment_provider_pool']
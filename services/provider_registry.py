@@ -0,0 +1,91 @@
+# services/provider_registry.py
+import os
+import threading
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+
+
+class ProviderRegistry:
+    """Payment providers shared by every request of a process.
+
+    Providers are built once, on first use, by builder(config, http_session)
+    and keep their HTTP connections alive between calls. A forked child
+    (e.g. a gunicorn worker with --preload) drops the parent's providers and
+    sockets and builds its own on first use.
+    """
+
+    def __init__(self, config, builder):
+        self._config = config
+        self._builder = builder
+        self._providers = None
+        self._session = None
+        self._overrides = {}
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._forget)
+
+    def get(self, provider):
+        """Provider instance for a PaymentProvider, or None if it is not configured"""
+        if provider in self._overrides:
+            return self._overrides[provider]
+        return self._built().get(provider)
+
+    def available(self):
+        return set(self._built()) | set(self._overrides)
+
+    def override(self, provider, instance):
+        """Use instance for provider instead of the configured one (None removes the override)"""
+        if instance is None:
+            self._overrides.pop(provider, None)
+        else:
+            self._overrides[provider] = instance
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._providers = self._session = None
+
+    def _built(self):
+        providers = self._providers
+        if providers is None:
+            with self._lock:
+                if self._providers is None:
+                    self._session = http_session(self._config)
+                    self._providers = self._builder(self._config, self._session)
+                providers = self._providers
+        return providers
+
+    def _forget(self):
+        # Runs in the child right after fork: never reuse the parent's sockets or lock state
+        self._lock = threading.Lock()
+        self._providers = self._session = None
+
+
+def http_session(config):
+    """requests.Session with a bounded keep-alive connection pool per provider host"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,  # distinct provider hosts kept in the pool
+        pool_maxsize=config.get('PAYMENT_HTTP_POOL_SIZE', 8),
+        pool_block=True,  # wait for a free connection rather than opening more
+        max_retries=0  # retries are the provider SDK's (and the caller's) decision
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def http_timeout(config):
+    """(connect, read) timeout for one provider HTTP request"""
+    return (config.get('PAYMENT_HTTP_CONNECT_TIMEOUT', 3.05), config.get('PAYMENT_HTTP_READ_TIMEOUT', 10))
+
+
+def init_provider_registry(app, builder):
+    registry = ProviderRegistry(app.config, builder)
+    app.extensions['payment_providers'] = registry
+    return registry
+
+
+def get_provider_registry():
+    return current_app.extensions['payment_providers']
@@ -0,0 +1,129 @@
+# services/search_service.py
+import re
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from models.product import db
+
+# External-content FTS5 index over products(name, description). The triggers keep it
+# in sync with every INSERT/UPDATE/DELETE on products, whichever code path writes.
+FTS_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, description,
+        content='products', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO products_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+]
+
+# Column weights for bm25(): a hit in the name counts ten times a hit in the description
+RANK_EXPRESSION = 'bm25(products_fts, 10.0, 1.0)'
+
+# Engine URLs known to have products_fts; a missing index is checked again on the next search,
+# so workers start using it as soon as the migration (or `flask search rebuild`) creates it
+_index_ready = set()
+
+
+class SearchService:
+    def __init__(self, db_session):
+        self.db = db_session
+
+    def is_available(self):
+        """True when the FTS5 index exists on the current database"""
+        engine = self.db.get_bind()
+        if engine.dialect.name != 'sqlite':
+            return False
+        key = str(engine.url)
+        if key in _index_ready:
+            return True
+        if self._index_exists():
+            _index_ready.add(key)
+            return True
+        return False
+
+    def _index_exists(self):
+        return self.db.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'"
+        )).scalar() is not None
+
+    def ensure_index(self):
+        """Create the FTS5 table and sync triggers if they are missing, filled from products"""
+        if self._index_exists():
+            _index_ready.add(str(self.db.get_bind().url))
+            return
+        self.rebuild()
+
+    def rebuild(self):
+        """Create the index if needed and recreate its contents from the products table"""
+        # An external-content table starts empty; only 'rebuild' indexes the existing rows
+        for statement in FTS_SCHEMA:
+            self.db.execute(text(statement))
+        self.db.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+        self.db.execute(text("INSERT INTO products_fts(products_fts) VALUES ('optimize')"))
+        self.db.commit()
+        _index_ready.add(str(self.db.get_bind().url))
+
+    def search_ids(self, query, limit, offset=0):
+        """Return product ids matching query, best match first"""
+        match = build_match_expression(query)
+        if not match:
+            return []
+        rows = self.db.execute(text(
+            f"SELECT rowid FROM products_fts WHERE products_fts MATCH :match "
+            f"ORDER BY {RANK_EXPRESSION}, rowid LIMIT :limit OFFSET :offset"
+        ), {'match': match, 'limit': limit, 'offset': offset})
+        return [row[0] for row in rows]
+
+    def count(self, query):
+        """Number of products matching query"""
+        match = build_match_expression(query)
+        if not match:
+            return 0
+        return self.db.execute(text(
+            "SELECT count(*) FROM products_fts WHERE products_fts MATCH :match"
+        ), {'match': match}).scalar()
+
+
+def build_match_expression(query):
+    """Turn free text into an FTS5 query: every term must match, the last one as a prefix.
+
+    Terms are quoted so user input can never be parsed as FTS5 syntax.
+    """
+    terms = re.findall(r'\w+', query or '')
+    if not terms:
+        return ''
+    quoted = [f'"{term}"' for term in terms]
+    # Typeahead: the term being typed is matched as a prefix
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+@click.group('search')
+def search_cli():
+    """Manage the product search index."""
+
+
+@search_cli.command('rebuild')
+@with_appcontext
+def rebuild_command():
+    """Create the FTS5 index if needed and rebuild it from products."""
+    try:
+        SearchService(db.session).rebuild()
+    except OperationalError as e:
+        raise click.ClickException(f'Could not rebuild search index: {e}')
+    click.echo('Search index rebuilt.')
@@ -0,0 +1,206 @@
+# services/serialization.py
+from functools import wraps
+from http import HTTPStatus
+from flask import current_app, has_app_context, make_response, request
+from flask.json.provider import DefaultJSONProvider
+from flask_restx import fields, marshal
+from flask_restx.inputs import boolean
+from flask_restx.utils import merge, unpack
+
+try:
+    import orjson
+except ImportError:  # optional: without it the stdlib encoder is used
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson when it is installed.
+
+    Output matches the stdlib provider (dates as HTTP dates, Decimal as
+    string, sorted keys unless told otherwise) except that non-ASCII text
+    is written as UTF-8 instead of \\u escapes, and NaN as null. Arguments
+    orjson cannot honour (an indent other than 2, custom separators, cls=...)
+    and values it cannot encode (e.g. integers over 64 bits) fall back to
+    the stdlib.
+    """
+
+    def dumps(self, obj, **kwargs):
+        data = self.dumps_bytes(obj, **kwargs)
+        return data.decode() if isinstance(data, bytes) else data
+
+    def dumps_bytes(self, obj, **kwargs):
+        """Encoded JSON as bytes (or str when the stdlib encoder was used)"""
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        option = _orjson_option(kwargs)
+        if option is not None:
+            try:
+                return orjson.dumps(obj, default=self.default, option=option)
+            except TypeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        dump_args = {}
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            dump_args['indent'] = 2
+        else:
+            dump_args['separators'] = (',', ':')
+        return self._app.response_class(_with_newline(self.dumps_bytes(obj, **dump_args)), mimetype=self.mimetype)
+
+
+def _orjson_option(kwargs):
+    """orjson option flags equivalent to json.dumps kwargs, or None if orjson can't produce them"""
+    if orjson is None:
+        return None
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME  # dates go through Flask's default()
+    for key, value in kwargs.items():
+        if key == 'sort_keys':
+            option |= orjson.OPT_SORT_KEYS if value else 0
+        elif key == 'indent' and value == 2:
+            option |= orjson.OPT_INDENT_2
+        elif key == 'indent' and value is None:
+            continue
+        elif key == 'separators' and value == (',', ':'):
+            continue
+        elif key in ('ensure_ascii', 'default'):
+            continue  # orjson always writes UTF-8; default is the provider's own
+        else:
+            return None
+    return option
+
+
+def _with_newline(data):
+    return data + b'\n' if isinstance(data, bytes) else f'{data}\n'
+
+
+def output_json(data, code, headers=None):
+    """flask-restx representation for application/json that encodes with the app's JSON provider.
+
+    Like the restx default it keeps the model's key order, honours the
+    RESTX_JSON settings and indents by 4 in debug mode.
+    """
+    settings = dict(current_app.config.get('RESTX_JSON', {}))
+    if current_app.debug:
+        settings.setdefault('indent', 4)
+    settings.setdefault('sort_keys', False)
+    provider = current_app.json
+    if isinstance(provider, FastJSONProvider):
+        body = provider.dumps_bytes(data, **settings)
+    else:
+        body = provider.dumps(data, **settings)
+    response = make_response(_with_newline(body), code)
+    response.headers.extend(headers or {})
+    return response
+
+
+def compile_model(model):
+    """Serializer function for a flask-restx model, equivalent to marshal(data, model).
+
+    The field list is walked once here instead of on every call, and each
+    field becomes a plain conversion (int, float, str, ...) or a nested
+    compiled serializer. Lists of objects are serialized item by item and
+    objects that are not dicts are handed to restx's marshal. Field defaults
+    are evaluated once, when the model is compiled. Raises ValueError for
+    models using features this does not cover (masks, wildcards, dotted or
+    callable attributes, skip_none).
+    """
+    if getattr(model, '__mask__', None):
+        raise ValueError('Models with a default mask cannot be compiled')
+    model = getattr(model, 'resolved', model)
+    plan = []
+    for key, field in model.items():
+        if isinstance(field, type):
+            field = field()
+        attribute = field.attribute if field.attribute is not None else key
+        if not isinstance(attribute, str) or '.' in attribute or getattr(field, 'skip_none', False):
+            raise ValueError(f'Field "{key}" cannot be compiled')
+        if isinstance(field, fields.Wildcard) or field.mask:
+            raise ValueError(f'Field "{key}" cannot be compiled')
+        # What restx outputs for a missing or None value
+        plan.append((key, attribute, _converter(key, field), field.output(key, {})))
+    plan = tuple(plan)
+
+    def serialize(data):
+        if isinstance(data, (list, tuple)):
+            return [serialize(item) for item in data]
+        if not isinstance(data, dict):
+            return marshal(data, model)
+        get = data.get
+        out = {}
+        for key, attribute, convert, none_value in plan:
+            value = get(attribute)
+            out[key] = none_value if value is None else convert(value)
+        return out
+
+    return serialize
+
+
+def _converter(key, field):
+    """Function turning a non-None value into what field.output() would produce"""
+    field_type = type(field)
+    if field_type in _SCALARS:
+        return _SCALARS[field_type]
+    if field_type is fields.Boolean:
+        return lambda value: value if value.__class__ is bool else boolean(value)
+    if field_type is fields.Raw:
+        return lambda value: value
+    if field_type is fields.Nested:
+        return compile_model(field.nested)
+    if field_type is fields.List:
+        item = _converter(key, field.container)
+        item_none = field.container.output(0, [None])
+
+        def convert_list(value):
+            if value.__class__ is not list and value.__class__ is not tuple:
+                return field.output(key, {key: value})
+            return [item_none if element is None else item(element) for element in value]
+        return convert_list
+    # Anything else goes through the field itself
+    return lambda value: field.output(key, {key: value})
+
+
+_SCALARS = {fields.String: str, fields.Integer: int, fields.Float: float}
+
+
+def serialize_with(model, as_list=False, code=HTTPStatus.OK, description=None):
+    """Drop-in for Namespace.marshal_with(model) using a compiled serializer.
+
+    The Swagger documentation is the same as with marshal_with. Requests
+    with a field mask header (X-Fields) still go through restx marshalling.
+    """
+    serialize = compile_model(model)
+
+    def decorator(func):
+        doc = {
+            'responses': {str(code): (description, [model] if as_list else model, {})},
+            '__mask__': True
+        }
+        func.__apidoc__ = merge(getattr(func, '__apidoc__', {}), doc)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            resp = func(*args, **kwargs)
+            if isinstance(resp, tuple):
+                data, status, headers = unpack(resp)
+                return _serialize(data), status, headers
+            return _serialize(resp)
+        return wrapper
+
+    def _serialize(data):
+        mask = has_app_context() and request.headers.get(current_app.config['RESTX_MASK_HEADER'])
+        return marshal(data, model, mask=mask) if mask else serialize(data)
+
+    return decorator
+
+
+def init_json(app):
+    """Use FastJSONProvider unless JSON_PROVIDER is 'stdlib'"""
+    if app.config.get('JSON_PROVIDER', 'orjson') == 'orjson':
+        app.json = FastJSONProvider(app)
+    return app.json
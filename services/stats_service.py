@@ -0,0 +1,99 @@
+# services/stats_service.py
+from datetime import datetime
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func, update
+from models.product import db, Product, Category, Stock
+from models.payment import Order
+from models.stats import StatCounter
+
+TOTAL_PRODUCTS = 'total_products'
+CATEGORIES = 'categories'
+LOW_STOCK = 'low_stock'
+TOTAL_ORDERS = 'total_orders'
+COUNTERS = (TOTAL_PRODUCTS, CATEGORIES, LOW_STOCK, TOTAL_ORDERS)
+
+
+class StatsService:
+    """Dashboard counters maintained incrementally.
+
+    Writers call increment()/record_stock_change() inside their own
+    transaction, so a counter commits or rolls back together with the change
+    it describes. Reads are a primary-key lookup regardless of table sizes.
+    """
+
+    def __init__(self, db_session):
+        self.db = db_session
+
+    @property
+    def low_stock_threshold(self):
+        return current_app.config.get('LOW_STOCK_THRESHOLD', 10)
+
+    def increment(self, name, delta=1):
+        """Adjust a counter in the current transaction (does not commit)"""
+        if not delta:
+            return
+        self.db.execute(
+            update(StatCounter)
+            .where(StatCounter.name == name)
+            .values(value=StatCounter.value + delta, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+
+    def record_stock_change(self, old_quantity, new_quantity):
+        """Update the low-stock counter for one stock row (old_quantity None for a new row)"""
+        self.record_stock_changes([(old_quantity, new_quantity)])
+
+    def record_stock_changes(self, changes):
+        """Update the low-stock counter for [(old_quantity, new_quantity), ...] in one statement"""
+        threshold = self.low_stock_threshold
+        delta = 0
+        for old_quantity, new_quantity in changes:
+            was_low = old_quantity is not None and old_quantity < threshold
+            is_low = new_quantity is not None and new_quantity < threshold
+            delta += int(is_low) - int(was_low)
+        self.increment(LOW_STOCK, delta)
+
+    def snapshot(self):
+        """All counters in one query"""
+        values = dict(self.db.query(StatCounter.name, StatCounter.value))
+        if len(values) < len(COUNTERS):
+            # First use (or new counter): seed from the tables once
+            values = self.rebuild()
+        return {name: values[name] for name in COUNTERS}
+
+    def get(self, name):
+        """One counter by primary key"""
+        value = self.db.query(StatCounter.value).filter(StatCounter.name == name).scalar()
+        if value is None:
+            value = self.rebuild()[name]
+        return value
+
+    def rebuild(self):
+        """Recount everything from the source tables and store the result"""
+        values = {
+            TOTAL_PRODUCTS: self.db.query(func.count(Product.id)).scalar(),
+            CATEGORIES: self.db.query(func.count(Category.id)).scalar(),
+            LOW_STOCK: self.db.query(func.count(Stock.id)).filter(
+                Stock.quantity < self.low_stock_threshold).scalar(),
+            TOTAL_ORDERS: self.db.query(func.count(Order.id)).scalar(),
+        }
+        for name, value in values.items():
+            self.db.merge(StatCounter(name=name, value=value, updated_at=datetime.utcnow()))
+        self.db.commit()
+        return values
+
+
+@click.group('stats')
+def stats_cli():
+    """Manage dashboard counters."""
+
+
+@stats_cli.command('rebuild')
+@with_appcontext
+def rebuild_command():
+    """Recount dashboard counters from the database (e.g. after changing LOW_STOCK_THRESHOLD)."""
+    values = StatsService(db.session).rebuild()
+    for name, value in values.items():
+        click.echo(f'{name}: {value}')
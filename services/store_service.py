@@ -1,15 +1,38 @@
 # services/store_service.py
+import base64
+import binascii
+import json
+from flask import current_app
 from sqlalchemy import func
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import joinedload, selectinload
 from models.product import db, Category, Product, ProductImage, Stock, Price
+from services.cache_service import catalog_cache, product_tag, category_tag
+from services.assets import asset_url
+from services.image_service import image_sources
+from services.search_service import SearchService
+
+MAX_PER_PAGE = 100
+
+
+def clamp_per_page(per_page):
+    """per_page limited to 1..MAX_PER_PAGE; 0 or a negative LIMIT would break or unbound the page"""
+    return max(1, min(int(per_page), MAX_PER_PAGE))
 
 
 class StoreService:
     def __init__(self, db_session):
         self.db = db_session
+        self.search = SearchService(db_session)
 
     def get_all_categories(self):
         """Get all active categories with product count"""
+        return catalog_cache.get_or_load(
+            ('categories',),
+            self._load_all_categories,
+            tags=lambda cats: ['categories'] + [category_tag(c['id']) for c in cats]
+        )
+
+    def _load_all_categories(self):
         categories = self.db.query(
             Category,
             func.count(Product.id).label('product_count')
@@ -22,91 +45,207 @@ class StoreService:
             'product_count': count
         } for cat, count in categories]
 
-    def get_products_by_category(self, category_id, page=1, per_page=12):
-        """Get paginated products for a category"""
-        products = Product.query.filter_by(category_id=category_id)\
-            .paginate(page=page, per_page=per_page, error_out=False)
-        
-        items = []
-        for product in products.items:
-            item = self._format_product_summary(product)
-            items.append(item)
-        
-        return {
-            'items': items,
-            'total': products.total,
-            'pages': products.pages,
-            'current_page': page
-        }
+    def get_products_by_category(self, category_id, page=1, per_page=12, cursor=None, with_total=True):
+        """Get paginated products for a category.
 
-    def get_all_products(self, page=1, per_page=12, search=None):
-        """Get all products with optional search"""
-        query = Product.query.options(
-            joinedload(Product.category),
-            joinedload(Product.price),
-            joinedload(Product.stock),
-            joinedload(Product.images)
-        )
+        Passing cursor (an empty string for the first page) switches to keyset
+        pagination; the total is then only computed when with_total is set.
+        """
+        per_page = clamp_per_page(per_page)
+        query = self._summary_query().filter_by(category_id=category_id)
+        count_key = ('count', category_id, None)
+
+        if cursor is not None:
+            return self._cursor_page(query, cursor, per_page, count_key if with_total else None)
+        return self._offset_page(query, page, per_page, count_key)
+
+    def get_all_products(self, page=1, per_page=12, search=None, cursor=None, with_total=True):
+        """Get all products with optional search (see get_products_by_category for cursor mode)"""
+        per_page = clamp_per_page(per_page)
+        if search and self.search.is_available():
+            return self._search_page(search, page, per_page, cursor, with_total)
+
+        query = self._summary_query()
         
         if search:
+            # Fallback when the FTS index has not been built (e.g. non-SQLite databases)
             query = query.filter(
                 Product.name.ilike(f'%{search}%') | 
                 Product.description.ilike(f'%{search}%')
             )
-        
-        products = query.paginate(page=page, per_page=per_page, error_out=False)
-        
-        items = []
-        for product in products.items:
-            item = self._format_product_summary(product)
-            items.append(item)
-        
+        count_key = ('count', None, search or None)
+
+        if cursor is not None:
+            return self._cursor_page(query, cursor, per_page, count_key if with_total else None)
+        return self._offset_page(query, page, per_page, count_key)
+
+    def _search_page(self, search, page, per_page, cursor, with_total):
+        """Ranked full-text results; the cursor carries the offset into the ranking"""
+        if cursor is not None:
+            offset = decode_cursor(cursor, 'offset') or 0
+        else:
+            page = max(page, 1)
+            offset = (page - 1) * per_page
+
+        ids = self.search.search_ids(search, limit=per_page + 1, offset=offset)
+        has_next = len(ids) > per_page
+        items = self.get_products_by_ids(ids[:per_page])
+
+        total = None
+        if cursor is None or with_total:
+            total = catalog_cache.get_or_load(
+                ('search_count', search),
+                lambda: self.search.count(search),
+                tags=['products']
+            )
+
+        if cursor is not None:
+            return {
+                'items': items,
+                'total': total,
+                'per_page': per_page,
+                'next_cursor': encode_cursor(offset + per_page, 'offset') if has_next else None
+            }
         return {
             'items': items,
-            'total': products.total,
-            'pages': products.pages,
+            'total': total,
+            'pages': -(-total // per_page) if per_page else 0,
             'current_page': page
         }
 
+    def _offset_page(self, query, page, per_page, count_key):
+        """Classic page/per_page listing; the total comes from the cached count"""
+        products = query.order_by(Product.id)\
+            .paginate(page=page, per_page=per_page, error_out=False, count=False)
+        total = self._count(query, count_key)
+
+        return {
+            'items': [self._format_product_summary(product) for product in products.items],
+            'total': total,
+            'pages': -(-total // per_page) if per_page else 0,
+            'current_page': products.page
+        }
+
+    def _cursor_page(self, query, cursor, per_page, count_key=None):
+        """Keyset listing: WHERE id > :last_id ORDER BY id LIMIT n, constant cost at any depth"""
+        after_id = decode_cursor(cursor)
+        total = self._count(query, count_key) if count_key else None
+        if after_id is not None:
+            query = query.filter(Product.id > after_id)
+
+        # Fetch one extra row to know whether another page exists
+        products = query.order_by(Product.id).limit(per_page + 1).all()
+        has_next = len(products) > per_page
+        products = products[:per_page]
+
+        return {
+            'items': [self._format_product_summary(product) for product in products],
+            'total': total,
+            'per_page': per_page,
+            'next_cursor': encode_cursor(products[-1].id) if has_next else None
+        }
+
+    def _count(self, query, count_key):
+        """COUNT(*) for a listing, cached until the catalog gains or loses products"""
+        return catalog_cache.get_or_load(
+            count_key,
+            lambda: query.enable_eagerloads(False).order_by(None).count(),
+            tags=['products']
+        )
+
     def get_product_details(self, product_id):
         """Get detailed product information"""
-        product = Product.query.get_or_404(product_id)
-        
-        # Get price
-        price = Price.query.filter_by(product_id=product_id).first()
-        
-        # Get stock
-        stock = Stock.query.filter_by(product_id=product_id).first()
-        
-        # Get images
-        images = ProductImage.query.filter_by(product_id=product_id).all()
-        
+        return catalog_cache.get_or_load(
+            ('product', product_id),
+            lambda: self._load_product_details(product_id),
+            tags=lambda detail: [product_tag(product_id), category_tag(detail['category']['id'])]
+        )
+
+    def _load_product_details(self, product_id):
+        product = self._aggregate_query()\
+            .filter(Product.id == product_id)\
+            .first_or_404()
+        return self._format_product_detail(product)
+
+    def get_products_by_ids(self, product_ids):
+        """Batch-load product summaries by id in a single statement, keeping the given order"""
+        if not product_ids:
+            return []
+        products = self._summary_query()\
+            .filter(Product.id.in_(product_ids))\
+            .all()
+        by_id = {product.id: product for product in products}
+        return [self._format_product_summary(by_id[pid]) for pid in product_ids if pid in by_id]
+
+    def get_related_products(self, product_id, category_id, limit=4):
+        """Get other products from the same category"""
+        related_ids = [pid for (pid,) in self.db.query(Product.id)
+                       .filter(Product.category_id == category_id, Product.id != product_id)
+                       .order_by(Product.id.desc())
+                       .limit(limit)]
+        return self.get_products_by_ids(related_ids)
+
+    def _summary_query(self):
+        """Base query for every listing path.
+
+        Scalar relationships are joined into the main statement; images and
+        their variants are fetched with one extra SELECT ... WHERE ... IN (...)
+        each, so a page costs three statements regardless of its size and rows
+        are never duplicated by the image join.
+        """
+        return Product.query.options(
+            joinedload(Product.category),
+            joinedload(Product.price),
+            joinedload(Product.stock),
+            selectinload(Product.images).selectinload(ProductImage.variants)
+        )
+
+    def _aggregate_query(self):
+        """Product query that loads category, price, stock and images in one statement (plus one for variants)"""
+        return Product.query.options(
+            joinedload(Product.category),
+            joinedload(Product.price),
+            joinedload(Product.stock),
+            joinedload(Product.images).selectinload(ProductImage.variants)
+        )
+
+    def _format_product_detail(self, product):
+        """Format a fully loaded product for the detail view"""
+        price = product.price
+        stock = product.stock
+        images = product.images
+
         return {
             'id': product.id,
             'name': product.name,
             'description': product.description,
             'category': {
                 'id': product.category.id,
-                'name': product.category.name
-            },
-            'price': {
-                'amount': float(price.amount) if price else 0,
-                'currency': price.currency if price else 'USD'
-            },
-            'stock': {
-                'available': stock.quantity > 0 if stock else False,
-                'quantity': stock.quantity if stock else 0
+                'name': product.category.name,
+                'description': product.category.description
             },
-            'images': [{
-                'id': img.id,
-                'url': f'/static/{img.filepath}',
-                'filename': img.filename
-            } for img in images]
+            'price': float(price.amount) if price else 0,
+            'currency': price.currency if price else 'USD',
+            'stock_quantity': stock.quantity if stock else 0,
+            'in_stock': stock.quantity > 0 if stock else False,
+            'images': [dict(
+                image_sources(img, current_app.config.get('IMAGE_THUMBNAIL_WIDTH', 320)),
+                id=img.id,
+                filename=img.filename
+            ) for img in images]
         }
 
     def get_featured_products(self, limit=8):
         """Get featured products (latest products with images)"""
-        products = Product.query.join(ProductImage)\
+        return catalog_cache.get_or_load(
+            ('featured', limit),
+            lambda: self._load_featured_products(limit),
+            tags=lambda items: ['featured'] + [product_tag(item['id']) for item in items]
+        )
+
+    def _load_featured_products(self, limit):
+        products = self._summary_query()\
+            .filter(Product.images.any())\
             .order_by(Product.id.desc())\
             .limit(limit).all()
         
@@ -124,11 +263,12 @@ class StoreService:
         stock = product.stock
         images = product.images
         
-        # Get image URLs
+        # Get image URLs; cards use the first image's thumbnail and srcset, never the original
         image_urls = []
         if images:
             for img in images:
-                image_urls.append(f'/static/{img.filepath}')
+                image_urls.append(asset_url(img.filepath))
+        cover = image_sources(images[0], current_app.config.get('IMAGE_THUMBNAIL_WIDTH', 320)) if images else None
         
         return {
             'id': product.id,
@@ -142,7 +282,9 @@ class StoreService:
             'currency': price.currency if price else 'USD',
             'stock_quantity': stock.quantity if stock else 0,
             'in_stock': stock.quantity > 0 if stock else False,
-            'images': image_urls if image_urls else ['/static/img/placeholder.jpg']
+            'images': image_urls if image_urls else ['/static/img/placeholder.jpg'],
+            'thumbnail': cover['thumbnail'] if cover else '/static/img/placeholder.jpg',
+            'srcset': cover['srcset'] if cover else None
         }
 
     def check_product_availability(self, product_id, quantity=1):
@@ -156,3 +298,20 @@ class StoreService:
         """Get product by URL-friendly slug (future enhancement)"""
         # This could be implemented later for SEO-friendly URLs
         pass
+
+
+def encode_cursor(value, field='id'):
+    """Opaque pagination token; field is 'id' (keyset) or 'offset' (ranked search)"""
+    raw = json.dumps({field: value}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, field='id'):
+    """Return the position stored in a cursor token (None for the first page)"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded))[field])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise ValueError('Invalid cursor')
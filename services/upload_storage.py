@@ -0,0 +1,145 @@
+# services/upload_storage.py
+import errno
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+from flask import Request, current_app
+
+
+class HashingSpoolFile:
+    """Temporary file for one uploaded file part that hashes bytes as they are written.
+
+    The multipart parser writes the upload into it chunk by chunk, so the
+    body is never held in memory and the SHA-256 is known once parsing is
+    done. keep_as() moves the file into place; otherwise close() deletes it.
+    """
+
+    def __init__(self, directory):
+        fd, self.name = tempfile.mkstemp(dir=directory, suffix='.part')
+        self._file = os.fdopen(fd, 'w+b')
+        self._hash = hashlib.sha256()
+        self.size = 0
+        self._kept = False
+
+    def write(self, data):
+        self._hash.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+    def keep_as(self, path):
+        """Move the spooled file to path (on the same filesystem this is a rename)"""
+        self._file.flush()
+        os.chmod(self.name, 0o644)  # mkstemp creates 0600; the web server must be able to read it
+        try:
+            os.replace(self.name, path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # Temp dir on another filesystem: copy next to the target, then rename atomically
+            staging = f'{path}.{uuid.uuid4().hex}.tmp'
+            shutil.copyfile(self.name, staging)
+            os.replace(staging, path)
+            os.unlink(self.name)
+        self._kept = True
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.close()
+        if not self._kept:
+            try:
+                os.unlink(self.name)
+            except FileNotFoundError:
+                pass
+
+    def __getattr__(self, name):
+        # read/seek/tell/flush/... for the parser and FileStorage
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ContentAddressedStorage:
+    """Upload files stored once per content, as uploads/products/<aa>/<sha256>.<ext> under static/.
+
+    Identical uploads map to the same file; whoever stores a file first
+    writes it and later copies only reuse the path.
+    """
+
+    def __init__(self, static_folder, tmp_dir, chunk_size=64 * 1024):
+        self.static_folder = static_folder
+        self.tmp_dir = tmp_dir
+        self.chunk_size = chunk_size
+
+    def spool(self):
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        return HashingSpoolFile(self.tmp_dir)
+
+    def receive(self, file_storage):
+        """Spooled, hashed copy of an uploaded file.
+
+        Files parsed by UploadRequest already are one; anything else (e.g. a
+        FileStorage built by hand) is copied once in chunks.
+        """
+        if isinstance(file_storage.stream, HashingSpoolFile):
+            return file_storage.stream
+        spool = self.spool()
+        try:
+            shutil.copyfileobj(file_storage.stream, spool, self.chunk_size)
+        except BaseException:
+            spool.close()
+            raise
+        return spool
+
+    def store(self, spool, ext):
+        """Relative path of the spooled content, moving it into place unless it is already stored"""
+        digest = spool.hexdigest()
+        relative_path = f'uploads/products/{digest[:2]}/{digest}.{ext}'
+        path = os.path.join(self.static_folder, relative_path)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            spool.keep_as(path)
+        return relative_path
+
+    def exists(self, relative_path):
+        return os.path.exists(os.path.join(self.static_folder, relative_path))
+
+    def remove(self, *relative_paths):
+        for relative_path in relative_paths:
+            try:
+                os.unlink(os.path.join(self.static_folder, relative_path))
+            except FileNotFoundError:
+                pass
+
+
+class UploadRequest(Request):
+    """Request whose uploaded files are spooled straight into the upload storage's temp dir"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return current_app.extensions['upload_storage'].spool()
+
+
+def init_upload_storage(app):
+    storage = ContentAddressedStorage(
+        app.static_folder,
+        app.config.get('UPLOAD_TMP_DIR') or os.path.join(app.instance_path, 'upload-tmp')
+    )
+    app.extensions['upload_storage'] = storage
+    app.request_class = UploadRequest
+    return storage
+
+
+def get_upload_storage():
+    return current_app.extensions['upload_storage']
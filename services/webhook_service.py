@@ -0,0 +1,394 @@
+# services/webhook_service.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+import click
+import stripe
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from models.product import db
+from models.payment import Payment, PaymentProvider, PaymentStatus, WebhookEvent, WebhookStatus
+from services.payment_service import PaymentService
+from services.provider_pool import get_provider_pool
+
+logger = logging.getLogger(__name__)
+
+# Transition placeholder for an event that could not be checked this round
+RETRY = 'retry'
+
+
+class WebhookService:
+    """Durable inbox for payment provider webhooks.
+
+    receive() stores an event and returns straight away; duplicates of an
+    event id are dropped by the unique constraint. process_pending() claims
+    a batch, settles the payments it refers to with a fixed number of
+    statements, and marks the events done in the same transaction.
+    """
+
+    def __init__(self, db_session):
+        self.db = db_session
+        self.payments = PaymentService(db_session)
+
+    def receive(self, provider, raw_body, headers):
+        """Store a webhook delivery; returns False if the event was already received.
+
+        Raises ValueError for an unknown provider, a body that is not JSON or a
+        bad signature.
+        """
+        provider_enum = PaymentProvider(provider)
+        verified = False
+        if provider_enum == PaymentProvider.STRIPE and current_app.config.get('STRIPE_WEBHOOK_SECRET'):
+            try:
+                stripe.Webhook.construct_event(
+                    raw_body, headers.get('Stripe-Signature', ''), current_app.config['STRIPE_WEBHOOK_SECRET']
+                )
+            except stripe.error.SignatureVerificationError:
+                raise ValueError('Invalid signature')
+            verified = True
+
+        try:
+            payload = json.loads(raw_body)
+        except (TypeError, ValueError):
+            raise ValueError('Invalid JSON payload')
+        if not isinstance(payload, dict):
+            raise ValueError('Invalid JSON payload')
+
+        row = {
+            'provider': provider_enum,
+            'event_id': _event_id(provider_enum, payload, raw_body),
+            'event_type': payload.get('type') or payload.get('status'),
+            'payload': payload,
+            'verified': verified,
+            'status': WebhookStatus.PENDING,
+            'attempts': 0,
+            'next_attempt_at': datetime.utcnow(),
+            'received_at': datetime.utcnow()
+        }
+        stored = self._insert_unless_duplicate(row)
+        self.db.commit()
+        return stored
+
+    def _insert_unless_duplicate(self, row):
+        dialect = self.db.get_bind().dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            dialect_insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+            result = self.db.execute(
+                dialect_insert(WebhookEvent).values(**row)
+                .on_conflict_do_nothing(index_elements=['provider', 'event_id'])
+            )
+            return result.rowcount == 1
+        try:
+            with self.db.begin_nested():
+                self.db.execute(insert(WebhookEvent).values(**row))
+            return True
+        except IntegrityError:
+            return False
+
+    def process_pending(self, batch_size=100):
+        """Process one batch of due events; returns how many were claimed"""
+        now = datetime.utcnow()
+        events = self.db.query(WebhookEvent).filter(
+            WebhookEvent.status == WebhookStatus.PENDING,
+            WebhookEvent.next_attempt_at <= now
+        ).order_by(WebhookEvent.id).limit(batch_size).all()
+        if not events:
+            self.db.commit()
+            return 0
+
+        # Work out each event's transition; unverified Stripe events are checked
+        # with the API first, before any write transaction starts.
+        transitions = {}  # event id -> (transaction_id, status), None to ignore, or RETRY
+        for event in events:
+            try:
+                transitions[event.id] = self._transition_for(event)
+            except Exception:
+                logger.warning('Could not check webhook event %s; will retry', event.id, exc_info=True)
+                transitions[event.id] = RETRY
+        event_ids = [event.id for event in events]
+        self.db.commit()
+
+        try:
+            claimed = self._apply_batch(event_ids, transitions, now)
+        except Exception:
+            self.db.rollback()
+            if len(event_ids) == 1:
+                self._mark_failed(event_ids[0], now)
+                return 1
+            # Isolate the event that breaks the batch
+            logger.exception('Webhook batch failed; retrying events one at a time')
+            return sum(self._apply_single(event_id, transitions, now) for event_id in event_ids)
+        return claimed
+
+    def _apply_single(self, event_id, transitions, now):
+        try:
+            return self._apply_batch([event_id], transitions, now)
+        except Exception:
+            self.db.rollback()
+            self._mark_failed(event_id, now)
+            return 1
+
+    def _apply_batch(self, event_ids, transitions, now):
+        # Claim: a concurrent consumer that read the same events finds them no longer PENDING
+        claimed = self.db.execute(
+            update(WebhookEvent)
+            .where(WebhookEvent.id.in_(event_ids), WebhookEvent.status == WebhookStatus.PENDING)
+            .values(attempts=WebhookEvent.attempts + 1)
+            .returning(WebhookEvent.id, WebhookEvent.attempts)
+            .execution_options(synchronize_session=False)
+        ).all()
+        if not claimed:
+            self.db.commit()
+            return 0
+        attempts = dict(claimed)
+
+        # Later events for the same payment win
+        wanted = {}
+        for event_id in sorted(attempts):
+            if transitions[event_id] not in (None, RETRY):
+                transaction_id, status = transitions[event_id]
+                wanted[transaction_id] = (status, event_id)
+
+        payments = self.db.query(Payment).options(joinedload(Payment.order)).filter(
+            Payment.transaction_id.in_(wanted)
+        ).all() if wanted else []
+        found = {payment.transaction_id for payment in payments}
+
+        payments_by_status = defaultdict(list)
+        for payment in payments:
+            status, _ = wanted[payment.transaction_id]
+            payments_by_status[status].append(payment)
+        for status, grouped in payments_by_status.items():
+            self.payments.settle_payments(grouped, status)
+
+        done, ignored, retry = [], [], []
+        for event_id in attempts:
+            transition = transitions[event_id]
+            if transition is None:
+                ignored.append(event_id)
+            elif transition != RETRY and transition[0] in found:
+                done.append(event_id)
+            else:
+                # The payment's transaction id may not be recorded yet (see process_payment)
+                retry.append(event_id)
+
+        self._set_status(done, WebhookStatus.PROCESSED, now)
+        self._set_status(ignored, WebhookStatus.IGNORED, now)
+        max_attempts = current_app.config.get('WEBHOOK_MAX_ATTEMPTS', 10)
+        given_up = [event_id for event_id in retry if attempts[event_id] >= max_attempts]
+        self._set_status(given_up, WebhookStatus.FAILED, now, error='Gave up after repeated attempts')
+        for event_id in retry:
+            if attempts[event_id] < max_attempts:
+                self.db.execute(
+                    update(WebhookEvent)
+                    .where(WebhookEvent.id == event_id)
+                    .values(next_attempt_at=now + _backoff(attempts[event_id]))
+                    .execution_options(synchronize_session=False)
+                )
+        self.db.commit()
+        return len(claimed)
+
+    def _set_status(self, event_ids, status, now, error=None):
+        if not event_ids:
+            return
+        self.db.execute(
+            update(WebhookEvent)
+            .where(WebhookEvent.id.in_(event_ids))
+            .values(status=status, processed_at=now, error=error)
+            .execution_options(synchronize_session=False)
+        )
+
+    def _mark_failed(self, event_id, now):
+        logger.exception('Webhook event %s failed', event_id)
+        self._set_status([event_id], WebhookStatus.FAILED, now, error='Processing failed; see logs')
+        self.db.commit()
+
+    def _transition_for(self, event):
+        """(transaction_id, new payment status) for an event, or None if it changes nothing"""
+        payload = event.payload
+        if event.provider == PaymentProvider.STRIPE:
+            intent = (payload.get('data') or {}).get('object') or {}
+            status = {
+                'payment_intent.succeeded': PaymentStatus.COMPLETED,
+                'payment_intent.payment_failed': PaymentStatus.FAILED
+            }.get(payload.get('type'))
+            if not status or not intent.get('id'):
+                return None
+            if not event.verified and not self._confirmed_by_stripe(intent['id'], status):
+                return None
+            return intent['id'], status
+
+        if event.provider == PaymentProvider.AFRICAS_TALKING:
+            transaction_id = payload.get('transactionId')
+            if not transaction_id:
+                return None
+            status = PaymentStatus.COMPLETED if payload.get('status') == 'Success' else PaymentStatus.FAILED
+            return transaction_id, status
+        return None
+
+    def _confirmed_by_stripe(self, payment_intent_id, status):
+        """Whether Stripe itself reports the intent as the unsigned event claims.
+
+        Without STRIPE_WEBHOOK_SECRET the payload is untrusted. A failure is
+        only believed once Stripe shows a failed attempt or a cancelled
+        intent; one still processing or awaiting action is not failed.
+        Raises if Stripe cannot be asked, so the event is retried.
+        """
+        provider = self.payments.providers.get(PaymentProvider.STRIPE)
+        if provider is None:
+            return False
+        result = get_provider_pool().call(provider.confirm_payment, payment_intent_id)
+        if result.get('error'):
+            raise RuntimeError(f"Stripe lookup of {payment_intent_id} failed: {result['error']}")
+        if status == PaymentStatus.COMPLETED:
+            return result['status'] == 'succeeded'
+        return result['status'] == 'canceled' or (
+            result['status'] == 'requires_payment_method' and bool(result.get('last_payment_error')))
+
+
+def _event_id(provider, payload, raw_body):
+    if provider == PaymentProvider.STRIPE and payload.get('id'):
+        return payload['id']
+    if provider == PaymentProvider.AFRICAS_TALKING and payload.get('transactionId'):
+        return f"{payload['transactionId']}:{payload.get('status')}"
+    body = raw_body if isinstance(raw_body, bytes) else str(raw_body).encode()
+    return hashlib.sha256(body).hexdigest()
+
+
+def _backoff(attempts):
+    return timedelta(seconds=min(2 ** attempts, 300))
+
+
+class WebhookConsumer:
+    """Background thread draining the webhook inbox.
+
+    start() runs it straight away, so events left PENDING or awaiting a
+    retry from before a restart are processed without waiting for a new
+    delivery. Each new event wakes it; otherwise it polls every
+    `interval` seconds for retries. A process forked after start() (e.g.
+    a gunicorn worker with --preload) starts its own thread, since threads
+    do not survive a fork.
+    """
+
+    def __init__(self, app, batch_size=100, interval=5.0):
+        self.app = app
+        self.batch_size = batch_size
+        self.interval = interval
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._started = False
+        self._stopped = False
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def start(self):
+        self._started = True
+        self._stopped = False
+        self.notify()
+
+    def notify(self):
+        self._ensure_started()
+        self._wake.set()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='webhook-consumer', daemon=True)
+            self._thread.start()
+
+    def shutdown(self, wait=True):
+        """Stop the thread after its current batch"""
+        self._started = False
+        self._stopped = True
+        self._wake.set()
+        thread = self._thread
+        if wait and thread is not None and thread.is_alive():
+            thread.join()
+
+    def _after_fork(self):
+        # Never reuse the parent's lock state; the parent's thread is not running here
+        self._lock = threading.Lock()
+        self._thread = None
+        if self._started:
+            self.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stopped:
+                return
+            with self.app.app_context():
+                try:
+                    service = WebhookService(db.session)
+                    while service.process_pending(self.batch_size) == self.batch_size:
+                        pass
+                except Exception:
+                    logger.exception('Webhook consumer failed')
+                finally:
+                    db.session.remove()
+
+
+def init_webhook_consumer(app):
+    """Create and start the in-process consumer unless WEBHOOK_CONSUMER_ENABLED is off.
+
+    Of the flask commands only `flask run` starts it; others such as
+    `flask db upgrade` or `flask webhooks process` (which drains the inbox
+    itself) must not.
+    """
+    consumer = None
+    if app.config.get('WEBHOOK_CONSUMER_ENABLED', True):
+        consumer = WebhookConsumer(
+            app,
+            batch_size=app.config.get('WEBHOOK_BATCH_SIZE', 100),
+            interval=app.config.get('WEBHOOK_POLL_INTERVAL', 5)
+        )
+        command = click.get_current_context(silent=True)
+        if command is None or command.info_name == 'run':
+            consumer.start()
+    app.extensions['webhook_consumer'] = consumer
+    return consumer
+
+
+def notify_webhook_consumer():
+    consumer = current_app.extensions.get('webhook_consumer')
+    if consumer is not None:
+        consumer.notify()
+
+
+@click.group('webhooks')
+def webhooks_cli():
+    """Process the payment webhook inbox."""
+
+
+@webhooks_cli.command('process')
+@click.option('--batch-size', type=int, default=None, help='Events per transaction (default WEBHOOK_BATCH_SIZE).')
+@click.option('--loop', is_flag=True, help='Keep polling instead of exiting when the inbox is empty.')
+@with_appcontext
+def process_command(batch_size, loop):
+    """Apply pending webhook events to payments and orders."""
+    batch_size = batch_size or current_app.config.get('WEBHOOK_BATCH_SIZE', 100)
+    interval = current_app.config.get('WEBHOOK_POLL_INTERVAL', 5)
+    service = WebhookService(db.session)
+    total = 0
+    while True:
+        claimed = service.process_pending(batch_size)
+        total += claimed
+        if claimed == batch_size:
+            continue
+        if not loop:
+            break
+        time.sleep(interval)
+    click.echo(f'Processed {total} webhook event(s).')
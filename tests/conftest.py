@@ -0,0 +1,108 @@
+"""Shared fixtures: the app on a throwaway SQLite database, emptied before every test."""
+import itertools
+import os
+import tempfile
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import update
+
+# The app reads its configuration at import time
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ['WEBHOOK_CONSUMER_ENABLED'] = 'false'
+
+from app import app as flask_app  # noqa: E402
+from benchmarks.fakes import FakeProvider  # noqa: E402
+from models.payment import PaymentProvider, StockReservation  # noqa: E402
+from models.product import db, Stock  # noqa: E402
+from services.cache_service import catalog_cache  # noqa: E402
+from services.principal_cache import principal_cache  # noqa: E402
+from services import search_service  # noqa: E402
+from services.product_service import ProductService  # noqa: E402
+from services.provider_registry import get_provider_registry  # noqa: E402
+from services.stats_service import StatsService  # noqa: E402
+
+CHECKOUT_BODY = {
+    'email': 'test@example.com',
+    'name': 'Test User',
+    'shipping_address': '1 Test Street',
+    'payment_provider': 'stripe'
+}
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        # The search index is not part of the models; tests that need it create it
+        db.session.execute(db.text('DROP TABLE IF EXISTS products_fts'))
+        db.drop_all()
+        db.create_all()
+        StatsService(db.session).rebuild()
+        db.session.commit()
+    search_service._index_ready.clear()
+    catalog_cache.clear()
+    principal_cache.clear()
+    yield flask_app
+    with flask_app.app_context():
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def fake_provider(app):
+    """FakeProvider in place of Stripe, answering at once"""
+    with app.app_context():
+        registry = get_provider_registry()
+    provider = FakeProvider(latency=0)
+    registry.override(PaymentProvider.STRIPE, provider)
+    yield provider
+    registry.override(PaymentProvider.STRIPE, None)
+
+
+@pytest.fixture
+def make_product(app):
+    """make_product(stock, price=10) -> id of a new product in a new category"""
+    numbers = itertools.count(1)
+
+    def make(stock, price=10):
+        number = next(numbers)
+        with app.app_context():
+            service = ProductService(db.session)
+            category_id = service.create_category(f'Category {number}').id
+            product = service.create_product(f'Ball {number}', category_id, 'A ball')
+            service.set_price(product.id, price)
+            service.set_stock(product.id, stock)
+            return product.id
+    return make
+
+
+@pytest.fixture
+def checkout():
+    """checkout(client, product_id, quantity=1) -> (status, body) of adding to the cart and paying"""
+    def checkout(client, product_id, quantity=1):
+        response = client.post('/api/checkout/cart/add', json={'product_id': product_id, 'quantity': quantity})
+        if response.status_code != 200:
+            return response.status_code, response.get_json()
+        response = client.post('/api/checkout/process', json=CHECKOUT_BODY)
+        return response.status_code, response.get_json()
+    return checkout
+
+
+@pytest.fixture
+def stock_of():
+    """stock_of(product_id) -> stock quantity; call inside an app context"""
+    def stock_of(product_id):
+        return db.session.query(Stock.quantity).filter_by(product_id=product_id).scalar()
+    return stock_of
+
+
+@pytest.fixture
+def expire_reservations():
+    """expire_reservations() backdates every stock reservation; call inside an app context"""
+    def expire_reservations():
+        db.session.execute(update(StockReservation).values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+        db.session.commit()
+    return expire_reservations
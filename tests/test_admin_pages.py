@@ -0,0 +1,28 @@
+import pytest
+from werkzeug.security import generate_password_hash
+from models.user import db, Admin
+
+
+@pytest.fixture
+def admin_client(app, client):
+    with app.app_context():
+        db.session.add(Admin(username='admin', email='admin@example.com',
+                             password_hash=generate_password_hash('secret')))
+        db.session.commit()
+    assert client.post('/admin/auth/login', data={'username': 'admin', 'password': 'secret'}).status_code == 302
+    return client
+
+
+def test_dashboard_renders_every_counter_with_the_page(admin_client, make_product):
+    make_product(stock=3)
+    make_product(stock=50)
+    page = admin_client.get('/admin/dashboard').get_data(as_text=True)
+    counters = [line.strip() for line in page.splitlines() if line.strip().startswith('<dd')]
+    assert counters == ['<dd class="text-lg font-medium text-gray-900">%d</dd>' % value for value in (2, 2, 1, 0)]
+    assert '/stats/' not in page
+
+
+def test_payments_page_renders_its_totals_with_the_page(admin_client):
+    page = admin_client.get('/admin/payments').get_data(as_text=True)
+    assert '$0.00</dd>' in page
+    assert '/stats/' not in page
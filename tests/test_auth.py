@@ -0,0 +1,162 @@
+import pytest
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+from models.user import db, Admin, User
+from services.password_hasher import PasswordHasher, PasswordHasherBusyError
+from services.principal_cache import load_principal
+
+PASSWORD = 'correct horse'
+OLD_HASH_METHOD = 'pbkdf2:sha256:1000'
+
+
+class BusyHasher(PasswordHasher):
+    """Hasher with every slot taken: busy=('verify',) or ('hash',) or both"""
+
+    def __init__(self, busy):
+        super().__init__(method='pbkdf2:sha256:2000', workers=0)
+        self.busy = busy
+
+    def hash(self, password):
+        if 'hash' in self.busy:
+            raise PasswordHasherBusyError('Too many sign-ins at once, please try again')
+        return super().hash(password)
+
+    def verify(self, password_hash, password):
+        if 'verify' in self.busy:
+            raise PasswordHasherBusyError('Too many sign-ins at once, please try again')
+        return super().verify(password_hash, password)
+
+
+@pytest.fixture
+def use_hasher(app):
+    original = app.extensions['password_hasher']
+
+    def use(hasher):
+        app.extensions['password_hasher'] = hasher
+        return hasher
+    yield use
+    app.extensions['password_hasher'] = original
+
+
+@pytest.fixture
+def accounts(app):
+    """A user and an admin whose passwords were hashed with older, cheaper parameters"""
+    old_hash = generate_password_hash(PASSWORD, OLD_HASH_METHOD)
+    with app.app_context():
+        db.session.add(User(username='user', email='user@example.com', password_hash=old_hash))
+        db.session.add(Admin(username='admin', email='admin@example.com', password_hash=old_hash))
+        db.session.commit()
+    return old_hash
+
+
+def stored_hashes(app):
+    with app.app_context():
+        return db.session.query(User.password_hash).scalar(), db.session.query(Admin.password_hash).scalar()
+
+
+def sign_in(client):
+    user = client.post('/auth/login', data={'email': 'user@example.com', 'password': PASSWORD})
+    admin = client.post('/admin/auth/login', data={'username': 'admin', 'password': PASSWORD})
+    return user, admin
+
+
+@pytest.mark.parametrize('path, form', [
+    ('/auth/login', {'email': 'user@example.com', 'password': PASSWORD}),
+    ('/admin/auth/login', {'username': 'admin', 'password': PASSWORD})
+])
+def test_busy_hasher_answers_503_with_the_form(app, client, accounts, use_hasher, path, form):
+    use_hasher(BusyHasher(busy=('verify', 'hash')))
+    response = client.post(path, data=form)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert 'Too many sign-ins' in response.get_data(as_text=True)
+
+
+def test_old_hashes_are_upgraded_on_sign_in(app, client, accounts, use_hasher):
+    use_hasher(BusyHasher(busy=()))
+    user, admin = sign_in(client)
+    assert user.status_code == admin.status_code == 302
+    assert all(password_hash.startswith('pbkdf2:sha256:2000$') for password_hash in stored_hashes(app))
+
+
+def test_sign_in_succeeds_without_the_upgrade_while_the_hasher_is_busy(app, client, accounts, use_hasher):
+    use_hasher(BusyHasher(busy=('hash',)))
+    user, admin = sign_in(client)
+    assert user.status_code == 302 and user.headers['Location'] == '/'
+    assert admin.status_code == 302 and admin.headers['Location'].endswith('/admin/dashboard')
+    assert stored_hashes(app) == (accounts, accounts)
+
+
+@pytest.fixture
+def statements(app):
+    executed = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', count)
+
+
+def session_ids(app):
+    """The Flask-Login ids issued to the user and the admin, which share id 1"""
+    with app.app_context():
+        user, admin = db.session.get(User, 1), db.session.get(Admin, 1)
+        return user.get_id(), admin.get_id()
+
+
+def test_user_and_admin_with_the_same_id_are_different_principals(app, accounts):
+    user_id, admin_id = session_ids(app)
+    assert user_id.startswith('user:1:') and admin_id.startswith('admin:1:')
+    with app.app_context():
+        user, admin = load_principal(user_id), load_principal(admin_id)
+    assert (user.kind, user.username, user.is_admin) == ('user', 'user', False)
+    assert (admin.kind, admin.username, admin.is_admin) == ('admin', 'admin', True)
+
+
+def test_cached_principal_loads_without_a_query(app, accounts, statements):
+    user_id, _ = session_ids(app)
+    with app.app_context():
+        statements.clear()
+        assert load_principal(user_id) is not None
+        assert len(statements) == 1
+        statements.clear()
+        assert load_principal(user_id) is not None
+        assert statements == []
+
+
+@pytest.mark.parametrize('change', ['deactivate', 'password'])
+def test_old_session_is_refused_after_deactivation_or_a_password_change(app, accounts, use_hasher, change):
+    use_hasher(BusyHasher(busy=()))
+    user_id, admin_id = session_ids(app)
+    with app.app_context():
+        assert load_principal(user_id) and load_principal(admin_id)  # cached
+        for model in (db.session.get(User, 1), db.session.get(Admin, 1)):
+            if change == 'deactivate':
+                model.is_active = False
+            else:
+                model.set_password('a new password')
+        db.session.commit()
+        assert load_principal(user_id) is None
+        assert load_principal(admin_id) is None
+
+
+@pytest.mark.parametrize('session_id', ['1', 'user:1', 'staff:1:abc', 'user:x:abc'])
+def test_legacy_and_malformed_session_ids_are_refused(app, accounts, session_id):
+    with app.app_context():
+        assert load_principal(session_id) is None
+
+
+def test_password_change_ends_a_signed_in_session(app, client, accounts, use_hasher):
+    use_hasher(BusyHasher(busy=()))
+    assert client.post('/auth/login', data={'email': 'user@example.com', 'password': PASSWORD}).status_code == 302
+    with app.app_context():
+        user = db.session.get(User, 1)
+        user.set_password('changed elsewhere')
+        db.session.commit()
+    # The session's fingerprint no longer matches; logout requires a signed-in user
+    response = client.get('/auth/logout')
+    assert response.status_code == 302 and '/auth/login' in response.headers['Location']
@@ -0,0 +1,50 @@
+from sqlalchemy import event, update
+from models.product import db, Price
+
+
+def test_cart_etag_follows_the_database_not_this_process(app, client, make_product):
+    product_id = make_product(stock=5, price=10)
+    assert client.post('/api/checkout/cart/add', json={'product_id': product_id, 'quantity': 2}).status_code == 200
+    first = client.get('/api/checkout/cart')
+    etag = first.headers['ETag']
+    assert client.get('/api/checkout/cart', headers={'If-None-Match': etag}).status_code == 304
+
+    # A price change made by another worker: nothing in this process is told about it
+    with app.app_context():
+        db.session.execute(update(Price).where(Price.product_id == product_id).values(amount=12))
+        db.session.commit()
+    changed = client.get('/api/checkout/cart', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert changed.get_json()['total'] == 24
+
+
+def test_empty_cart_needs_no_session(client):
+    response = client.get('/api/checkout/cart')
+    assert response.status_code == 200 and response.get_json()['item_count'] == 0
+    assert 'Set-Cookie' not in response.headers
+    assert client.get('/api/checkout/cart', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_unchanged_cart_is_answered_without_building_it(app, client, make_product):
+    product_id = make_product(stock=5)
+    client.post('/api/checkout/cart/add', json={'product_id': product_id, 'quantity': 1})
+    etag = client.get('/api/checkout/cart').headers['ETag']
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        assert client.get('/api/checkout/cart', headers={'If-None-Match': etag}).status_code == 304
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    assert len(statements) == 1 and 'product_images' not in statements[0]
+
+    # A write to the cart changes the version, and with it the ETag
+    client.put(f'/api/checkout/cart/item/{product_id}', json={'quantity': 1})
+    response = client.get('/api/checkout/cart', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag
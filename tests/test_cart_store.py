@@ -0,0 +1,78 @@
+import time
+import pytest
+from services.cart_store import MemoryCartStore, RedisCartStore
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def store(request):
+    if request.param == 'memory':
+        return MemoryCartStore(ttl=60)
+    fakeredis = pytest.importorskip('fakeredis')
+    store = RedisCartStore('redis://localhost:6379/0', ttl=60)
+    store.client = fakeredis.FakeRedis()
+    return store
+
+
+def test_lines_are_added_updated_and_cleared(store):
+    assert store.get('s1') == {}
+    assert store.add('s1', 7, 2) == 2
+    assert store.add('s1', 7, 1) == 3
+    store.add('s1', 9, 1)
+    assert store.get('s1') == {7: 3, 9: 1}
+    store.set_quantity('s1', 7, 5)
+    store.set_quantity('s1', 9, 0)
+    assert store.get('s1') == {7: 5}
+    assert store.get('s2') == {}
+    store.clear('s1')
+    assert store.get('s1') == {}
+
+
+def test_redis_carts_expire_after_the_last_write():
+    fakeredis = pytest.importorskip('fakeredis')
+    store = RedisCartStore('redis://localhost:6379/0', ttl=60)
+    store.client = fakeredis.FakeRedis()
+    store.add('s1', 7, 1)
+    assert 0 < store.client.ttl('cart:s1') <= 60
+    store.client.expire('cart:s1', 5)
+    store.set_quantity('s1', 7, 2)  # a write pushes the expiry back
+    assert store.client.ttl('cart:s1') > 5
+
+
+def test_memory_carts_expire_when_idle():
+    store = MemoryCartStore(ttl=0.05)
+    store.add('s1', 7, 1)
+    assert store.get('s1') == {7: 1}
+    time.sleep(0.1)
+    assert store.get('s1') == {}
+    # An expired cart starts again empty
+    assert store.add('s1', 7, 1) == 1
+
+
+def test_memory_store_drops_the_least_recently_written_cart_past_the_cap():
+    store = MemoryCartStore(max_carts=2)
+    store.add('a', 1, 1)
+    store.add('b', 1, 1)
+    store.add('a', 2, 1)  # 'b' is now the oldest
+    store.add('c', 1, 1)
+    assert store.get('a') == {1: 1, 2: 1}
+    assert store.get('b') == {}
+    assert store.get('c') == {1: 1}
+
+
+def test_every_write_replaces_the_version(store):
+    assert store.version('s1') is None
+    store.add('s1', 7, 1)
+    versions = [store.version('s1')]
+    store.add('s1', 7, 1)
+    versions.append(store.version('s1'))
+    store.set_quantity('s1', 7, 1)
+    versions.append(store.version('s1'))
+    assert None not in versions and len(set(versions)) == 3
+    assert store.version('s1') == versions[-1]  # reads leave it alone
+    store.get('s1')
+    assert store.version('s1') == versions[-1]
+    store.clear('s1')
+    assert store.version('s1') is None
+    # A cart started again after clearing does not repeat an old version
+    store.add('s1', 7, 1)
+    assert store.version('s1') not in versions
@@ -0,0 +1,85 @@
+import io
+import threading
+import time
+import pytest
+from werkzeug.datastructures import FileStorage
+from models.product import db
+from services.cache_service import catalog_cache
+from services.image_service import ImageService
+from services.product_service import ProductService
+from services.upload_storage import ContentAddressedStorage
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+def test_removing_an_image_keeps_the_listing_counts_cached(app, client, make_product):
+    product_id = make_product(stock=1)
+    with app.app_context():
+        image_id = ProductService(db.session).add_product_image(
+            product_id, 'ball.jpg', 'uploads/products/ball.jpg', content_hash='ball').id
+    assert client.get(f'/api/store/product/{product_id}').get_json()['images']
+    assert client.get('/api/store/products').get_json()['pagination']['total'] == 1
+    count_key = ('count', None, None)
+    assert catalog_cache.get(count_key) == 1
+
+    with app.app_context():
+        assert ImageService(db.session).delete_image(product_id, image_id)
+    assert catalog_cache.get(count_key) == 1
+    assert client.get(f'/api/store/product/{product_id}').get_json()['images'] == []
+
+
+@pytest.fixture
+def storage(app, tmp_path):
+    """Upload storage in a temporary folder, with the variant pipeline off"""
+    original = app.extensions['upload_storage'], app.extensions['image_pipeline']
+    storage = ContentAddressedStorage(str(tmp_path), str(tmp_path / 'tmp'))
+    app.extensions['upload_storage'], app.extensions['image_pipeline'] = storage, None
+    yield storage
+    app.extensions['upload_storage'], app.extensions['image_pipeline'] = original
+
+
+def png_upload():
+    image = io.BytesIO()
+    Image.new('RGB', (4, 4), 'red').save(image, 'PNG')
+    image.seek(0)
+    return FileStorage(stream=image, filename='ball.png')
+
+
+def upload(app, product_id):
+    with app.test_request_context():
+        img = ImageService(db.session).save_upload(product_id, png_upload())
+        return img.id, img.filepath
+
+
+def test_duplicate_upload_during_a_delete_keeps_its_file(app, storage, make_product, monkeypatch):
+    pytest.importorskip('PIL')
+    product_id = make_product(stock=1)
+    image_id, filepath = upload(app, product_id)
+
+    removing = threading.Event()
+    remove = storage.remove
+
+    def slow_remove(*paths):
+        removing.set()
+        time.sleep(0.2)  # the duplicate upload arrives while the file is going
+        remove(*paths)
+    monkeypatch.setattr(storage, 'remove', slow_remove)
+
+    def delete():
+        with app.app_context():
+            assert ImageService(db.session).delete_image(product_id, image_id)
+    deleting = threading.Thread(target=delete)
+    deleting.start()
+    removing.wait(5)
+    duplicate_id, duplicate_path = upload(app, product_id)
+    deleting.join()
+
+    assert duplicate_path == filepath
+    assert storage.exists(duplicate_path)
+    # The file is shared no longer, so deleting the duplicate removes it
+    with app.app_context():
+        assert ImageService(db.session).delete_image(product_id, duplicate_id)
+    assert not storage.exists(duplicate_path)
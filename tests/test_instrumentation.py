@@ -0,0 +1,39 @@
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine
+from services.instrumentation import init_instrumentation
+
+OUTSIDE = {'REMOTE_ADDR': '203.0.113.5'}
+
+
+def make_app(**config):
+    app = Flask(__name__)
+    app.config.update(INSTRUMENTATION_ENABLED=True, **config)
+    init_instrumentation(app, create_engine('sqlite://'))
+    return app
+
+
+def test_metrics_are_not_served_unless_an_endpoint_is_configured():
+    assert make_app().test_client().get('/metrics').status_code == 404
+
+
+@pytest.mark.parametrize('environ, headers, status', [
+    ({}, {}, 200),  # the test client comes from 127.0.0.1
+    (OUTSIDE, {}, 404),
+    (OUTSIDE, {'Authorization': 'Bearer wrong'}, 404),
+    (OUTSIDE, {'Authorization': 'Bearer scrape-token'}, 200)
+])
+def test_metrics_need_an_allowed_address_or_the_token(environ, headers, status):
+    app = make_app(METRICS_ENDPOINT='/metrics', METRICS_TOKEN='scrape-token')
+    response = app.test_client().get('/metrics', environ_base=environ, headers=headers)
+    assert response.status_code == status
+    if status == 200:
+        assert 'http_request_duration_seconds' in response.get_data(as_text=True)
+
+
+def test_metrics_without_a_token_are_for_allowed_addresses_only():
+    app = make_app(METRICS_ENDPOINT='/metrics', METRICS_ALLOWED_IPS=('10.0.0.7',))
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 404
+    assert client.get('/metrics', headers={'Authorization': 'Bearer '}).status_code == 404
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '10.0.0.7'}).status_code == 200
@@ -0,0 +1,158 @@
+import json
+import threading
+from sqlalchemy import update
+from models.payment import Order, Payment, PaymentProvider, PaymentStatus, ReservationStatus, StockReservation
+from models.product import db
+from benchmarks.fakes import FakeProvider
+from services.inventory_service import InventoryService
+from services.provider_registry import get_provider_registry
+from services.webhook_service import WebhookService
+from tests.conftest import CHECKOUT_BODY
+
+
+def stripe_event(event_type, intent_id, event_id):
+    return json.dumps({'id': event_id, 'type': event_type, 'data': {'object': {'id': intent_id}}})
+
+
+def test_concurrent_checkouts_never_oversell(app, fake_provider, make_product, stock_of):
+    units, buyers = 5, 24
+    product_id = make_product(stock=units)
+    clients = [app.test_client() for _ in range(buyers)]
+    # Every cart is filled while the stock is still there; the race is at checkout
+    for client in clients:
+        assert client.post('/api/checkout/cart/add', json={'product_id': product_id, 'quantity': 1}).status_code == 200
+
+    lowest_stock, results = [units], []
+    start, stop = threading.Barrier(buyers), threading.Event()
+
+    def buy(client):
+        start.wait()
+        response = client.post('/api/checkout/process', json=CHECKOUT_BODY)
+        results.append((response.status_code, response.get_json()))
+
+    def watch_stock():
+        with app.app_context():
+            while not stop.is_set():
+                lowest_stock[0] = min(lowest_stock[0], stock_of(product_id))
+                db.session.rollback()
+
+    watcher = threading.Thread(target=watch_stock)
+    watcher.start()
+    threads = [threading.Thread(target=buy, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stop.set()
+    watcher.join()
+
+    succeeded = [body for status, body in results if status == 200 and body['success']]
+    refused = [body for status, body in results if status == 400]
+    assert len(succeeded) == units
+    assert len(refused) == buyers - units
+    assert all('out of stock' in body['message'] for body in refused)
+    assert lowest_stock[0] >= 0
+    with app.app_context():
+        assert stock_of(product_id) == 0
+        assert db.session.query(Order).count() == units
+        # Only the paid-for orders hold stock; refused checkouts left no reservation behind
+        reserved = db.session.query(StockReservation).filter_by(status=ReservationStatus.ACTIVE).all()
+        assert sum(reservation.quantity for reservation in reserved) == units
+
+
+def test_expiry_cancels_pending_order_and_its_payment(app, fake_provider, make_product, checkout,
+                                                      stock_of, expire_reservations):
+    product_id = make_product(stock=3)
+    status, body = checkout(app.test_client(), product_id, 2)
+    assert status == 200 and body['success']
+    with app.app_context():
+        # A created intent moves the order to PROCESSING; put it back to model an unanswered provider
+        db.session.execute(update(Order).values(status=PaymentStatus.PENDING))
+        expire_reservations()
+        assert InventoryService(db.session).release_expired() == 1
+        db.session.commit()
+        assert db.session.query(Order.status).scalar() == PaymentStatus.CANCELLED
+        assert db.session.query(Payment.status).scalar() == PaymentStatus.CANCELLED
+        assert stock_of(product_id) == 3
+
+
+def test_order_expiring_during_the_provider_call_is_not_revived(app, make_product, checkout,
+                                                                stock_of, expire_reservations):
+    class ExpiringProvider(FakeProvider):
+        def create_payment_intent(self, *args, **kwargs):
+            with app.app_context():
+                expire_reservations()
+                InventoryService(db.session).release_expired()
+                db.session.commit()
+            return super().create_payment_intent(*args, **kwargs)
+
+    product_id = make_product(stock=3)
+    with app.app_context():
+        get_provider_registry().override(PaymentProvider.STRIPE, ExpiringProvider(latency=0))
+    try:
+        status, body = checkout(app.test_client(), product_id, 2)
+    finally:
+        with app.app_context():
+            get_provider_registry().override(PaymentProvider.STRIPE, None)
+    assert status == 200 and not body['success'] and 'expired' in body['error']
+    with app.app_context():
+        assert db.session.query(Order.status).scalar() == PaymentStatus.CANCELLED
+        assert db.session.query(Payment.status).scalar() == PaymentStatus.CANCELLED
+        assert stock_of(product_id) == 3
+
+
+def test_abandoned_processing_order_expires_and_returns_its_stock(app, fake_provider, make_product, checkout,
+                                                                  stock_of, expire_reservations):
+    product_id = make_product(stock=3)
+    status, body = checkout(app.test_client(), product_id, 2)
+    assert status == 200 and body['success']
+    with app.app_context():
+        # An intent was created, but the shopper never completes the payment sheet
+        assert db.session.query(Order.status).scalar() == PaymentStatus.PROCESSING
+        expire_reservations()
+        assert InventoryService(db.session).release_expired() == 1
+        db.session.commit()
+        assert db.session.query(Order.status).scalar() == PaymentStatus.CANCELLED
+        assert db.session.query(Payment.status).scalar() == PaymentStatus.CANCELLED
+        assert stock_of(product_id) == 3
+
+
+def test_payment_after_expiry_takes_the_stock_again(app, fake_provider, make_product, checkout,
+                                                    stock_of, expire_reservations):
+    product_id = make_product(stock=3)
+    status, body = checkout(app.test_client(), product_id, 2)
+    with app.app_context():
+        intent_id = db.session.query(Payment.transaction_id).scalar()
+        expire_reservations()
+        InventoryService(db.session).release_expired()
+        db.session.commit()
+
+        webhooks = WebhookService(db.session)
+        webhooks.receive('stripe', stripe_event('payment_intent.succeeded', intent_id, 'evt_1'), {})
+        webhooks.process_pending()
+        assert db.session.query(Order.status).scalar() == PaymentStatus.COMPLETED
+        assert db.session.query(Payment.status).scalar() == PaymentStatus.COMPLETED
+        assert stock_of(product_id) == 1
+        assert db.session.query(StockReservation).filter_by(status=ReservationStatus.COMMITTED).count() == 1
+
+
+def test_payment_after_expiry_without_stock_is_left_for_refund(app, fake_provider, make_product, checkout,
+                                                               stock_of, expire_reservations):
+    product_id = make_product(stock=3)
+    status, body = checkout(app.test_client(), product_id, 2)
+    with app.app_context():
+        intent_id = db.session.query(Payment.transaction_id).scalar()
+        expire_reservations()
+        InventoryService(db.session).release_expired()
+        db.session.commit()
+    # Someone else buys the stock the expired order gave back
+    assert checkout(app.test_client(), product_id, 3)[1]['success']
+
+    with app.app_context():
+        webhooks = WebhookService(db.session)
+        webhooks.receive('stripe', stripe_event('payment_intent.succeeded', intent_id, 'evt_2'), {})
+        webhooks.process_pending()
+        first_order = db.session.query(Order).order_by(Order.id).first()
+        assert first_order.status == PaymentStatus.CANCELLED
+        assert first_order.payment.status == PaymentStatus.COMPLETED
+        assert stock_of(product_id) == 0
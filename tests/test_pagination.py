@@ -0,0 +1,40 @@
+import pytest
+from services.store_service import MAX_PER_PAGE
+
+LISTINGS = ['/api/store/products', '/store/api/products']
+
+
+@pytest.fixture
+def products(make_product):
+    return [make_product(stock=1) for _ in range(3)]
+
+
+@pytest.mark.parametrize('path', LISTINGS)
+@pytest.mark.parametrize('per_page', [0, -5])
+@pytest.mark.parametrize('cursor', ['', None])
+def test_per_page_below_one_returns_a_single_product(client, products, path, per_page, cursor):
+    query = {'per_page': per_page, 'search': 'ball'}
+    if cursor is not None:
+        query['cursor'] = cursor
+    response = client.get(path, query_string=query)
+    assert response.status_code == 200
+    assert len(response.get_json()['items']) == 1
+    # The same without search, which takes the plain listing query instead of the index
+    del query['search']
+    response = client.get(path, query_string=query)
+    assert response.status_code == 200
+    assert len(response.get_json()['items']) == 1
+
+
+def test_per_page_above_the_maximum_is_clamped(client, products):
+    response = client.get('/api/store/products', query_string={'per_page': 10 ** 6, 'cursor': ''})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['pagination']['per_page'] == MAX_PER_PAGE
+    assert len(body['items']) == 3
+
+
+def test_category_listing_clamps_per_page(client, products):
+    for path in ('/api/store/category/1/products', '/store/api/category/1/products'):
+        response = client.get(path, query_string={'per_page': 0, 'cursor': ''})
+        assert response.status_code == 200 and len(response.get_json()['items']) == 1
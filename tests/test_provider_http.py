@@ -0,0 +1,189 @@
+"""Provider HTTP clients against a local stub of the Stripe and Africa's Talking APIs."""
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import stripe
+from models.payment import PaymentProvider
+from services.payment_service import StripeProvider, build_providers
+from services.provider_registry import ProviderRegistry
+
+AT_METADATA = {'phone_number': '+254700000000'}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.lock = threading.Lock()
+        self.latency = 0
+        self.connections = 0
+        self.active = self.most_active = 0
+        self.authorizations = []
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server_port}'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive unless the client closes
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with server.lock:
+            server.authorizations.append(self.headers.get('Authorization'))
+            server.active += 1
+            server.most_active = max(server.most_active, server.active)
+        time.sleep(server.latency)
+        with server.lock:
+            server.active -= 1
+        if self.path.startswith('/v1/payment_intents'):
+            body = {'id': 'pi_stub', 'object': 'payment_intent', 'client_secret': 'pi_stub_secret',
+                    'status': 'requires_payment_method'}
+        else:
+            body = {'status': 'PendingConfirmation', 'transactionId': 'ATPid_stub', 'description': 'Waiting'}
+        payload = json.dumps(body).encode()
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except OSError:
+            pass  # the client gave up (read timeout)
+
+
+@pytest.fixture
+def stub():
+    server = StubServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def make_registry(stub):
+    """make_registry(**config) -> (registry, sessions built so far) for Stripe and Africa's Talking on the stub"""
+    saved = stripe.default_http_client, stripe.api_base, stripe.api_key
+    registries = []
+
+    def make(**overrides):
+        config = {
+            'STRIPE_SECRET_KEY': 'sk_test_registry',
+            'STRIPE_API_BASE': stub.base_url,
+            'AT_USERNAME': 'stub',
+            'AT_API_KEY': 'stub',
+            'AT_PAYMENTS_API_BASE': stub.base_url,
+            **overrides
+        }
+        sessions = []
+
+        def builder(config, session):
+            sessions.append(session)
+            return build_providers(config, session)
+        registries.append(ProviderRegistry(config, builder))
+        return registries[-1], sessions
+    yield make
+    for registry in registries:
+        registry.close()
+    stripe.default_http_client, stripe.api_base, stripe.api_key = saved
+
+
+def test_calls_reuse_one_connection(stub, make_registry):
+    registry, sessions = make_registry()
+    for i in range(5):
+        assert registry.get(PaymentProvider.STRIPE).create_payment_intent(10, 'USD', i)['success']
+        assert registry.get(PaymentProvider.AFRICAS_TALKING).create_payment_intent(10, 'KES', i, AT_METADATA)['success']
+    assert len(stub.authorizations) == 10
+    # One keep-alive connection per client: Stripe's pins its own CA bundle, a separate pool key
+    assert stub.connections == 2
+    assert len(sessions) == 1
+
+
+def test_requests_carry_the_configured_timeouts(make_registry, monkeypatch):
+    registry, sessions = make_registry(PAYMENT_HTTP_CONNECT_TIMEOUT=1.5, PAYMENT_HTTP_READ_TIMEOUT=4)
+    registry.get(PaymentProvider.STRIPE)
+    timeouts = []
+    send = sessions[0].request
+
+    def request(*args, **kwargs):
+        timeouts.append(kwargs.get('timeout'))
+        return send(*args, **kwargs)
+    monkeypatch.setattr(sessions[0], 'request', request)
+
+    registry.get(PaymentProvider.STRIPE).create_payment_intent(10, 'USD', 1)
+    registry.get(PaymentProvider.AFRICAS_TALKING).create_payment_intent(10, 'KES', 1, AT_METADATA)
+    assert timeouts == [(1.5, 4), (1.5, 4)]
+
+
+def test_slow_provider_hits_the_read_timeout(stub, make_registry):
+    registry, _ = make_registry(PAYMENT_HTTP_READ_TIMEOUT=0.2)
+    stub.latency = 1
+    started = time.perf_counter()
+    stripe_result = registry.get(PaymentProvider.STRIPE).create_payment_intent(10, 'USD', 1)
+    at_result = registry.get(PaymentProvider.AFRICAS_TALKING).create_payment_intent(10, 'KES', 1, AT_METADATA)
+    assert not stripe_result['success'] and not at_result['success']
+    assert time.perf_counter() - started < 1.5
+
+
+def test_each_stripe_call_sends_its_own_api_key(stub, make_registry):
+    registry, _ = make_registry()
+    registry.get(PaymentProvider.STRIPE)  # installs the shared HTTP client and the stub's base URL
+    for key in ('sk_test_a', 'sk_test_b', 'sk_test_a'):
+        assert StripeProvider(key).create_payment_intent(10, 'USD', 1)['success']
+    assert stub.authorizations == ['Bearer sk_test_a', 'Bearer sk_test_b', 'Bearer sk_test_a']
+    assert stripe.api_key is None
+
+
+def test_concurrent_calls_wait_for_a_pooled_connection(stub, make_registry):
+    registry, _ = make_registry(PAYMENT_HTTP_POOL_SIZE=2)
+    provider = registry.get(PaymentProvider.STRIPE)
+    stub.latency = 0.1
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(provider.create_payment_intent(10, 'USD', 1)))
+               for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 6 and all(result['success'] for result in results)
+    assert stub.connections == 2
+    assert stub.most_active == 2
+
+
+def test_forked_child_builds_its_own_providers(stub, make_registry):
+    registry, sessions = make_registry()
+    parent_provider = registry.get(PaymentProvider.STRIPE)
+    assert parent_provider.create_payment_intent(10, 'USD', 1)['success']
+
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            child_provider = registry.get(PaymentProvider.STRIPE)
+            if child_provider is not parent_provider and len(sessions) == 2 \
+                    and child_provider.create_payment_intent(10, 'USD', 2)['success']:
+                code = 0
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    # The child opened its own connection; the parent's is untouched and still reused
+    assert stub.connections == 2
+    assert registry.get(PaymentProvider.STRIPE) is parent_provider
+    assert parent_provider.create_payment_intent(10, 'USD', 3)['success']
+    assert stub.connections == 2
@@ -0,0 +1,113 @@
+import threading
+import time
+import pytest
+from models.payment import Order, Payment, PaymentStatus
+from models.product import db
+from services.provider_pool import ProviderBusyError, ProviderCallPool, ProviderTimeoutError
+from tests.conftest import CHECKOUT_BODY
+
+
+@pytest.fixture
+def pool(app):
+    """A small provider pool in place of the app's: one worker, one waiting call, a 0.2 s timeout"""
+    original = app.extensions['payment_provider_pool']
+    pool = ProviderCallPool(max_workers=1, max_queue=1, timeout=0.2)
+    app.extensions['payment_provider_pool'] = pool
+    yield pool
+    app.extensions['payment_provider_pool'] = original
+    pool.shutdown()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out waiting'
+        time.sleep(0.02)
+
+
+def test_slow_call_times_out_and_delivers_its_result_late(pool):
+    late = []
+    started = time.perf_counter()
+    with pytest.raises(ProviderTimeoutError):
+        pool.call(time.sleep, 0.5, on_late_result=late.append)
+    assert time.perf_counter() - started < 0.4
+    wait_for(lambda: late)
+    assert late == [None]
+
+
+def test_call_is_rejected_when_workers_and_queue_are_taken(pool):
+    release = threading.Event()
+    pool.timeout = 5
+    waiting = [threading.Thread(target=pool.call, args=(release.wait,)) for _ in range(2)]
+    for thread in waiting:
+        thread.start()
+    wait_for(lambda: pool._slots._value == 0)
+    try:
+        with pytest.raises(ProviderBusyError):
+            pool.call(release.wait)
+    finally:
+        release.set()
+        for thread in waiting:
+            thread.join()
+    # The slots come back once the calls finish
+    assert pool.call(lambda: 'ok') == 'ok'
+
+
+def test_late_intent_is_recorded_after_checkout_gave_up(app, pool, fake_provider, make_product, checkout, stock_of):
+    fake_provider.latency = 0.5
+    product_id = make_product(stock=3)
+    status, body = checkout(app.test_client(), product_id, 2)
+    assert status == 200 and not body['success'] and 'in time' in body['error']
+    with app.app_context():
+        assert db.session.query(Payment.status).scalar() == PaymentStatus.PENDING
+
+        def recorded():
+            db.session.rollback()
+            return db.session.query(Payment.transaction_id).scalar() is not None
+        wait_for(recorded)
+        assert db.session.query(Order.status).scalar() == PaymentStatus.PROCESSING
+        assert stock_of(product_id) == 1
+
+
+def test_declined_intent_fails_the_order_and_returns_its_stock(app, fake_provider, make_product, checkout, stock_of):
+    fake_provider.fail = True
+    product_id = make_product(stock=3)
+    status, body = checkout(app.test_client(), product_id, 2)
+    assert status == 200 and not body['success']
+    with app.app_context():
+        assert db.session.query(Payment.status).scalar() == PaymentStatus.FAILED
+        assert db.session.query(Order.status).scalar() == PaymentStatus.FAILED
+        assert stock_of(product_id) == 3
+
+
+def test_checkout_against_a_saturated_pool_is_retryable(app, pool, fake_provider, make_product, stock_of):
+    product_id = make_product(stock=1)
+    client = app.test_client()
+    assert client.post('/api/checkout/cart/add', json={'product_id': product_id, 'quantity': 1}).status_code == 200
+    release = threading.Event()
+    pool.timeout = 5
+    blocking = [threading.Thread(target=pool.call, args=(release.wait,)) for _ in range(2)]
+    for thread in blocking:
+        thread.start()
+    wait_for(lambda: pool._slots._value == 0)
+    try:
+        response = client.post('/api/checkout/process', json=CHECKOUT_BODY)
+    finally:
+        release.set()
+        for thread in blocking:
+            thread.join()
+    assert response.status_code == 503 and not response.get_json()['success']
+    assert response.headers['Retry-After'] == '1'
+    with app.app_context():
+        # The attempt never reached the provider; the order keeps the last unit for the retry
+        assert db.session.query(Order.status).scalar() == PaymentStatus.PENDING
+        assert db.session.query(Payment.status).scalar() == PaymentStatus.CANCELLED
+        assert stock_of(product_id) == 0
+    assert client.get('/api/checkout/cart').get_json()['item_count'] == 1
+
+    response = client.post('/api/checkout/process', json=CHECKOUT_BODY)
+    assert response.status_code == 200 and response.get_json()['success']
+    with app.app_context():
+        assert db.session.query(Order.id).count() == 1
+        assert db.session.query(Order.status).scalar() == PaymentStatus.PROCESSING
+    assert client.get('/api/checkout/cart').get_json()['item_count'] == 0
@@ -0,0 +1,54 @@
+import pytest
+from sqlalchemy import event
+from benchmarks.seed import seed_catalog
+from models.product import db
+from services.cache_service import catalog_cache
+
+# Statements per request, whatever the catalog size; a change here is an N+1 (or a fix)
+EXPECTED_STATEMENTS = {
+    '/api/store/products?per_page=12': 4,
+    '/api/store/products?per_page=12&page=2': 4,
+    '/api/store/products?per_page=12&search=ball': 5,
+    '/api/store/category/1/products?per_page=12': 4,
+    '/api/store/featured': 3,
+    '/api/store/product/1': 2,
+}
+
+
+@pytest.fixture
+def count_statements(app):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    # Every request goes to the database
+    catalog_cache.enabled = False
+    yield statements
+    catalog_cache.enabled = True
+    event.remove(engine, 'before_cursor_execute', count)
+
+
+def statements_per_page(client, statements):
+    counts = {}
+    for path in EXPECTED_STATEMENTS:
+        statements.clear()
+        response = client.get(path)
+        assert response.status_code == 200, path
+        counts[path] = len(statements)
+    return counts
+
+
+def test_store_pages_run_a_fixed_number_of_statements(app, client, count_statements):
+    with app.app_context():
+        seed_catalog(db.session, categories=3, products=24, images=2)
+    small = statements_per_page(client, count_statements)
+
+    with app.app_context():
+        seed_catalog(db.session, categories=10, products=400, images=4, seed=2)
+    large = statements_per_page(client, count_statements)
+
+    assert small == large == EXPECTED_STATEMENTS
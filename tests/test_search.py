@@ -0,0 +1,21 @@
+from models.product import db
+from services.search_service import SearchService
+
+
+def search_total(client, query):
+    return client.get(f'/api/store/products?search={query}').get_json()['pagination']['total']
+
+
+def test_index_created_on_existing_products_finds_them(app, client, make_product):
+    for _ in range(3):
+        make_product(stock=1)
+    # LIKE fallback while there is no index
+    assert search_total(client, 'Ball') == 3
+
+    with app.app_context():
+        SearchService(db.session).ensure_index()
+    # Picked up by the running process, with the products that existed before it
+    assert search_total(client, 'Ball') == 3
+    assert search_total(client, 'Bal') == 3
+    make_product(stock=1)
+    assert search_total(client, 'Ball') == 4
@@ -0,0 +1,112 @@
+import json
+import os
+import time
+import pytest
+from models.payment import Order, Payment, PaymentProvider, PaymentStatus, WebhookEvent, WebhookStatus
+from models.product import db
+from services.provider_registry import get_provider_registry
+from services.webhook_service import WebhookConsumer, WebhookService
+from tests.conftest import CHECKOUT_BODY
+
+
+class StripeStub:
+    """What PaymentIntent.retrieve reports, through confirm_payment"""
+
+    def __init__(self, status, last_payment_error=None, error=None):
+        self.status = status
+        self.last_payment_error = last_payment_error
+        self.error = error
+
+    def confirm_payment(self, payment_intent_id):
+        if self.error:
+            return {'success': False, 'error': self.error}
+        return {'success': self.status == 'succeeded', 'status': self.status, 'payment_id': payment_intent_id,
+                'last_payment_error': self.last_payment_error}
+
+
+@pytest.fixture
+def paid_order(app, fake_provider, make_product):
+    """An order whose Stripe intent has been created (order PROCESSING); yields the intent id"""
+    client = app.test_client()
+    client.post('/api/checkout/cart/add', json={'product_id': make_product(stock=5), 'quantity': 1})
+    assert client.post('/api/checkout/process', json=CHECKOUT_BODY).get_json()['success']
+    with app.app_context():
+        return db.session.query(Payment.transaction_id).scalar()
+
+
+def deliver_unsigned(app, stub, event_type, intent_id):
+    """Receive and process an unsigned Stripe event while Stripe answers as stub"""
+    with app.app_context():
+        get_provider_registry().override(PaymentProvider.STRIPE, stub)
+        service = WebhookService(db.session)
+        body = json.dumps({'id': 'evt_1', 'type': event_type, 'data': {'object': {'id': intent_id}}})
+        assert service.receive('stripe', body, {})
+        service.process_pending()
+        return (db.session.query(WebhookEvent.status).scalar(),
+                db.session.query(Payment.status).scalar(),
+                db.session.query(Order.status).scalar())
+
+
+@pytest.mark.parametrize('status', ['processing', 'requires_action', 'requires_payment_method'])
+def test_unsigned_failure_is_ignored_while_stripe_has_not_failed(app, paid_order, status):
+    event, payment, order = deliver_unsigned(app, StripeStub(status), 'payment_intent.payment_failed', paid_order)
+    assert event == WebhookStatus.IGNORED
+    assert payment == PaymentStatus.PENDING
+    assert order == PaymentStatus.PROCESSING
+
+
+@pytest.mark.parametrize('stub', [StripeStub('canceled'), StripeStub('requires_payment_method', 'card_declined')])
+def test_unsigned_failure_is_applied_once_stripe_reports_it(app, paid_order, stub):
+    event, payment, order = deliver_unsigned(app, stub, 'payment_intent.payment_failed', paid_order)
+    assert event == WebhookStatus.PROCESSED
+    assert payment == PaymentStatus.FAILED
+    assert order == PaymentStatus.FAILED
+
+
+def test_unsigned_event_is_retried_when_stripe_cannot_be_asked(app, paid_order):
+    stub = StripeStub(None, error='API connection error')
+    event, payment, order = deliver_unsigned(app, stub, 'payment_intent.payment_failed', paid_order)
+    assert event == WebhookStatus.PENDING
+    assert payment == PaymentStatus.PENDING
+    assert order == PaymentStatus.PROCESSING
+    with app.app_context():
+        assert db.session.query(WebhookEvent.attempts).scalar() == 1
+
+
+def test_unsigned_success_is_applied_when_stripe_agrees(app, paid_order):
+    event, payment, order = deliver_unsigned(app, StripeStub('succeeded'), 'payment_intent.succeeded', paid_order)
+    assert (event, payment, order) == (WebhookStatus.PROCESSED, PaymentStatus.COMPLETED, PaymentStatus.COMPLETED)
+
+
+@pytest.fixture
+def consumer(app):
+    consumer = WebhookConsumer(app, interval=60)
+    yield consumer
+    consumer.shutdown()
+
+
+def test_consumer_drains_events_left_from_before_a_restart(app, paid_order, consumer):
+    with app.app_context():
+        get_provider_registry().override(PaymentProvider.STRIPE, StripeStub('succeeded'))
+        body = json.dumps({'id': 'evt_1', 'type': 'payment_intent.succeeded', 'data': {'object': {'id': paid_order}}})
+        assert WebhookService(db.session).receive('stripe', body, {})
+        db.session.commit()
+
+    consumer.start()  # no new delivery wakes it
+    deadline = time.monotonic() + 5
+    with app.app_context():
+        while db.session.query(WebhookEvent.status).scalar() == WebhookStatus.PENDING:
+            assert time.monotonic() < deadline, 'the backlog was not processed'
+            db.session.rollback()
+            time.sleep(0.02)
+        assert db.session.query(Order.status).scalar() == PaymentStatus.COMPLETED
+
+
+def test_forked_process_runs_its_own_consumer(consumer):
+    consumer.start()
+    pid = os.fork()
+    if pid == 0:
+        thread = consumer._thread
+        os._exit(0 if thread is not None and thread.is_alive() and consumer._pid == os.getpid() else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0